@@ -1,6 +1,8 @@
 import chromadb
 import uuid
 
+from chroma_results import iter_query
+
 # --- Phase d'indexation ---
 client = chromadb.Client()
 collection = client.create_collection(
@@ -24,14 +26,7 @@ queries = [
 ]
 
 for q in queries:
-    results = collection.query(
-        query_texts=[q], n_results=3
-    )
     print(f"\nQuery: {q}")
-    for doc, dist, meta in zip(
-        results["documents"][0],
-        results["distances"][0],
-        results["metadatas"][0],
-    ):
-        print(f"  [{dist:.4f}] (ligne {meta['line']}) "
-              f"{doc[:70]}...")
+    for hit in iter_query(collection, query_texts=[q], n_results=3):
+        print(f"  [{hit.distance:.4f}] (ligne {hit.metadata['line']}) "
+              f"{hit.document[:70]}...")
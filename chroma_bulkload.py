@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+"""
+chroma_bulkload.py - Bulk-load fast path for a new PersistentClient collection
+Initial population through repeated small `collection.add` calls pays one
+SQLite transaction, one log append and one incremental HNSW insert per call,
+plus an index write every `sync_threshold` records. `BulkLoader` instead
+takes precomputed embeddings and:
+
+  - adds records in chunks of `client.get_max_batch_size()` (one
+    transaction each) - the index is fed a whole chunk per batch insert;
+  - creates the collection with `sync_threshold` equal to the record count,
+    so the index files are written once, when the last chunk lands;
+  - afterwards restores the normal HNSW settings for later writes and
+    VACUUMs chroma.sqlite3, which returns the pages the log held until that
+    single flush.
+
+The input must have a known size up front (`total`); a load that ends short
+of it is reported as unflushed and replays from the log on the next open.
+
+Usage:
+    python chroma_bulkload.py load my_vectordb --collection policies dump.jsonl
+    python chroma_bulkload.py load my_vectordb --collection policies docs.jsonl --embeddings vectors.npy
+    python chroma_bulkload.py bench --docs 50000 --dim 384
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+
+# Chroma's defaults, restored once the load is done
+DEFAULT_HNSW_BATCH_SIZE = 100
+DEFAULT_SYNC_THRESHOLD = 1000
+NORMAL_ADD_BATCH = 32  # chroma_pipeline.DEFAULT_BATCH_SIZE
+
+
+def sqlite_size(path: str) -> int:
+    db = os.path.join(path, "chroma.sqlite3")
+    return os.path.getsize(db) if os.path.exists(db) else 0
+
+
+def vacuum(path: str):
+    """VACUUM + ANALYZE chroma.sqlite3 (needs no other writer on the store)."""
+    db = sqlite3.connect(os.path.join(path, "chroma.sqlite3"))
+    try:
+        db.execute("VACUUM")
+        db.execute("ANALYZE")
+    finally:
+        db.close()
+
+
+class BulkLoadReport:
+    __slots__ = ("collection", "records", "chunks", "seconds", "flushed", "sqlite_before_vacuum",
+                 "sqlite_after_vacuum", "vacuum_seconds")
+
+    def __init__(self, collection: str):
+        self.collection = collection
+        self.records = 0
+        self.chunks = 0
+        self.seconds = 0.0
+        self.flushed = False
+        self.sqlite_before_vacuum = 0
+        self.sqlite_after_vacuum = 0
+        self.vacuum_seconds = 0.0
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.records / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> dict:
+        row = {name: getattr(self, name) for name in self.__slots__}
+        row["seconds"] = round(self.seconds, 3)
+        row["vacuum_seconds"] = round(self.vacuum_seconds, 3)
+        row["docs_per_second"] = round(self.docs_per_second, 1)
+        return row
+
+
+def _column(parts: List[tuple], index: int) -> Optional[list]:
+    """Concatenate one optional column; parts that lack it contribute None rows."""
+    if all(p[index] is None for p in parts):
+        return None
+    return [v for p in parts for v in (p[index] if p[index] is not None else [None] * len(p[0]))]
+
+
+class BulkLoader:
+    """Loads `total` precomputed records into a new collection at `path`.
+
+    Feed any number of `add()` calls (buffered to the client's max batch
+    size), then call `finish()`. The collection must not exist yet: the
+    single-flush trick depends on its index starting empty.
+    """
+
+    def __init__(self, path: str, name: str, total: int, metadata: Optional[dict] = None,
+                 embedding_function=None, chunk_size: Optional[int] = None, space: Optional[str] = None,
+                 hnsw: Optional[dict] = None):
+        import chromadb
+
+        if total < 1:
+            raise ValueError("nothing to load")
+        self.path = path
+        self.total = total
+        self.client = chromadb.PersistentClient(path=path)
+        self.chunk_size = min(chunk_size or self.client.get_max_batch_size(), self.client.get_max_batch_size())
+        # other HNSW settings (space, max_neighbors, ...) pass through; batch_size and
+        # sync_threshold are what the collection keeps once the load is done
+        settings = dict(hnsw or {})
+        self._restore = {"batch_size": settings.pop("batch_size", DEFAULT_HNSW_BATCH_SIZE),
+                         "sync_threshold": settings.pop("sync_threshold", DEFAULT_SYNC_THRESHOLD)}
+        settings.update(batch_size=self.chunk_size, sync_threshold=total)
+        if space:
+            settings["space"] = space
+        self.collection = self.client.create_collection(
+            name, metadata=metadata, embedding_function=embedding_function, configuration={"hnsw": settings})
+        self.report = BulkLoadReport(name)
+        self._buffer: List[tuple] = []
+        self._buffered = 0
+        self._started = time.perf_counter()
+
+    def add(self, ids: Sequence[str], embeddings, documents: Optional[Sequence[str]] = None,
+            metadatas: Optional[Sequence[dict]] = None):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(ids) != len(embeddings):
+            raise ValueError(f"{len(ids)} ids but {len(embeddings)} embeddings")
+        self._buffer.append((list(ids), embeddings, documents, metadatas))
+        self._buffered += len(ids)
+        while self._buffered >= self.chunk_size:
+            self._write(self.chunk_size)
+
+    def _take(self, n: int) -> tuple:
+        """The first `n` buffered records as one (ids, embeddings, documents, metadatas) chunk."""
+        parts, taken = [], 0
+        while taken < n:
+            ids, emb, docs, metas = self._buffer[0]
+            k = min(n - taken, len(ids))
+            parts.append((ids[:k], emb[:k], docs[:k] if docs is not None else None,
+                          metas[:k] if metas is not None else None))
+            if k == len(ids):
+                self._buffer.pop(0)
+            else:
+                self._buffer[0] = (ids[k:], emb[k:], docs[k:] if docs is not None else None,
+                                   metas[k:] if metas is not None else None)
+            taken += k
+        self._buffered -= taken
+        ids = [i for p in parts for i in p[0]]
+        embeddings = np.concatenate([p[1] for p in parts]) if len(parts) > 1 else parts[0][1]
+        return ids, embeddings, _column(parts, 2), _column(parts, 3)
+
+    def _write(self, n: int):
+        ids, embeddings, documents, metadatas = self._take(n)
+        self.collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        self.report.records += len(ids)
+        self.report.chunks += 1
+
+    def finish(self, vacuum_store: bool = True) -> BulkLoadReport:
+        if self._buffered:
+            self._write(self._buffered)
+        report = self.report
+        report.seconds = time.perf_counter() - self._started
+        # the index was written when the record count reached the threshold
+        report.flushed = report.records >= self.total
+        self.collection.modify(configuration={"hnsw": self._restore})
+        report.sqlite_before_vacuum = sqlite_size(self.path)
+        if vacuum_store:
+            t0 = time.perf_counter()
+            vacuum(self.path)
+            report.vacuum_seconds = time.perf_counter() - t0
+        report.sqlite_after_vacuum = sqlite_size(self.path)
+        return report
+
+
+def bulk_load(path: str, name: str, ids: Sequence[str], embeddings, documents: Optional[Sequence[str]] = None,
+              metadatas: Optional[Sequence[dict]] = None, **kwargs) -> BulkLoadReport:
+    """Load in-memory (or memory-mapped) arrays in one go."""
+    loader = BulkLoader(path, name, len(ids), **kwargs)
+    step = loader.chunk_size
+    for start in range(0, len(ids), step):
+        loader.add(ids[start:start + step], embeddings[start:start + step],
+                   documents[start:start + step] if documents is not None else None,
+                   metadatas[start:start + step] if metadatas is not None else None)
+    return loader.finish()
+
+
+# ── JSONL input ────────────────────────────────────────────────────────────
+
+def count_lines(path: str) -> int:
+    with open(path, "rb") as fh:
+        return sum(1 for line in fh if line.strip())
+
+
+def read_jsonl(path: str, embeddings: Optional[np.ndarray], chunk: int) -> Iterator[tuple]:
+    """(ids, embeddings, documents, metadatas) chunks of a chroma_results JSONL dump.
+
+    Rows need `id` and either `embedding` or a matching row of `embeddings`
+    (a .npy array in file order); `document` and `metadata` are optional.
+    """
+    ids, vectors, docs, metas = [], [], [], []
+    row = 0
+    with open(path, "r", encoding="utf-8") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            ids.append(str(rec["id"]))
+            vectors.append(embeddings[row] if embeddings is not None else rec["embedding"])
+            docs.append(rec.get("document"))
+            metas.append(rec.get("metadata") or None)
+            row += 1
+            if len(ids) == chunk:
+                yield ids, np.asarray(vectors, dtype=np.float32), docs, metas
+                ids, vectors, docs, metas = [], [], [], []
+    if ids:
+        yield ids, np.asarray(vectors, dtype=np.float32), docs, metas
+
+
+def _load(args) -> int:
+    from chromadb.errors import ChromaError
+
+    embeddings = np.load(args.embeddings, mmap_mode="r") if args.embeddings else None
+    total = count_lines(args.jsonl)
+    if embeddings is not None and len(embeddings) != total:
+        print(f"error: {args.embeddings} has {len(embeddings)} rows for {total} records", file=sys.stderr)
+        return 1
+    try:
+        loader = BulkLoader(args.path, args.collection, total, space=args.space)
+        for ids, vectors, docs, metas in read_jsonl(args.jsonl, embeddings, loader.chunk_size):
+            # rows without a document/metadata stay None; all-None columns are not sent
+            loader.add(ids, vectors,
+                       docs if any(d is not None for d in docs) else None,
+                       metas if any(m is not None for m in metas) else None)
+        report = loader.finish(vacuum_store=not args.no_vacuum)
+    except (OSError, ValueError, KeyError, ChromaError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(report.to_dict(), indent=2))
+    return 0
+
+
+# ── benchmark ──────────────────────────────────────────────────────────────
+
+_REOPEN = """
+import sys, time, numpy as np, chromadb
+t = time.perf_counter()
+col = chromadb.PersistentClient(path=sys.argv[1]).get_collection(sys.argv[2])
+col.query(query_embeddings=np.zeros((1, int(sys.argv[3])), np.float32), n_results=1)
+print(time.perf_counter() - t)
+"""
+
+
+def reopen_seconds(path: str, name: str, dim: int) -> float:
+    """Open + first query in a fresh process (replays anything left in the log)."""
+    out = subprocess.run([sys.executable, "-c", _REOPEN, path, name, str(dim)],
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip())
+
+
+def normal_load(path: str, name: str, ids, embeddings, documents, metadatas, batch_size: int) -> float:
+    """The baseline: default collection settings, one `add` per `batch_size` records."""
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=path).create_collection(name, embedding_function=None)
+    t0 = time.perf_counter()
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        collection.add(ids=ids[start:end], embeddings=embeddings[start:end],
+                       documents=documents[start:end], metadatas=metadatas[start:end])
+    return time.perf_counter() - t0
+
+
+def benchmark(docs: int, dim: int, batch_size: int, root: str) -> List[dict]:
+    from chroma_shards import synthetic_vectors
+
+    embeddings = synthetic_vectors(docs, dim)
+    ids = [f"doc-{i}" for i in range(docs)]
+    documents = [f"Policy {i}: returns accepted within {i % 60} days for unworn items." for i in range(docs)]
+    metadatas = [{"line": i, "category": f"cat-{i % 8}"} for i in range(docs)]
+    rows = []
+
+    path = os.path.join(root, "normal")
+    seconds = normal_load(path, "bench", ids, embeddings, documents, metadatas, batch_size)
+    rows.append({"mode": f"add x{batch_size}", "seconds": round(seconds, 3),
+                 "docs_per_second": round(docs / seconds, 1), "sqlite_bytes": sqlite_size(path),
+                 "reopen_seconds": round(reopen_seconds(path, "bench", dim), 3)})
+
+    path = os.path.join(root, "bulk")
+    report = bulk_load(path, "bench", ids, embeddings, documents, metadatas)
+    seconds = report.seconds + report.vacuum_seconds
+    rows.append({"mode": "bulk", "seconds": round(seconds, 3),
+                 "docs_per_second": round(docs / seconds, 1), "sqlite_bytes": report.sqlite_after_vacuum,
+                 "reopen_seconds": round(reopen_seconds(path, "bench", dim), 3)})
+    return rows
+
+
+def _bench(args) -> int:
+    root = args.dir or tempfile.mkdtemp(prefix="chroma-bulk-")
+    for sub in ("normal", "bulk"):
+        shutil.rmtree(os.path.join(root, sub), ignore_errors=True)
+    try:
+        rows = benchmark(args.docs, args.dim, args.batch_size, root)
+    finally:
+        if not args.dir:
+            shutil.rmtree(root, ignore_errors=True)
+    if args.json_report == "-":
+        print(json.dumps(rows, indent=2))
+        return 0
+    print(f"  {args.docs} docs x {args.dim} dim, precomputed embeddings, {os.cpu_count()} CPU(s)")
+    print(f"  {'Mode':<12} {'Seconds':>8} {'Docs/s':>9} {'Speedup':>8} {'SQLite':>10} {'Reopen(s)':>10}")
+    for r in rows:
+        print(f"  {r['mode']:<12} {r['seconds']:>8.2f} {r['docs_per_second']:>9.0f} "
+              f"{r['docs_per_second'] / rows[0]['docs_per_second']:>7.2f}x "
+              f"{r['sqlite_bytes'] / (1 << 20):>8.1f}M {r['reopen_seconds']:>10.2f}")
+    if args.json_report:
+        with open(args.json_report, "w", encoding="utf-8") as fh:
+            json.dump(rows, fh, indent=2)
+            fh.write("\n")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load precomputed embeddings into a new PersistentClient collection")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    load = sub.add_parser("load", help="Load a JSONL dump (id, document, metadata, embedding per line)")
+    load.add_argument("path", help="PersistentClient directory (e.g. my_vectordb)")
+    load.add_argument("jsonl", help="Records, e.g. from chroma_results.py --include documents metadatas embeddings")
+    load.add_argument("--collection", required=True, help="Collection to create (must not exist)")
+    load.add_argument("--embeddings", metavar="NPY", help="Embeddings as a .npy array in record order")
+    load.add_argument("--space", choices=("l2", "cosine", "ip"), help="Distance metric (default: Chroma's l2)")
+    load.add_argument("--no-vacuum", action="store_true", help="Skip the final VACUUM")
+
+    bench = sub.add_parser("bench", help="Compare docs/s of the bulk path with batched collection.add")
+    bench.add_argument("--docs", type=int, default=50000, help="Synthetic records (default: 50000)")
+    bench.add_argument("--dim", type=int, default=384, help="Embedding dimension (default: 384)")
+    bench.add_argument("--batch-size", type=int, default=NORMAL_ADD_BATCH,
+                       help=f"Records per add on the normal path (default: {NORMAL_ADD_BATCH})")
+    bench.add_argument("--dir", help="Keep the two stores under DIR instead of a temp directory")
+    bench.add_argument("--json-report", metavar="PATH", help="Also write the rows as JSON ('-' for stdout)")
+    args = parser.parse_args()
+
+    sys.exit(_load(args) if args.command == "load" else _bench(args))
+
+
+if __name__ == "__main__":
+    main()
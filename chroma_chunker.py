@@ -0,0 +1,691 @@
+#!/usr/bin/env python
+"""
+chroma_chunker.py - Structure-aware streaming chunker for ChromaDB ingestion
+Splits LaTeX and Markdown documents (article_chromadb.tex,
+article_chromadb_fr.tex, article_chromadb.md) into chunks that follow their
+sections and paragraphs and never exceed the embedding model's max sequence
+length, so no input is silently truncated by the tokenizer. Files are read
+line by line; each chunk carries its source byte span, line range and
+section path as metadata, and `add_chunks` feeds them to `collection.add` in
+batches.
+
+Usage:
+    python chroma_chunker.py article_chromadb.tex article_chromadb.md
+    python chroma_chunker.py article_chromadb_fr.tex --max-tokens 120 --overlap 24 --jsonl chunks.jsonl
+    python chroma_chunker.py article_chromadb.tex --index --query "How does HNSW search work?"
+"""
+
+import argparse
+import bisect
+import json
+import math
+import os
+import re
+import sys
+from collections import deque
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+# chromadb's default model (all-MiniLM-L6-v2) embeds at most 256 tokens,
+# two of which are [CLS]/[SEP]
+DEFAULT_MAX_TOKENS = 254
+DEFAULT_BATCH_SIZE = 64
+
+LATEX = "latex"
+MARKDOWN = "markdown"
+TEXT = "text"
+
+_EXTENSIONS = {".tex": LATEX, ".md": MARKDOWN, ".markdown": MARKDOWN}
+
+
+# ── Token counting ─────────────────────────────────────────────────────────
+
+_WORDS = re.compile(r"\w+|[^\w\s]")
+
+
+def approximate_tokens(text: str) -> int:
+    """Upper-bound style estimate of WordPiece/SentencePiece token counts.
+
+    Used when no model tokenizer is available: one token per punctuation
+    mark and one per started three characters of each word, which
+    overestimates English and roughly matches French subword splits.
+    """
+    return sum(max(1, math.ceil(len(w) / 3)) if w[0].isalnum() or w[0] == "_" else 1
+               for w in _WORDS.findall(text))
+
+
+def token_counter(embedding_function=None) -> Tuple[Callable[[str], int], int, str]:
+    """(count_tokens, max_tokens, label) matching `embedding_function`'s model.
+
+    Understands chromadb's SentenceTransformerEmbeddingFunction (its
+    tokenizer and `max_seq_length`) and the default ONNX MiniLM function;
+    anything else, or a model that is not available locally, falls back to
+    `approximate_tokens` with the default model's budget.
+    """
+    model = getattr(embedding_function, "_model", None)
+    tokenizer = getattr(model, "tokenizer", None)
+    max_seq = getattr(model, "max_seq_length", None)
+    if tokenizer is not None and max_seq:
+        special = tokenizer.num_special_tokens_to_add()
+
+        def count(text: str) -> int:
+            return len(tokenizer.encode(text, add_special_tokens=False, verbose=False))
+
+        return count, max_seq - special, getattr(tokenizer, "name_or_path", "sentence-transformers")
+
+    if embedding_function is not None and hasattr(embedding_function, "EXTRACTED_FOLDER_NAME"):
+        try:
+            from tokenizers import Tokenizer
+
+            embedding_function._download_model_if_not_exists()
+            # a private copy: the function's own tokenizer truncates and pads to 256
+            onnx_tokenizer = Tokenizer.from_file(os.path.join(
+                embedding_function.DOWNLOAD_PATH, embedding_function.EXTRACTED_FOLDER_NAME, "tokenizer.json"))
+        except Exception as e:  # offline, or tokenizers missing
+            print(f"[chunker] model tokenizer unavailable ({e}); using approximate token counts", file=sys.stderr)
+        else:
+            def count(text: str) -> int:
+                return len(onnx_tokenizer.encode(text, add_special_tokens=False).ids)
+
+            return count, DEFAULT_MAX_TOKENS, "all-MiniLM-L6-v2"
+
+    return approximate_tokens, DEFAULT_MAX_TOKENS, "approximate"
+
+
+# ── Structural blocks ──────────────────────────────────────────────────────
+
+class _Block:
+    """One paragraph, heading or verbatim environment and the source lines it spans."""
+
+    __slots__ = ("text", "section", "sep", "_chars", "_lines")
+
+    def __init__(self, section: Tuple[str, ...], sep: str = "\n"):
+        self.text = ""
+        self.section = section
+        self.sep = sep  # " " re-joins hard-wrapped prose lines
+        self._chars: List[int] = []  # offset in `text` where each source line starts
+        self._lines: List[Tuple[int, int, int]] = []  # (line number, start byte, end byte)
+
+    def append(self, text: str, line_no: int, start: int, end: int):
+        if self.text:
+            self.text += self.sep
+        self._chars.append(len(self.text))
+        self._lines.append((line_no, start, end))
+        self.text += text
+
+    def span(self, s: int, e: int) -> Tuple[int, int, int, int]:
+        """(line_start, line_end, start_byte, end_byte) of text[s:e]'s source lines."""
+        first = self._lines[max(0, bisect.bisect_right(self._chars, s) - 1)]
+        last = self._lines[max(0, bisect.bisect_right(self._chars, max(s, e - 1)) - 1)]
+        return first[0], last[0], first[1], last[2]
+
+
+def _read_lines(path: str) -> Iterator[Tuple[int, int, int, str]]:
+    """(line number, start byte, end byte, text) for each line, without loading the file."""
+    offset = 0
+    with open(path, "rb") as fh:
+        for line_no, raw in enumerate(fh, start=1):
+            text = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            if line_no == 1:
+                text = text.lstrip("\ufeff")
+            yield line_no, offset, offset + len(raw.rstrip(b"\r\n")), text
+            offset += len(raw)
+
+
+_TEX_HEADING = re.compile(r"\\(part|chapter|section|subsection|subsubsection|paragraph)\*?\s*(?:\[[^\]]*\])?\{")
+_TEX_LEVELS = {"part": 0, "chapter": 1, "section": 2, "subsection": 3, "subsubsection": 4, "paragraph": 5}
+_TEX_ENV = re.compile(r"\\(begin|end)\{([^}]*)\}")
+_TEX_COMMENT = re.compile(r"(?<!\\)%.*")
+_TEX_DROP = re.compile(r"\\(?:label|ref|eqref|pageref|autoref|cref|cite[pt]?|index|vspace|hspace|tnoteref|fnref|corref)\*?"
+                       r"(?:\[[^\]]*\])?\{[^{}]*\}")
+_TEX_UNWRAP = re.compile(r"\\[a-zA-Z]+\*?(?:\[[^\]]*\])?\{([^{}]*)\}")
+_TEX_ESCAPED = re.compile(r"\\([%&#_$])")
+_TEX_BARE = re.compile(r"\\(?:[a-zA-Z]+\*?(?:\[[^\]]*\])?|\\)\s*")
+_TEX_ENV_ARGS = re.compile(r"^(?:\[[^\]]*\]|\{[^{}]*\})*")
+
+# kept verbatim as one block (code and display math); dropped entirely (drawings)
+_RAW_ENVS = {"lstlisting", "verbatim", "Verbatim", "minted", "equation", "equation*", "align", "align*",
+             "gather", "gather*", "multline", "multline*", "algorithmic"}
+_SKIP_ENVS = {"tikzpicture"}
+
+
+def _clean_tex(text: str) -> str:
+    text = _TEX_DROP.sub("", text)
+    while True:
+        unwrapped = _TEX_UNWRAP.sub(r"\1", text)
+        if unwrapped == text:
+            break
+        text = unwrapped
+    text = _TEX_ESCAPED.sub(r"\1", text).replace("~", " ").replace("``", '"').replace("''", '"')
+    text = re.sub(r"\\item\b\s*", "- ", text)
+    text = _TEX_BARE.sub("", text).replace("{", "").replace("}", "")  # braces of multi-line groups
+    return re.sub(r"[ \t]{2,}", " ", text).strip()
+
+
+def _closing_brace(text: str, i: int) -> int:
+    """Index just past the brace closing the group opened before `i`."""
+    depth = 1
+    while i < len(text) and depth:
+        if text[i] == "{":
+            depth += 1
+        elif text[i] == "}":
+            depth -= 1
+        i += 1
+    return i
+
+
+class _Sections:
+    """Heading stack -> section path tuple."""
+
+    def __init__(self):
+        self.stack: List[Tuple[int, str]] = []
+
+    def enter(self, level: int, title: str) -> Tuple[str, ...]:
+        self.stack = [(lvl, t) for lvl, t in self.stack if lvl < level] + [(level, title)]
+        return self.path
+
+    @property
+    def path(self) -> Tuple[str, ...]:
+        return tuple(t for _, t in self.stack)
+
+
+def _latex_blocks(lines: Iterable[Tuple[int, int, int, str]]) -> Iterator[_Block]:
+    sections = _Sections()
+    block: Optional[_Block] = None
+    raw_env = skip_env = None
+    option_depth = 0
+    in_preamble = None  # decided by the first meaningful line
+
+    for line_no, start, end, line in lines:
+        stripped = line.strip()
+        if in_preamble is None and stripped and not stripped.startswith("%"):
+            in_preamble = stripped.startswith("\\documentclass")
+        if in_preamble:
+            in_preamble = not stripped.startswith("\\begin{document}")
+            continue
+        if stripped.startswith("\\end{document}"):
+            break
+
+        if skip_env:
+            if f"\\end{{{skip_env}}}" in line:
+                skip_env = None
+            continue
+        if raw_env:
+            if option_depth > 0:  # \begin{lstlisting}[caption={...}] continued on this line
+                option_depth += line.count("[") - line.count("]")
+                continue
+            if f"\\end{{{raw_env}}}" in line:
+                raw_env = None
+                if block is not None:
+                    yield block
+                block = None
+                continue
+            if block is None:
+                block = _Block(sections.path)
+            block.append(line, line_no, start, end)
+            continue
+
+        line = _TEX_COMMENT.sub("", line)
+        stripped = line.strip()
+        if not stripped:
+            if not line and block is not None:  # blank source line ends the paragraph
+                yield block
+                block = None
+            continue
+
+        env = _TEX_ENV.match(stripped)
+        if env:
+            kind, name = env.groups()
+            if kind == "begin" and (name in _RAW_ENVS or name in _SKIP_ENVS):
+                if block is not None:
+                    yield block
+                    block = None
+                if name in _SKIP_ENVS:
+                    skip_env = name if f"\\end{{{name}}}" not in stripped else None
+                else:
+                    raw_env = name
+                    rest = stripped[env.end():]
+                    option_depth = rest.count("[") - rest.count("]")
+                continue
+            if kind == "begin" and name == "abstract":
+                if block is not None:
+                    yield block
+                    block = None
+                sections.enter(_TEX_LEVELS["section"], "Abstract")
+            rest = stripped[env.end():]
+            stripped = rest[_TEX_ENV_ARGS.match(rest).end():].strip()
+            if not stripped:
+                continue
+
+        heading = _TEX_HEADING.match(stripped)
+        if heading:
+            if block is not None:
+                yield block
+            close = _closing_brace(stripped, heading.end())
+            title = _clean_tex(stripped[heading.end():close - 1])
+            path = sections.enter(_TEX_LEVELS[heading.group(1)], title)
+            block = _Block(path)
+            block.append(title, line_no, start, end)
+            yield block
+            block = None
+            stripped = stripped[close:].strip()  # \paragraph{Title} text...
+            if not stripped:
+                continue
+
+        text = _clean_tex(stripped)
+        if not text:
+            continue
+        if block is None:
+            block = _Block(sections.path, " ")
+        block.append(text, line_no, start, end)
+
+    if block is not None:
+        yield block
+
+
+_MD_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_MD_FENCE = re.compile(r"^\s*(`{3,}|~{3,})")
+_MD_RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+
+
+def _markdown_blocks(lines: Iterable[Tuple[int, int, int, str]]) -> Iterator[_Block]:
+    sections = _Sections()
+    block: Optional[_Block] = None
+    fence = None
+
+    for line_no, start, end, line in lines:
+        if fence:
+            if line.strip().startswith(fence):
+                fence = None
+                if block is not None:
+                    yield block
+                block = None
+                continue
+            if block is None:
+                block = _Block(sections.path)
+            block.append(line, line_no, start, end)
+            continue
+
+        opening = _MD_FENCE.match(line)
+        heading = _MD_HEADING.match(line)
+        if opening or heading or not line.strip() or _MD_RULE.match(line):
+            if block is not None:
+                yield block
+                block = None
+        if opening:
+            fence = opening.group(1)
+        elif heading:
+            path = sections.enter(len(heading.group(1)), heading.group(2))
+            block = _Block(path)
+            block.append(heading.group(2), line_no, start, end)
+            yield block
+            block = None
+        elif line.strip() and not _MD_RULE.match(line):
+            if block is None:
+                block = _Block(sections.path)
+            block.append(line.rstrip(), line_no, start, end)
+
+    if block is not None:
+        yield block
+
+
+def _text_blocks(lines: Iterable[Tuple[int, int, int, str]]) -> Iterator[_Block]:
+    block: Optional[_Block] = None
+    for line_no, start, end, line in lines:
+        if not line.strip():
+            if block is not None:
+                yield block
+                block = None
+            continue
+        if block is None:
+            block = _Block(())
+        block.append(line.strip(), line_no, start, end)
+    if block is not None:
+        yield block
+
+
+_BLOCK_READERS = {LATEX: _latex_blocks, MARKDOWN: _markdown_blocks, TEXT: _text_blocks}
+
+
+# ── Packing blocks into chunks ─────────────────────────────────────────────
+
+# coarse to fine: paragraphs, sentences, lines, words
+_SPLITTERS = (
+    re.compile(r"\n\s*\n"),
+    re.compile(r"(?<=[.!?;:])\s+"),
+    re.compile(r"\n"),
+    re.compile(r"\s+"),
+)
+
+
+def _spans(text: str, s: int, e: int, splitter) -> List[Tuple[int, int]]:
+    spans, pos = [], s
+    for m in splitter.finditer(text, s, e):
+        if m.start() > pos:
+            spans.append((pos, m.start()))
+        pos = m.end()
+    if pos < e:
+        spans.append((pos, e))
+    return spans
+
+
+def _split_to_fit(text: str, s: int, e: int, count, budget: int, level: int = 0) -> Iterator[Tuple[int, int, int]]:
+    """(start, end, tokens) pieces of text[s:e], each at most `budget` tokens.
+
+    Text is only cut as finely as needed; regrouping the pieces is left to
+    the packer so that overlap can reuse individual sentences.
+    """
+    tokens = count(text[s:e])
+    if tokens <= budget:
+        yield s, e, tokens
+        return
+    if level >= len(_SPLITTERS):
+        # a single "word" longer than the budget: cut it by characters
+        mid = s + max(1, (e - s) // 2)
+        yield from _split_to_fit(text, s, mid, count, budget, level)
+        yield from _split_to_fit(text, mid, e, count, budget, level)
+        return
+    for ps, pe in _spans(text, s, e, _SPLITTERS[level]):
+        yield from _split_to_fit(text, ps, pe, count, budget, level + 1)
+
+
+class _Unit:
+    """A slice of a block small enough to pack."""
+
+    __slots__ = ("block", "start", "end", "tokens")
+
+    def __init__(self, block: _Block, start: int, end: int, tokens: int):
+        self.block = block
+        self.start = start
+        self.end = end
+        self.tokens = tokens
+
+    @property
+    def text(self) -> str:
+        return self.block.text[self.start:self.end]
+
+
+class Chunk:
+    """One embeddable chunk and where it came from."""
+
+    __slots__ = ("id", "text", "source", "section", "index", "tokens",
+                 "line_start", "line_end", "start_byte", "end_byte")
+
+    def __init__(self, id: str, text: str, source: str, section: Tuple[str, ...], index: int, tokens: int,
+                 line_start: int, line_end: int, start_byte: int, end_byte: int):
+        self.id = id
+        self.text = text
+        self.source = source
+        self.section = section
+        self.index = index
+        self.tokens = tokens
+        self.line_start = line_start
+        self.line_end = line_end
+        self.start_byte = start_byte
+        self.end_byte = end_byte
+
+    def metadata(self) -> dict:
+        """Scalar-only metadata for collection.add (the byte span covers whole source lines)."""
+        return {
+            "source": self.source,
+            "section": " > ".join(self.section),
+            "chunk": self.index,
+            "tokens": self.tokens,
+            "line_start": self.line_start,
+            "line_end": self.line_end,
+            "start_byte": self.start_byte,
+            "end_byte": self.end_byte,
+        }
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "text": self.text, **self.metadata()}
+
+
+def _join(units: List[_Unit]) -> str:
+    parts = []
+    for i, unit in enumerate(units):
+        if i:
+            prev = units[i - 1]
+            if prev.block is unit.block and prev.end <= unit.start:
+                parts.append(unit.block.text[prev.end:unit.start] or " ")  # the original separator
+            else:
+                parts.append("\n\n")
+        parts.append(unit.text)
+    return "".join(parts)
+
+
+def _tail(units: List[_Unit], count, overlap: int) -> List[_Unit]:
+    """Trailing units (whole, or their last sentences) totalling at most `overlap` tokens."""
+    tail: List[_Unit] = []
+    room = overlap
+    for unit in reversed(units):
+        if unit.tokens <= room:
+            tail.insert(0, unit)
+            room -= unit.tokens
+            continue
+        for s, e in reversed(_spans(unit.block.text, unit.start, unit.end, _SPLITTERS[1])):
+            n = count(unit.block.text[s:e])
+            if n > room:
+                break
+            tail.insert(0, _Unit(unit.block, s, e, n))
+            room -= n
+        break
+    return tail
+
+
+def chunk_blocks(blocks: Iterable[_Block], source: str, count_tokens=approximate_tokens,
+                 max_tokens: int = DEFAULT_MAX_TOKENS, overlap: int = 0) -> Iterator[Chunk]:
+    """Greedily pack blocks into chunks of at most `max_tokens` tokens.
+
+    Chunks never span two sections; blocks larger than the budget are split
+    at paragraph, line, sentence and finally word boundaries. With
+    `overlap`, each chunk after the first in a section starts with up to
+    that many tokens from the end of the previous one.
+    """
+    if max_tokens < 1:
+        raise ValueError("max_tokens must be positive")
+    if not 0 <= overlap < max_tokens // 2:
+        raise ValueError("overlap must be non-negative and less than half of max_tokens")
+
+    def units() -> Iterator[_Unit]:
+        for block in blocks:
+            for s, e, n in _split_to_fit(block.text, 0, len(block.text), count_tokens, max_tokens):
+                yield _Unit(block, s, e, n)
+
+    pending: deque = deque()
+    stream = units()
+    current: List[_Unit] = []
+    carried = 0  # leading units of `current` repeated from the previous chunk
+    index = 0
+
+    def emit(chunk_units: List[_Unit]) -> Optional[Chunk]:
+        nonlocal index
+        text = _join(chunk_units)
+        tokens = count_tokens(text)
+        first, last = chunk_units[0], chunk_units[-1]
+        line_start, _, start_byte, _ = first.block.span(first.start, first.end)
+        _, line_end, _, end_byte = last.block.span(last.start, last.end)
+        chunk = Chunk(f"{source}:{index}", text, source, first.block.section, index, tokens,
+                      line_start, line_end, start_byte, end_byte)
+        index += 1
+        return chunk
+
+    def flush(keep_overlap: bool) -> Iterator[Chunk]:
+        nonlocal current, carried
+        while current and len(current) > carried:
+            # joining may tokenize slightly differently than the parts alone
+            if len(current) - carried > 1 and count_tokens(_join(current)) > max_tokens:
+                pending.appendleft(current.pop())
+                continue
+            if carried and count_tokens(_join(current)) > max_tokens:
+                current = current[carried:]
+                carried = 0
+                continue
+            yield emit(current)
+            break
+        if keep_overlap and overlap and current:
+            current = _tail(current, count_tokens, overlap)
+            carried = len(current)
+        else:
+            current, carried = [], 0
+
+    while True:
+        if pending:
+            unit = pending.popleft()
+        else:
+            unit = next(stream, None)
+            if unit is None:
+                break
+        if current and unit.block.section != current[-1].block.section:
+            yield from flush(keep_overlap=False)
+        elif current and len(current) > carried and sum(u.tokens for u in current) + unit.tokens > max_tokens:
+            yield from flush(keep_overlap=True)
+            if pending:  # flush pushed units back; they come before `unit`
+                pending.append(unit)
+                continue
+        while carried and sum(u.tokens for u in current) + unit.tokens > max_tokens:
+            current.pop(0)
+            carried -= 1
+        current.append(unit)
+    yield from flush(keep_overlap=False)
+
+
+def detect_format(path: str) -> str:
+    return _EXTENSIONS.get(os.path.splitext(path)[1].lower(), TEXT)
+
+
+def ingest_root(paths: Iterable[str]) -> str:
+    """Deepest directory containing every path (the directory of a lone file)."""
+    dirs = [os.path.dirname(os.path.abspath(p)) for p in paths]
+    return os.path.commonpath(dirs) if dirs else os.getcwd()
+
+
+def source_name(path: str, root: Optional[str] = None) -> str:
+    """`path` relative to the ingest root, so same-named files in different directories get distinct ids."""
+    if root is None:
+        return os.path.basename(path)
+    return os.path.relpath(os.path.abspath(path), root).replace(os.sep, "/")
+
+
+def chunk_file(path: str, count_tokens=approximate_tokens, max_tokens: int = DEFAULT_MAX_TOKENS,
+               overlap: int = 0, fmt: Optional[str] = None, source: Optional[str] = None,
+               root: Optional[str] = None) -> Iterator[Chunk]:
+    """Stream the chunks of one LaTeX, Markdown or plain-text file.
+
+    Chunk ids are `<source>:<index>`; `source` defaults to the path relative
+    to `root`, or the file's basename without one.
+    """
+    reader = _BLOCK_READERS[fmt or detect_format(path)]
+    return chunk_blocks(reader(_read_lines(path)), source or source_name(path, root),
+                        count_tokens, max_tokens, overlap)
+
+
+def chunk_files(paths: Iterable[str], root: Optional[str] = None, **kwargs) -> Iterator[Chunk]:
+    """Chunks of every path, sourced relative to `root` (default: their common directory)."""
+    paths = list(paths)
+    if root is None:
+        root = ingest_root(paths)
+    for path in paths:
+        yield from chunk_file(path, root=root, **kwargs)
+
+
+def add_chunks(collection, chunks: Iterable[Chunk], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """collection.add the chunks `batch_size` at a time; returns how many were added."""
+    added = 0
+    batch: List[Chunk] = []
+
+    def flush():
+        collection.add(
+            ids=[c.id for c in batch],
+            documents=[c.text for c in batch],
+            metadatas=[c.metadata() for c in batch],
+        )
+
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            flush()
+            added += len(batch)
+            batch = []
+    if batch:
+        flush()
+        added += len(batch)
+    return added
+
+
+# ── CLI ────────────────────────────────────────────────────────────────────
+
+def _summarize(chunks: Iterable[Chunk], max_tokens: int, sink=None) -> dict:
+    per_source: dict = {}
+    for chunk in chunks:
+        stats = per_source.setdefault(chunk.source, {"chunks": 0, "tokens": 0, "max_tokens": 0, "over_budget": 0})
+        stats["chunks"] += 1
+        stats["tokens"] += chunk.tokens
+        stats["max_tokens"] = max(stats["max_tokens"], chunk.tokens)
+        stats["over_budget"] += chunk.tokens > max_tokens
+        if sink is not None:
+            sink.write(json.dumps(chunk.to_dict(), ensure_ascii=False) + "\n")
+    return per_source
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split LaTeX/Markdown documents into model-sized chunks for ChromaDB")
+    parser.add_argument("paths", nargs="+", help="Files to chunk (.tex, .md, anything else as plain text)")
+    parser.add_argument("--max-tokens", type=int,
+                        help="Token budget per chunk (default and upper bound: the model's max sequence length)")
+    parser.add_argument("--overlap", type=int, default=0, help="Tokens repeated from the previous chunk (default: 0)")
+    parser.add_argument("--jsonl", metavar="PATH", help="Write chunks as JSON lines ('-' for stdout)")
+    parser.add_argument("--index", action="store_true",
+                        help="Add the chunks to an in-memory collection with chromadb's default embedding function")
+    parser.add_argument("--query", action="append", default=[], help="Query the indexed chunks (repeatable; implies --index)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Chunks per collection.add call (default: {DEFAULT_BATCH_SIZE})")
+    args = parser.parse_args()
+
+    embedding_fn = None
+    if args.index or args.query:
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+        embedding_fn = DefaultEmbeddingFunction()
+    count, model_budget, label = token_counter(embedding_fn)
+    max_tokens = model_budget if args.max_tokens is None else args.max_tokens
+    if max_tokens > model_budget:
+        parser.error(f"--max-tokens {max_tokens} exceeds the model's budget of {model_budget} tokens")
+    try:
+        chunks = chunk_files(args.paths, count_tokens=count, max_tokens=max_tokens, overlap=args.overlap)
+        if args.index or args.query:
+            import chromadb
+
+            collection = chromadb.Client().create_collection(name="chunks", embedding_function=embedding_fn)
+            added = add_chunks(collection, chunks, args.batch_size)
+            print(f"Indexed {added} chunks ({label}, max {max_tokens} tokens)", file=sys.stderr)
+            for query in args.query:
+                res = collection.query(query_texts=[query], n_results=3)
+                print(f"\nQuery: {query}")
+                for doc, dist, meta in zip(res["documents"][0], res["distances"][0], res["metadatas"][0]):
+                    print(f"  [{dist:.4f}] {meta['source']}:{meta['line_start']}-{meta['line_end']} "
+                          f"({meta['section']}) {doc[:70]!r}")
+            return
+
+        sink = None
+        if args.jsonl == "-":
+            sink = sys.stdout
+        elif args.jsonl:
+            sink = open(args.jsonl, "w", encoding="utf-8")
+        try:
+            per_source = _summarize(chunks, max_tokens, sink)
+        finally:
+            if sink not in (None, sys.stdout):
+                sink.close()
+    except (OSError, ValueError) as e:
+        sys.exit(f"error: {e}")
+
+    out = sys.stderr if args.jsonl == "-" else sys.stdout
+    print(f"Token budget: {max_tokens} ({label}), overlap {args.overlap}", file=out)
+    for source, stats in per_source.items():
+        mean = stats["tokens"] / stats["chunks"]
+        print(f"  {source:<28} {stats['chunks']:>5} chunks  mean {mean:6.1f}  max {stats['max_tokens']:>4} tokens"
+              f"  over budget {stats['over_budget']}", file=out)
+
+
+if __name__ == "__main__":
+    main()
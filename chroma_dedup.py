@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+"""
+chroma_dedup.py - Duplicate and near-duplicate removal before embedding
+Policy feeds repeat the same lines (boilerplate, re-exports, one policy
+copied across stores). `dedupe` drops exact duplicates by hashing a
+normalized form of each text, then groups near-duplicates with MinHash
+signatures and LSH banding, so every group is embedded once. The kept
+record's metadata lists the ids and line numbers of the records it stands
+for.
+
+Usage:
+    python chroma_dedup.py polices.txt --line-key ligne
+    python chroma_dedup.py --synthetic 20000 --threshold 0.8
+"""
+
+import argparse
+import hashlib
+import random
+import re
+import sys
+import time
+import unicodedata
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 128
+DEFAULT_SHINGLE = 5
+EMBED_BATCH = 32  # texts per forward pass in chromadb's default ONNX function
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+_PUNCT = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+_NUMBERS = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def normalize(text: str) -> str:
+    """Case-, accent-form-, punctuation- and whitespace-insensitive form of `text`."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _SPACES.sub(" ", _PUNCT.sub(" ", text)).strip()
+
+
+class Record:
+    """One document headed for collection.add."""
+
+    __slots__ = ("id", "text", "metadata", "duplicates")
+
+    def __init__(self, id: str, text: str, metadata: Optional[dict] = None):
+        self.id = id
+        self.text = text
+        self.metadata = dict(metadata or {})
+        self.duplicates: List["Record"] = []
+
+
+class DedupResult:
+    """Kept records plus counters for the report."""
+
+    def __init__(self, kept: List[Record], total: int, exact: int, near: int, seconds: float):
+        self.kept = kept
+        self.total = total
+        self.exact = exact
+        self.near = near
+        self.seconds = seconds
+
+    def to_dict(self, batch_size: int = EMBED_BATCH) -> dict:
+        kept = len(self.kept)
+        return {
+            "records": self.total,
+            "exact_duplicates": self.exact,
+            "near_duplicates": self.near,
+            "embedded": kept,
+            "embeddings_saved": self.total - kept,
+            "saved_pct": round(100.0 * (self.total - kept) / self.total, 1) if self.total else 0.0,
+            "embed_batches_before": -(-self.total // batch_size),
+            "embed_batches_after": -(-kept // batch_size),
+            "dedup_seconds": round(self.seconds, 4),
+        }
+
+
+def _lsh_shape(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """(bands, rows) whose S-curve midpoint (1/b)^(1/r) is closest to `threshold`."""
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        gap = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if best is None or gap < best[0]:
+            best = (gap, bands, rows)
+    return best[1], best[2]
+
+
+class MinHasher:
+    """MinHash signatures over character shingles of normalized text."""
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, shingle: int = DEFAULT_SHINGLE, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _MERSENNE, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _MERSENNE, size=num_perm, dtype=np.uint64)
+        self.shingle = shingle
+
+    def signature(self, normalized: str) -> np.ndarray:
+        k = self.shingle
+        grams = {normalized[i:i + k] for i in range(max(1, len(normalized) - k + 1))}
+        hv = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+        # uint64 products wrap around, as in the usual numpy MinHash formulation
+        with np.errstate(over="ignore"):
+            phv = ((hv[:, None] * self.a + self.b) % _MERSENNE) & _MAX_HASH
+        return phv.min(axis=0).astype(np.uint32)
+
+
+class Deduper:
+    """Incremental exact + near-duplicate filter.
+
+    `add` answers for one record at a time, so it can sit inside a
+    streaming ingest: a record is kept unless its normalized text was seen
+    before or it is a near-duplicate of an already kept record.
+    Near-duplicates are LSH candidates whose estimated Jaccard similarity is
+    at least `threshold` and whose numbers are identical: "returns within
+    30 days" and "returns within 60 days" stay separate however similar the
+    rest of the sentence is.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, num_perm: int = DEFAULT_NUM_PERM,
+                 shingle: int = DEFAULT_SHINGLE, near: bool = True):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.near = near
+        self.hasher = MinHasher(num_perm, shingle) if near else None
+        self.bands, self.rows = _lsh_shape(num_perm, threshold)
+        self.kept: List[Record] = []
+        self.total = self.exact = self.near_count = 0
+        self._by_hash: Dict[bytes, Record] = {}
+        self._buckets: List[Dict[bytes, int]] = [{} for _ in range(self.bands)]
+        # one entry per kept or near-duplicate record seen by LSH
+        self._signatures: List[np.ndarray] = []
+        self._numbers: List[tuple] = []
+        self._heads: List[Record] = []
+
+    def add(self, record: Record) -> Optional[Record]:
+        """None if `record` is kept, else the kept record it duplicates."""
+        self.total += 1
+        key = normalize(record.text)
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        head = self._by_hash.get(digest)
+        if head is not None:
+            head.duplicates.append(record)
+            self.exact += 1
+            return head
+        if self.near:
+            signature = self.hasher.signature(key)
+            numbers = tuple(_NUMBERS.findall(key))
+            band_keys = [signature[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+            needed = self.threshold * self.num_perm
+            for band, band_key in enumerate(band_keys):
+                # compare with the bucket's first member only: linear per bucket
+                first = self._buckets[band].get(band_key)
+                if (first is not None and self._numbers[first] == numbers
+                        and np.count_nonzero(self._signatures[first] == signature) >= needed):
+                    head = self._heads[first]
+                    break
+            index = len(self._heads)
+            for band_key, buckets in zip(band_keys, self._buckets):
+                buckets.setdefault(band_key, index)
+            self._signatures.append(signature)
+            self._numbers.append(numbers)
+            self._heads.append(head or record)
+            if head is not None:
+                # later variants may match this copy rather than the original
+                head.duplicates.append(record)
+                self._by_hash[digest] = head
+                self.near_count += 1
+                return head
+        self._by_hash[digest] = record
+        self.kept.append(record)
+        return None
+
+    def annotate(self, line_key: Optional[str] = "line") -> List[Record]:
+        """Write duplicate metadata on kept records; returns the ones that have duplicates.
+
+        `duplicates`, `duplicate_ids` and (with `line_key`) `duplicate_lines`
+        are added; the id/line lists are comma-separated strings because
+        metadata values must be scalars.
+        """
+        changed = []
+        for record in self.kept:
+            if not record.duplicates:
+                continue
+            record.metadata["duplicates"] = len(record.duplicates)
+            record.metadata["duplicate_ids"] = ",".join(d.id for d in record.duplicates)
+            if line_key:
+                lines = [str(d.metadata[line_key]) for d in record.duplicates if line_key in d.metadata]
+                if lines:
+                    record.metadata["duplicate_lines"] = ",".join(lines)
+            changed.append(record)
+        return changed
+
+
+def dedupe(records: Iterable[Record], threshold: float = DEFAULT_THRESHOLD, num_perm: int = DEFAULT_NUM_PERM,
+           shingle: int = DEFAULT_SHINGLE, line_key: Optional[str] = "line", near: bool = True) -> DedupResult:
+    """Collapse exact and near-duplicate records, keeping the first of each
+    group and annotating it (see `Deduper`)."""
+    started = time.perf_counter()
+    deduper = Deduper(threshold, num_perm, shingle, near)
+    for record in records:
+        deduper.add(record)
+    deduper.annotate(line_key)
+    return DedupResult(deduper.kept, deduper.total, deduper.exact, deduper.near_count,
+                       time.perf_counter() - started)
+
+
+def add_records(collection, records: Iterable[Record], batch_size: int = 256) -> int:
+    """collection.add kept records in batches; returns how many were added."""
+    batch: List[Record] = []
+    added = 0
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            collection.add(ids=[r.id for r in batch], documents=[r.text for r in batch],
+                           metadatas=[r.metadata for r in batch])
+            added += len(batch)
+            batch = []
+    if batch:
+        collection.add(ids=[r.id for r in batch], documents=[r.text for r in batch],
+                       metadatas=[r.metadata for r in batch])
+        added += len(batch)
+    return added
+
+
+# ── Synthetic corpus ───────────────────────────────────────────────────────
+
+_STORES = ["Montréal", "Québec", "Toronto", "Vancouver", "Calgary", "Ottawa", "Halifax", "Winnipeg"]
+_BOILERPLATE = [
+    "See our full terms and conditions for details.",
+    "Contact customer service for any questions.",
+    "This policy may change without notice.",
+]
+
+
+def _perturb(text: str, rng: random.Random) -> str:
+    """A near-duplicate: one typo and maybe a store tag, as in feeds copied across stores."""
+    chars = list(text)
+    letters = [i for i, c in enumerate(chars) if c.isalpha()]
+    if letters:
+        i = rng.choice(letters)
+        if rng.random() < 0.5:
+            del chars[i]
+        else:
+            chars[i] = rng.choice("aeioustr")
+    text = "".join(chars)
+    if rng.random() < 0.5:
+        text = f"{text} ({rng.choice(_STORES)})"
+    return text
+
+
+def _reformat(text: str, rng: random.Random) -> str:
+    """An exact duplicate after normalization: case, spacing, punctuation."""
+    variants = [text.upper(), text.lower(), "  " + text.replace(" ", "  "), text.rstrip(".") + " !", text + " "]
+    return rng.choice(variants)
+
+
+def synthetic_corpus(base: List[str], size: int, exact_rate: float = 0.3, near_rate: float = 0.2,
+                     boilerplate_rate: float = 0.1, seed: int = 0) -> List[Record]:
+    """`size` records: every `base` line once, then random picks turned into
+    reformatted copies, perturbed near-copies, boilerplate lines or (the
+    remainder) distinct documents, in the given proportions."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(size):
+        if i < len(base):
+            records.append(Record(f"doc-{i}", base[i], {"line": i}))
+            continue
+        roll = rng.random()
+        text = rng.choice(base)
+        if roll < boilerplate_rate:
+            text = rng.choice(_BOILERPLATE)
+        elif roll < boilerplate_rate + exact_rate:
+            text = _reformat(text, rng)
+        elif roll < boilerplate_rate + exact_rate + near_rate:
+            text = _perturb(text, rng)
+        else:
+            # distinct content: the base line tagged with a unique reference
+            text = f"{text} Ref {i}."
+        records.append(Record(f"doc-{i}", text, {"line": i}))
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact and near-duplicate removal before embedding")
+    parser.add_argument("path", nargs="?", help="Text file, one document per line")
+    parser.add_argument("--synthetic", type=int, metavar="N",
+                        help="Build an N-record synthetic feed from policies.txt instead of reading PATH")
+    parser.add_argument("--base", default="policies.txt", help="Base lines for --synthetic (default: policies.txt)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Jaccard similarity for near-duplicates (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM, help="MinHash permutations")
+    parser.add_argument("--exact-only", action="store_true", help="Skip near-duplicate grouping")
+    parser.add_argument("--line-key", default="line", help="Metadata key holding the line number (default: line)")
+    parser.add_argument("--show", type=int, default=5, help="Print this many of the largest groups")
+    args = parser.parse_args()
+    if not args.path and not args.synthetic:
+        parser.error("give a PATH or --synthetic N")
+
+    try:
+        if args.synthetic:
+            with open(args.base, "r", encoding="utf-8") as fh:
+                base = [line.strip() for line in fh if line.strip()]
+            records = synthetic_corpus(base, args.synthetic)
+            line_key = "line"
+        else:
+            with open(args.path, "r", encoding="utf-8") as fh:
+                records = [Record(f"{args.path}:{i}", line.strip(), {args.line_key: i})
+                           for i, line in enumerate(fh) if line.strip()]
+            line_key = args.line_key
+    except OSError as e:
+        sys.exit(f"error: {e}")
+
+    result = dedupe(records, args.threshold, args.num_perm, line_key=line_key, near=not args.exact_only)
+    stats = result.to_dict()
+    print(f"Records            : {stats['records']}")
+    print(f"Exact duplicates   : {stats['exact_duplicates']}")
+    print(f"Near duplicates    : {stats['near_duplicates']}")
+    print(f"Texts embedded     : {stats['embedded']} (saved {stats['embeddings_saved']}, {stats['saved_pct']}%)")
+    print(f"Embedding batches  : {stats['embed_batches_before']} -> {stats['embed_batches_after']} "
+          f"(batch size {EMBED_BATCH})")
+    print(f"Dedup time         : {stats['dedup_seconds']:.3f}s")
+    groups = sorted((r for r in result.kept if r.duplicates), key=lambda r: -len(r.duplicates))
+    for record in groups[:args.show]:
+        print(f"\n  x{len(record.duplicates) + 1}  {record.text[:80]}")
+        for dup in record.duplicates[:3]:
+            print(f"        ~ {dup.text[:80]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+#!/usr/bin/env python
+"""
+chroma_embedserver.py - Shared embedding daemon over a Unix domain socket
+Loads the embedding model once per host and serves embedding requests from
+any number of ingest/query processes. Requests arriving together (from
+several clients, or several embed threads of one pipeline) are coalesced
+into one model call of up to `--max-batch` texts. `RemoteEmbeddingFunction`
+is a drop-in replacement for `SentenceTransformerEmbeddingFunction`.
+
+Framing (little-endian, one request/response pair at a time per connection):
+    request   "CEMB" u8 version  u8 op      u16 flags  u32 count
+              EMBED: count x u32 byte lengths, then the UTF-8 texts back to back
+    response  "CEMB" u8 version  u8 status  u16 dtype  u32 rows  u32 width
+              OK + float32/float16: rows x width floats, row-major
+              OK + JSON (INFO) or ERROR: `width` bytes of UTF-8
+
+Usage:
+    python chroma_embedserver.py serve --model paraphrase-multilingual-MiniLM-L12-v2
+    python chroma_embedserver.py info
+    CHROMA_EMBED_SOCKET=/tmp/chroma-embed-1000.sock python main_fr_polices.py
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils.embedding_functions import register_embedding_function
+
+MAGIC = b"CEMB"
+VERSION = 1
+_REQUEST = struct.Struct("<4sBBHI")
+_RESPONSE = struct.Struct("<4sBBHII")
+
+OP_EMBED = 1
+OP_INFO = 2
+FLAG_FLOAT16 = 0x1  # ask for half-precision vectors (half the bytes on the wire)
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+DTYPE_JSON = 0
+DTYPE_FLOAT32 = 1
+DTYPE_FLOAT16 = 2
+_DTYPES = {DTYPE_FLOAT32: np.dtype("<f4"), DTYPE_FLOAT16: np.dtype("<f2")}
+
+DEFAULT_MAX_BATCH = 256
+DEFAULT_MAX_WAIT = 0.005  # seconds a batch waits for more requests to join
+MAX_REQUEST_BYTES = 256 << 20
+
+
+def default_socket_path() -> str:
+    """$CHROMA_EMBED_SOCKET, else a per-user socket in the temp directory."""
+    return os.environ.get("CHROMA_EMBED_SOCKET") or os.path.join(
+        tempfile.gettempdir(), f"chroma-embed-{os.getuid()}.sock")
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class RemoteError(Exception):
+    """The daemon could not embed the request (the message comes from the server)."""
+
+
+# ── framing ────────────────────────────────────────────────────────────────
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:], n - got)
+        if k == 0:
+            raise ConnectionError("connection closed mid-frame" if got else "connection closed")
+        got += k
+    return bytes(buf)
+
+
+def encode_request(op: int, texts: Sequence[str] = (), flags: int = 0) -> bytes:
+    blobs = [t.encode("utf-8") for t in texts]
+    lengths = np.fromiter((len(b) for b in blobs), dtype="<u4", count=len(blobs))
+    return b"".join([_REQUEST.pack(MAGIC, VERSION, op, flags, len(blobs)), lengths.tobytes(), *blobs])
+
+
+def read_request(sock: socket.socket) -> tuple:
+    """(op, flags, texts) of the next request on `sock`."""
+    magic, version, op, flags, count = _REQUEST.unpack(_recv_exact(sock, _REQUEST.size))
+    if magic != MAGIC or version != VERSION:
+        raise ProtocolError(f"bad request header {magic!r} v{version}")
+    if op != OP_EMBED:
+        return op, flags, []
+    if count > MAX_REQUEST_BYTES // 4:  # checked before the length table is allocated
+        raise ProtocolError(f"request of {count} texts exceeds {MAX_REQUEST_BYTES // 4}")
+    lengths = np.frombuffer(_recv_exact(sock, 4 * count), dtype="<u4") if count else np.zeros(0, "<u4")
+    total = int(lengths.sum())
+    if total > MAX_REQUEST_BYTES:
+        raise ProtocolError(f"request of {total} bytes exceeds {MAX_REQUEST_BYTES}")
+    blob = _recv_exact(sock, total)
+    texts, pos = [], 0
+    for n in lengths.tolist():
+        texts.append(blob[pos:pos + n].decode("utf-8"))
+        pos += n
+    return op, flags, texts
+
+
+def encode_vectors(vectors: np.ndarray, half: bool = False) -> bytes:
+    dtype = DTYPE_FLOAT16 if half else DTYPE_FLOAT32
+    array = np.ascontiguousarray(vectors, dtype=_DTYPES[dtype])
+    rows, width = array.shape
+    return _RESPONSE.pack(MAGIC, VERSION, STATUS_OK, dtype, rows, width) + array.tobytes()
+
+
+def _encode_text(status: int, text: str) -> bytes:
+    body = text.encode("utf-8")
+    return _RESPONSE.pack(MAGIC, VERSION, status, DTYPE_JSON, 0, len(body)) + body
+
+
+def read_response(sock: socket.socket):
+    """A float32 array of shape (rows, width), or the decoded JSON of an INFO reply."""
+    magic, version, status, dtype, rows, width = _RESPONSE.unpack(_recv_exact(sock, _RESPONSE.size))
+    if magic != MAGIC or version != VERSION:
+        raise ProtocolError(f"bad response header {magic!r} v{version}")
+    if status != STATUS_OK:
+        raise RemoteError(_recv_exact(sock, width).decode("utf-8", "replace"))
+    if dtype == DTYPE_JSON:
+        return json.loads(_recv_exact(sock, width))
+    if dtype not in _DTYPES:
+        raise ProtocolError(f"unknown dtype {dtype}")
+    raw = _recv_exact(sock, rows * width * _DTYPES[dtype].itemsize)
+    return np.frombuffer(raw, dtype=_DTYPES[dtype]).reshape(rows, width).astype(np.float32, copy=False)
+
+
+# ── server ─────────────────────────────────────────────────────────────────
+
+class _Job:
+    __slots__ = ("texts", "done", "result", "error")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.done = threading.Event()
+        self.result: Optional[np.ndarray] = None
+        self.error: Optional[BaseException] = None
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128  # every embed worker of every client may connect at once
+
+
+class EmbeddingServer:
+    """Serves `embed_fn` on a Unix socket, batching concurrent requests.
+
+    Each connection gets a handler thread that parses frames and queues a
+    job; a single batcher thread drains the queue into model calls of at
+    most `max_batch` texts, waiting up to `max_wait` seconds for a batch to
+    fill, and hands each job its slice of the result.
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], Embeddings], path: Optional[str] = None,
+                 max_batch: int = DEFAULT_MAX_BATCH, max_wait: float = DEFAULT_MAX_WAIT, model: str = ""):
+        self.embed_fn = embed_fn
+        self.path = path or default_socket_path()
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.model = model
+        self.dimension: Optional[int] = None
+        self.stats = {"connections": 0, "requests": 0, "texts": 0, "batches": 0, "embed_seconds": 0.0}
+        self._lock = threading.Lock()
+        self._jobs: "queue.Queue[_Job]" = queue.Queue()
+        self._stop = threading.Event()
+        self._server: Optional[_UnixServer] = None
+        self._threads: List[threading.Thread] = []
+        self._connections: set = set()
+
+    def _count(self, key: str, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def info(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["embed_seconds"] = round(stats["embed_seconds"], 3)
+        stats["mean_batch"] = round(stats["texts"] / stats["batches"], 1) if stats["batches"] else 0.0
+        return {"model": self.model, "dimension": self.dimension, "pid": os.getpid(),
+                "max_batch": self.max_batch, **stats}
+
+    # -- batching --
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed through the batcher (what a connection handler does)."""
+        job = _Job(texts)
+        self._jobs.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _collect(self) -> List[_Job]:
+        try:
+            first = self._jobs.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        jobs, size = [first], len(first.texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self._jobs.get(timeout=remaining) if remaining > 0 else self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            jobs.append(job)
+            size += len(job.texts)
+        return jobs
+
+    def _batch_loop(self):
+        while not self._stop.is_set():
+            jobs = self._collect()
+            if not jobs:
+                continue
+            texts = [t for job in jobs for t in job.texts]
+            try:
+                parts = []
+                for start in range(0, len(texts), self.max_batch):
+                    t0 = time.perf_counter()
+                    parts.append(np.asarray(self.embed_fn(texts[start:start + self.max_batch]), dtype=np.float32))
+                    self._count("embed_seconds", time.perf_counter() - t0)
+                    self._count("batches")
+                vectors = np.concatenate(parts) if len(parts) > 1 else parts[0]
+            except Exception as e:  # reported to every client of the batch
+                for job in jobs:
+                    job.error = e
+                    job.done.set()
+                continue
+            self._count("texts", len(texts))
+            pos = 0
+            for job in jobs:
+                job.result = vectors[pos:pos + len(job.texts)]
+                pos += len(job.texts)
+                job.done.set()
+
+    # -- connections --
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server._count("connections")
+                sock = self.request
+                with server._lock:
+                    server._connections.add(sock)
+                try:
+                    self._serve(sock)
+                finally:
+                    with server._lock:
+                        server._connections.discard(sock)
+
+            def _serve(self, sock):
+                while True:
+                    try:
+                        op, flags, texts = read_request(sock)
+                    except (ConnectionError, ProtocolError, UnicodeDecodeError, struct.error):
+                        return
+                    server._count("requests")
+                    try:
+                        if op == OP_INFO:
+                            reply = _encode_text(STATUS_OK, json.dumps(server.info()))
+                        elif op != OP_EMBED:
+                            reply = _encode_text(STATUS_ERROR, f"unknown op {op}")
+                        elif not texts:
+                            reply = encode_vectors(np.zeros((0, server.dimension or 0), np.float32))
+                        else:
+                            reply = encode_vectors(server.embed(texts), half=bool(flags & FLAG_FLOAT16))
+                    except Exception as e:
+                        reply = _encode_text(STATUS_ERROR, f"{type(e).__name__}: {e}")
+                    try:
+                        sock.sendall(reply)
+                    except OSError:
+                        return
+
+        return Handler
+
+    def _claim_path(self):
+        if not os.path.exists(self.path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            os.unlink(self.path)  # stale socket left by a daemon that died
+        else:
+            raise OSError(f"an embedding daemon is already listening on {self.path}")
+        finally:
+            probe.close()
+
+    def start(self) -> "EmbeddingServer":
+        self.dimension = int(np.asarray(self.embed_fn(["warm-up"])).shape[1])  # loads the model now
+        self._claim_path()
+        self._server = _UnixServer(self.path, self._make_handler())
+        os.chmod(self.path, 0o660)
+        self._threads = [
+            threading.Thread(target=self._batch_loop, name="embed-batcher", daemon=True),
+            threading.Thread(target=self._server.serve_forever, name="embed-accept", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        with self._lock:
+            connections = list(self._connections)
+        for sock in connections:  # clients see the close instead of waiting on a dead daemon
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for t in self._threads:
+            t.join()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def __enter__(self) -> "EmbeddingServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# ── client ─────────────────────────────────────────────────────────────────
+
+@register_embedding_function
+class RemoteEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Embedding function backed by a running `chroma_embedserver.py serve`.
+
+    Each calling thread keeps its own connection, so a pipeline's embed
+    workers send requests in parallel and the daemon batches them together.
+    A connection dropped by a daemon restart is retried once.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, half: bool = False, timeout: float = 120.0):
+        self.socket_path = socket_path or default_socket_path()
+        self.half = half
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                raise ConnectionError(f"no embedding daemon on {self.socket_path} ({e}); "
+                                      f"start one with: python chroma_embedserver.py serve") from e
+            self._local.sock = sock
+        return sock
+
+    def _drop(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _request(self, payload: bytes):
+        for attempt in (1, 2):
+            sock = self._connection()
+            try:
+                sock.sendall(payload)
+                return read_response(sock)
+            except (ConnectionError, BrokenPipeError) as e:
+                self._drop()
+                if attempt == 2 or isinstance(e, ConnectionRefusedError):
+                    raise
+            except (OSError, ProtocolError):
+                self._drop()  # timed out or out of sync: the next call starts clean
+                raise
+
+    def __call__(self, input: Documents) -> Embeddings:
+        texts = [input] if isinstance(input, str) else list(input)
+        vectors = self._request(encode_request(OP_EMBED, texts, FLAG_FLOAT16 if self.half else 0))
+        return list(vectors)
+
+    def info(self) -> dict:
+        return self._request(encode_request(OP_INFO))
+
+    def close(self):
+        self._drop()
+
+    @staticmethod
+    def name() -> str:
+        return "chroma_embedserver"
+
+    def get_config(self) -> dict:
+        return {"socket_path": self.socket_path, "half": self.half}
+
+    @staticmethod
+    def build_from_config(config: dict) -> "RemoteEmbeddingFunction":
+        return RemoteEmbeddingFunction(config.get("socket_path"), half=config.get("half", False))
+
+
+# ── model loading / CLI ────────────────────────────────────────────────────
+
+def load_model(model: str, device: Optional[str] = None):
+    """'default' is Chroma's ONNX all-MiniLM-L6-v2; anything else a sentence-transformers name."""
+    if model == "default":
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+        return DefaultEmbeddingFunction()
+    from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+    kwargs = {"device": device} if device else {}
+    return SentenceTransformerEmbeddingFunction(model_name=model, **kwargs)
+
+
+def _serve(args) -> int:
+    import signal
+
+    from chroma_membudget import current_rss, format_size
+
+    rss0 = current_rss()
+    t0 = time.perf_counter()
+    try:
+        server = EmbeddingServer(load_model(args.model, args.device), args.socket, max_batch=args.max_batch,
+                                 max_wait=args.max_wait_ms / 1000, model=args.model).start()
+    except Exception as e:  # model download/load failures come in many types
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(f"[embedserver] {args.model} ({server.dimension} dim) loaded in {time.perf_counter() - t0:.1f}s, "
+          f"+{format_size(current_rss() - rss0)} RSS; listening on {server.path}", file=sys.stderr)
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    stop.wait()
+    server.stop()
+    print(f"[embedserver] {json.dumps(server.info())}", file=sys.stderr)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared embedding daemon on a Unix domain socket")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="Load the model and serve embedding requests")
+    serve.add_argument("--model", default="paraphrase-multilingual-MiniLM-L12-v2",
+                       help="sentence-transformers model name, or 'default' for Chroma's ONNX MiniLM")
+    serve.add_argument("--device", help="Torch device for sentence-transformers models (e.g. cuda)")
+    serve.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH,
+                       help=f"Texts per model call (default: {DEFAULT_MAX_BATCH})")
+    serve.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT * 1000,
+                       help=f"How long a batch waits for more requests (default: {DEFAULT_MAX_WAIT * 1000:g})")
+
+    info = sub.add_parser("info", help="Print the running daemon's model and counters")
+    embed = sub.add_parser("embed", help="Embed texts through the daemon and print the vectors' heads")
+    embed.add_argument("texts", nargs="+")
+    for p in (serve, info, embed):
+        p.add_argument("--socket", default=None, help=f"Socket path (default: {default_socket_path()})")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        sys.exit(_serve(args))
+    client = RemoteEmbeddingFunction(args.socket)
+    try:
+        if args.command == "info":
+            print(json.dumps(client.info(), indent=2))
+        else:
+            for text, vector in zip(args.texts, client(args.texts)):
+                print(f"{len(vector)} dim  [{', '.join(f'{x:.4f}' for x in vector[:4])}, ...]  {text[:50]}")
+    except (OSError, RemoteError, ProtocolError) as e:
+        sys.exit(f"error: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,735 @@
+#!/usr/bin/env python
+"""
+chroma_maintain.py - Storage report and compaction for a PersistentClient store
+Deletes and upserts never shrink a persistent store. A deleted record stays in
+the collection's HNSW index as a tombstone (its slot is not reused), so the
+index files, the memory the index takes once loaded and the time to load it
+keep growing. chroma.sqlite3 keeps the pages it freed, and a deleted
+collection leaves its index directory behind.
+
+`report` shows, per collection, live records against index slots and
+tombstones, the records still waiting in the log and an estimate of the
+collection's share of chroma.sqlite3. Slots and tombstones count the writes
+still in the log as if they were already flushed to the index. For the store it shows free SQLite
+pages and orphaned index directories.
+
+`compact` rebuilds the index of each collection whose tombstone share is over
+`--min-dead`. Chroma cannot rebuild an index in place, so the live records
+are copied into a new collection through the `chroma_bulkload` fast path and
+that collection is then renamed over the old one. Metadata, HNSW settings and
+the stored embedding-function config are kept. Orphaned index directories are
+then removed, and the SQLite file is VACUUMed, REINDEXed and ANALYZEd (the
+full-text index is optimized first). The report compares store size, query
+latency and open time before and after.
+
+By default nothing else may write to the collection while it is being copied,
+and a write that lands anyway aborts that collection. With `--online`, writes
+made during the copy are replayed onto the new collection in up to three
+catch-up passes right before the swap; only writes racing the last pass can
+be missed. The collection id changes with the swap, so a long-lived process
+must fetch the collection by name again afterwards. A run that dies between
+deleting the old collection and renaming the new one leaves the records only
+under `<name>-compacting`; the next `compact` renames it back first.
+
+Usage:
+    python chroma_maintain.py report my_vectordb
+    python chroma_maintain.py compact my_vectordb
+    python chroma_maintain.py compact my_vectordb --collection policies --min-dead 0 --online --json-report -
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import struct
+import subprocess
+import sys
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from chroma_bulkload import BulkLoader, reopen_seconds, vacuum
+from chroma_results import iter_get_pages
+
+DEFAULT_MIN_DEAD = 0.1
+LATENCY_QUERIES = 50
+CATCH_UP_PASSES = 3
+SHADOW_SUFFIX = "-compacting"
+READ_RETRIES = 5  # online copies only
+COPY_INCLUDE = ("embeddings", "documents", "metadatas")
+
+VECTOR_SEGMENT = "urn:chroma:segment/vector/hnsw-local-persisted"
+METADATA_SEGMENT = "urn:chroma:segment/metadata/sqlite"
+FTS_TABLE = "embedding_fulltext_search"
+LOG_ADDS = (0, 2)  # embeddings_queue operation codes of ADD and UPSERT
+
+# hnswlib's header.bin
+_HEADER = struct.Struct("<I6QiI3QdQ")
+_HEADER_FIELDS = ("version", "offset_level0", "max_elements", "cur_element_count", "size_data_per_element",
+                  "label_offset", "offset_data", "max_level", "enterpoint", "max_m", "max_m0", "m", "mult",
+                  "ef_construction")
+
+
+class CompactError(Exception):
+    pass
+
+
+# ── on-disk inspection ─────────────────────────────────────────────────────
+
+class _PlainUnpickler(pickle.Unpickler):
+    """index_metadata.pickle only holds dicts of ids and ints: refuse anything else."""
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"unexpected object {module}.{name} in index metadata")
+
+
+def read_index_header(segment_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(segment_dir, "header.bin"), "rb") as fh:
+            raw = fh.read(_HEADER.size)
+    except OSError:
+        return None
+    if len(raw) < _HEADER.size:
+        return None
+    return dict(zip(_HEADER_FIELDS, _HEADER.unpack(raw)))
+
+
+def read_index_metadata(segment_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(segment_dir, "index_metadata.pickle"), "rb") as fh:
+            data = _PlainUnpickler(fh).load()
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def dir_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _is_uuid(name: str) -> bool:
+    try:
+        uuid.UUID(name)
+    except ValueError:
+        return False
+    return True
+
+
+def _connect(path: str, readonly: bool = True) -> sqlite3.Connection:
+    db = os.path.join(path, "chroma.sqlite3")
+    if not os.path.exists(db):
+        raise FileNotFoundError(f"{db} not found (not a PersistentClient directory?)")
+    if readonly:
+        return sqlite3.connect(f"file:{db}?mode=ro", uri=True, timeout=30)
+    return sqlite3.connect(db, timeout=30)
+
+
+def _table_bytes(db: sqlite3.Connection) -> Dict[str, int]:
+    """Bytes per table, its indexes included (dbstat, when compiled in)."""
+    owner = dict(db.execute("SELECT name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')"))
+    sizes: Dict[str, int] = {}
+    try:
+        rows = db.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall()
+    except sqlite3.OperationalError:
+        return sizes
+    for name, size in rows:
+        table = owner.get(name, name)
+        if table.startswith(FTS_TABLE):  # the FTS5 shadow tables
+            table = FTS_TABLE
+        sizes[table] = sizes.get(table, 0) + (size or 0)
+    return sizes
+
+
+def _segments(db: sqlite3.Connection, collection_id: str) -> Dict[str, str]:
+    return {type_: id_ for id_, type_ in
+            db.execute("SELECT id, type FROM segments WHERE collection = ?", (collection_id,))}
+
+
+def _log_topic(collection_id: str) -> str:
+    return f"persistent://default/default/{collection_id}"
+
+
+def _max_seq_id(db: sqlite3.Connection, metadata_segment: str) -> int:
+    row = db.execute("SELECT MAX(seq_id) FROM embeddings WHERE segment_id = ?", (metadata_segment,)).fetchone()
+    return row[0] or 0
+
+
+def _flushed_seq_id(db: sqlite3.Connection, segment: str) -> int:
+    """Last log entry the segment has applied; later ones are still pending for it."""
+    row = db.execute("SELECT seq_id FROM max_seq_id WHERE segment_id = ?", (segment,)).fetchone()
+    return row[0] if row and isinstance(row[0], int) else 0
+
+
+# ── report ─────────────────────────────────────────────────────────────────
+
+class CollectionUsage:
+    __slots__ = ("name", "id", "dimension", "live_records", "index_slots", "index_live", "tombstones",
+                 "index_bytes", "dead_index_bytes", "log_entries", "log_bytes", "sqlite_bytes")
+
+    def __init__(self, name: str, id: str, dimension: Optional[int]):
+        self.name = name
+        self.id = id
+        self.dimension = dimension
+        self.live_records = 0
+        self.index_slots = 0  # elements hnswlib holds once the log is flushed, deleted ones included
+        self.index_live = 0  # live elements of the index on disk
+        self.tombstones = 0  # slots left once the live records are taken out
+        self.index_bytes = 0
+        self.dead_index_bytes = 0
+        self.log_entries = 0  # writes not yet flushed to the index files
+        self.log_bytes = 0
+        self.sqlite_bytes = 0  # estimated share of chroma.sqlite3
+
+    @property
+    def dead_fraction(self) -> float:
+        return self.tombstones / self.index_slots if self.index_slots else 0.0
+
+    def to_dict(self) -> dict:
+        row = {name: getattr(self, name) for name in self.__slots__}
+        row["dead_fraction"] = round(self.dead_fraction, 4)
+        return row
+
+
+class StoreUsage:
+    __slots__ = ("path", "total_bytes", "sqlite_bytes", "sqlite_free_bytes", "orphan_dirs", "orphan_bytes",
+                 "collections")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.total_bytes = 0
+        self.sqlite_bytes = 0
+        self.sqlite_free_bytes = 0  # freelist pages VACUUM would return
+        self.orphan_dirs: List[str] = []  # index directories of deleted collections
+        self.orphan_bytes = 0
+        self.collections: List[CollectionUsage] = []
+
+    def collection(self, name: str) -> Optional[CollectionUsage]:
+        return next((c for c in self.collections if c.name == name), None)
+
+    def to_dict(self) -> dict:
+        row = {name: getattr(self, name) for name in self.__slots__}
+        row["collections"] = [c.to_dict() for c in self.collections]
+        return row
+
+
+def storage_report(path: str) -> StoreUsage:
+    """Live versus dead space of the store at `path`, read from its files only."""
+    usage = StoreUsage(path)
+    db = _connect(path)
+    try:
+        page_size = db.execute("PRAGMA page_size").fetchone()[0]
+        usage.sqlite_free_bytes = db.execute("PRAGMA freelist_count").fetchone()[0] * page_size
+        tables = _table_bytes(db)
+        record_rows = db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        log_rows = db.execute("SELECT COUNT(*) FROM embeddings_queue").fetchone()[0]
+        record_tables = sum(size for table, size in tables.items() if table.startswith("embedding")
+                            and table != "embeddings_queue")
+        known_segments = {row[0] for row in db.execute("SELECT id FROM segments")}
+
+        for id_, name, dimension in db.execute("SELECT id, name, dimension FROM collections ORDER BY name").fetchall():
+            col = CollectionUsage(name, id_, dimension)
+            segments = _segments(db, id_)
+            meta = segments.get(METADATA_SEGMENT)
+            if meta:
+                col.live_records = db.execute("SELECT COUNT(*) FROM embeddings WHERE segment_id = ?",
+                                              (meta,)).fetchone()[0]
+            col.log_entries, col.log_bytes = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(id) + COALESCE(LENGTH(vector), 0) "
+                "+ COALESCE(LENGTH(metadata), 0)), 0) FROM embeddings_queue WHERE topic = ?",
+                (_log_topic(id_),)).fetchone()
+            vector = segments.get(VECTOR_SEGMENT)
+            if vector:
+                segment_dir = os.path.join(path, vector)
+                header = read_index_header(segment_dir)
+                metadata = read_index_metadata(segment_dir)
+                col.index_bytes = dir_bytes(segment_dir)
+                if header is not None:
+                    col.index_slots = header["cur_element_count"]
+                    col.index_live = len(metadata["id_to_label"]) if metadata else col.index_slots
+                # records the log still has to add take new slots; its deletes only mark
+                # slots dead, and the metadata segment has applied them already
+                indexed = metadata["id_to_label"] if metadata else {}
+                col.index_slots += sum(1 for (record_id,) in db.execute(
+                    "SELECT DISTINCT id FROM embeddings_queue WHERE topic = ? AND seq_id > ? "
+                    f"AND operation IN ({', '.join('?' * len(LOG_ADDS))})",
+                    (_log_topic(id_), _flushed_seq_id(db, vector), *LOG_ADDS)) if record_id not in indexed)
+                col.tombstones = max(0, col.index_slots - col.live_records)
+                col.dead_index_bytes = int(col.index_bytes * col.dead_fraction)
+            if record_rows:
+                col.sqlite_bytes += record_tables * col.live_records // record_rows
+            if log_rows:
+                col.sqlite_bytes += tables.get("embeddings_queue", 0) * col.log_entries // log_rows
+            usage.collections.append(col)
+    finally:
+        db.close()
+
+    usage.sqlite_bytes = os.path.getsize(os.path.join(path, "chroma.sqlite3"))
+    for entry in sorted(os.listdir(path)):
+        full = os.path.join(path, entry)
+        if os.path.isdir(full) and _is_uuid(entry) and entry not in known_segments:
+            usage.orphan_dirs.append(entry)
+            usage.orphan_bytes += dir_bytes(full)
+    usage.total_bytes = dir_bytes(path)
+    return usage
+
+
+def _mb(n: int) -> str:
+    return f"{n / (1 << 20):.1f}M"
+
+
+def format_report(usage: StoreUsage) -> str:
+    lines = [f"  {usage.path}: {_mb(usage.total_bytes)} total, chroma.sqlite3 {_mb(usage.sqlite_bytes)} "
+             f"({_mb(usage.sqlite_free_bytes)} free pages), {len(usage.orphan_dirs)} orphaned index dir(s) "
+             f"{_mb(usage.orphan_bytes)}",
+             f"  {'Collection':<24} {'Live':>9} {'Slots':>9} {'Dead':>9} {'Dead%':>6} {'Index':>9} "
+             f"{'Dead idx':>9} {'Log':>7} {'SQLite':>9}"]
+    for c in usage.collections:
+        lines.append(f"  {c.name:<24} {c.live_records:>9} {c.index_slots:>9} {c.tombstones:>9} "
+                     f"{c.dead_fraction * 100:>5.1f}% {_mb(c.index_bytes):>9} {_mb(c.dead_index_bytes):>9} "
+                     f"{c.log_entries:>7} {_mb(c.sqlite_bytes):>9}")
+    return "\n".join(lines)
+
+
+# ── timing ─────────────────────────────────────────────────────────────────
+
+def query_latency(collection, queries: np.ndarray, n_results: int = 10) -> dict:
+    """p50/p95 milliseconds of single-vector queries, after one warm-up query."""
+    if not len(queries):
+        return {"p50_ms": None, "p95_ms": None}
+    collection.query(query_embeddings=queries[:1], n_results=n_results, include=[])
+    samples = []
+    for q in queries:
+        t0 = time.perf_counter()
+        collection.query(query_embeddings=q[None, :], n_results=n_results, include=[])
+        samples.append((time.perf_counter() - t0) * 1000)
+    p50, p95 = np.percentile(samples, [50, 95])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3)}
+
+
+def _reopen(path: str, name: str, dim: Optional[int]) -> Optional[float]:
+    """Open time in a fresh process; None when the collection cannot be opened there
+    (e.g. its embedding function needs a package this environment lacks)."""
+    if not dim:
+        return None
+    try:
+        return round(reopen_seconds(path, name, dim), 3)
+    except (subprocess.CalledProcessError, ValueError):
+        return None
+
+
+# ── compaction ─────────────────────────────────────────────────────────────
+
+@contextlib.contextmanager
+def stored_embedding_function(config: Optional[dict]) -> Iterator[Optional[object]]:
+    """A stand-in carrying a collection's stored embedding-function config.
+
+    Creating the new collection with it persists the same config, without
+    loading the model (or reaching the server) the real function would
+    need. Chroma registers the class of whatever function it is given, so
+    the registry entry for that name is put back on exit. Yields None for
+    collections without a known config.
+    """
+    if not config or config.get("type") != "known":
+        yield None
+        return
+    from chromadb.api.types import EmbeddingFunction
+    from chromadb.utils import embedding_functions
+
+    name, settings = config["name"], config.get("config") or {}
+
+    class StoredConfig(EmbeddingFunction):
+        def __init__(self, config: Optional[dict] = None):
+            self.config = dict(config or {})
+
+        def __call__(self, input):
+            raise CompactError(f"{name}: the compaction stand-in cannot embed")
+
+        @staticmethod
+        def name() -> str:
+            return name
+
+        def get_config(self) -> dict:
+            return self.config
+
+        @staticmethod
+        def build_from_config(config: dict) -> "StoredConfig":
+            return StoredConfig(config)
+
+    registry = embedding_functions.known_embedding_functions
+    previous = registry.get(name)
+    try:
+        yield StoredConfig(settings)
+    finally:
+        if previous is None:
+            registry.pop(name, None)
+        else:
+            registry[name] = previous
+
+
+class CompactReport:
+    __slots__ = ("collection", "records", "tombstones_removed", "copied", "caught_up", "dropped",
+                 "seconds", "latency_before", "latency_after", "reopen_before", "reopen_after")
+
+    def __init__(self, collection: str):
+        self.collection = collection
+        self.records = 0
+        self.tombstones_removed = 0
+        self.copied = 0
+        self.caught_up = 0  # records written to the old collection during the copy
+        self.dropped = 0  # records deleted from it during the copy
+        self.seconds = 0.0
+        self.latency_before: dict = {}
+        self.latency_after: dict = {}
+        self.reopen_before: Optional[float] = None
+        self.reopen_after: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        row = {name: getattr(self, name) for name in self.__slots__}
+        row["seconds"] = round(self.seconds, 3)
+        return row
+
+
+def stored_configuration(config_json: Optional[str], schema_json: Optional[str]) -> tuple:
+    """(hnsw settings, embedding-function config) as persisted for a collection.
+
+    Recent Chroma keeps them in the collection schema (the `#embedding`
+    vector index), older stores in the configuration JSON.
+    """
+    try:
+        index = json.loads(schema_json or "{}")["keys"]["#embedding"]["float_list"]["vector_index"]["config"]
+        hnsw = dict(index.get("hnsw") or {})
+        if index.get("space"):
+            hnsw["space"] = index["space"]
+        ef = index.get("embedding_function")
+    except (KeyError, TypeError, ValueError):
+        configuration = json.loads(config_json or "{}")
+        hnsw, ef = dict(configuration.get("hnsw") or {}), configuration.get("embedding_function")
+    return {k: v for k, v in hnsw.items() if v is not None}, ef
+
+
+def _pages(collection, page_size: int, retries: int, ids: Optional[Sequence[str]] = None,
+           include: Sequence[str] = COPY_INCLUDE) -> Iterator[list]:
+    """`iter_get_pages` that survives reads racing concurrent deletes.
+
+    Such a read can fail inside Chroma ("Error finding id"); it is retried
+    from the same offset. Records that shift across page boundaries
+    meanwhile are picked up by the catch-up pass.
+    """
+    from chromadb.errors import ChromaError
+
+    offset, failures = 0, 0
+    while True:
+        try:
+            for page in iter_get_pages(collection, ids=ids, include=include, page_size=page_size, offset=offset):
+                offset += len(page)
+                yield page
+            return
+        except ChromaError:
+            failures += 1
+            if failures > retries:
+                raise
+            time.sleep(0.05 * failures)
+
+
+def _all_ids(collection, page_size: int) -> set:
+    return {hit.id for page in _pages(collection, page_size, READ_RETRIES, include=[]) for hit in page}
+
+
+def _copy(source, target, ids: Sequence[str], page_size: int) -> int:
+    """Upsert `ids` (those still present) from `source` into `target`."""
+    copied = 0
+    for start in range(0, len(ids), page_size):
+        for page in _pages(source, page_size, READ_RETRIES, ids=ids[start:start + page_size]):
+            target.upsert(ids=[h.id for h in page], embeddings=[h.embedding for h in page],
+                          documents=[h.document for h in page], metadatas=[h.metadata for h in page])
+            copied += len(page)
+    return copied
+
+
+def _catch_up(path: str, metadata_segment: str, old, new, since: int, page_size: int) -> tuple:
+    """Replay onto `new` what changed in `old` after seq id `since`.
+
+    Changed records are found by seq id; additions missed by the paged copy
+    and deletions by comparing ids. Returns (copied, dropped, new since).
+    """
+    db = _connect(path)
+    try:
+        now = _max_seq_id(db, metadata_segment)
+        changed = {row[0] for row in db.execute(
+            "SELECT embedding_id FROM embeddings WHERE segment_id = ? AND seq_id > ?", (metadata_segment, since))}
+    finally:
+        db.close()
+    old_ids, new_ids = _all_ids(old, page_size), _all_ids(new, page_size)
+    gone = sorted(new_ids - old_ids)
+    for start in range(0, len(gone), page_size):
+        new.delete(ids=gone[start:start + page_size])
+    copied = _copy(old, new, sorted((old_ids - new_ids) | (changed & old_ids)), page_size)
+    return copied, len(gone), now
+
+
+def _moved(path: str, metadata_segment: str, since: int) -> bool:
+    db = _connect(path)
+    try:
+        return _max_seq_id(db, metadata_segment) != since
+    finally:
+        db.close()
+
+
+def _rebuild(client, path: str, old, shadow: str, hnsw: dict, ef, retries: int, report: CompactReport):
+    """Copy the live records of `old` into a new collection `shadow`."""
+    if not report.records:
+        return client.create_collection(shadow, metadata=old.metadata, embedding_function=ef,
+                                        configuration={"hnsw": hnsw})
+    loader = BulkLoader(path, shadow, report.records, metadata=old.metadata, embedding_function=ef, hnsw=hnsw)
+    for page in _pages(old, loader.chunk_size, retries):
+        documents = [h.document for h in page]
+        metadatas = [h.metadata for h in page]
+        loader.add([h.id for h in page], [h.embedding for h in page],
+                   documents if any(d is not None for d in documents) else None,
+                   metadatas if any(m is not None for m in metadatas) else None)
+        report.copied += len(page)
+    loader.finish(vacuum_store=False)
+    return loader.collection
+
+
+def compact_collection(path: str, name: str, online: bool = False, timing: bool = True,
+                       usage: Optional[CollectionUsage] = None) -> CompactReport:
+    """Rebuild collection `name` without its tombstones and swap it in under the same name."""
+    import chromadb
+    from chromadb.errors import ChromaError
+
+    report = CompactReport(name)
+    started = time.perf_counter()
+    db = _connect(path)
+    try:
+        row = db.execute("SELECT id, config_json_str, schema_str, dimension FROM collections WHERE name = ?",
+                         (name,)).fetchone()
+        if row is None:
+            raise CompactError(f"{name}: no such collection")
+        collection_id, config_json, schema_json, dimension = row
+        metadata_segment = _segments(db, collection_id).get(METADATA_SEGMENT)
+        since = _max_seq_id(db, metadata_segment)
+    finally:
+        db.close()
+    hnsw, ef_config = stored_configuration(config_json, schema_json)
+    if usage is not None:
+        report.tombstones_removed = usage.tombstones
+
+    client = chromadb.PersistentClient(path=path)
+    shadow = name + SHADOW_SUFFIX
+    page_size = client.get_max_batch_size()
+    with stored_embedding_function(ef_config) as ef:
+        old = client.get_collection(name, embedding_function=ef) if ef is not None else client.get_collection(name)
+        report.records = old.count()
+        queries = np.empty((0, dimension or 0), dtype=np.float32)
+        if timing and report.records:
+            sample = old.get(limit=LATENCY_QUERIES, include=["embeddings"])["embeddings"]
+            queries = np.asarray(sample, dtype=np.float32)
+            report.latency_before = query_latency(old, queries)
+            report.reopen_before = _reopen(path, name, dimension)
+
+        if shadow in [c.name for c in client.list_collections()]:
+            client.delete_collection(shadow)  # left over from an interrupted run
+        try:
+            new = _rebuild(client, path, old, shadow, hnsw, ef, READ_RETRIES if online else 0, report)
+            if online:
+                for _ in range(CATCH_UP_PASSES):
+                    copied, dropped, since = _catch_up(path, metadata_segment, old, new, since, page_size)
+                    report.caught_up += copied
+                    report.dropped += dropped
+                    if not copied and not dropped:
+                        break
+            elif _moved(path, metadata_segment, since) or new.count() != old.count():
+                raise CompactError(f"{name}: written to during the copy; rerun with --online")
+        except BaseException as e:
+            with contextlib.suppress(ChromaError):
+                client.delete_collection(shadow)
+            if isinstance(e, ChromaError) and not online and _moved(path, metadata_segment, since):
+                raise CompactError(f"{name}: written to during the copy; rerun with --online") from e
+            raise
+
+        # writes landing between the last catch-up pass and this point are lost, and a
+        # crash before the rename leaves the records under `shadow` only (see recover_swaps)
+        client.delete_collection(name)
+        new.modify(name=name)
+        report.seconds = time.perf_counter() - started
+        if timing and len(queries):
+            report.latency_after = query_latency(new, queries)
+            report.reopen_after = _reopen(path, name, dimension)
+    return report
+
+
+def recover_swaps(path: str) -> List[str]:
+    """Rename each `<name>-compacting` whose `<name>` is gone back to `<name>`.
+
+    That state is left by a compaction that died after deleting the old
+    collection and before renaming the rebuilt one. Returns the names restored.
+    """
+    db = _connect(path)
+    try:
+        rows = db.execute("SELECT name, config_json_str, schema_str FROM collections").fetchall()
+    finally:
+        db.close()
+    names = {row[0] for row in rows}
+    stranded = [row for row in rows if row[0].endswith(SHADOW_SUFFIX)
+                and row[0][:-len(SHADOW_SUFFIX)] not in names]
+    if not stranded:
+        return []
+
+    import chromadb
+
+    client = chromadb.PersistentClient(path=path)
+    recovered = []
+    for shadow, config_json, schema_json in stranded:
+        name = shadow[:-len(SHADOW_SUFFIX)]
+        _, ef_config = stored_configuration(config_json, schema_json)
+        with stored_embedding_function(ef_config) as ef:
+            collection = (client.get_collection(shadow, embedding_function=ef) if ef is not None
+                          else client.get_collection(shadow))
+            collection.modify(name=name)
+        recovered.append(name)
+    return recovered
+
+
+def remove_orphans(path: str) -> int:
+    """Delete index directories no segment refers to; returns bytes freed."""
+    usage = storage_report(path)
+    for entry in usage.orphan_dirs:
+        shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+    return usage.orphan_bytes
+
+
+def maintain_sqlite(path: str):
+    """Optimize the full-text index, then REINDEX, VACUUM and ANALYZE chroma.sqlite3."""
+    db = _connect(path, readonly=False)
+    try:
+        if db.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (FTS_TABLE,)).fetchone():
+            db.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+        db.execute("REINDEX")
+        db.commit()
+    finally:
+        db.close()
+    vacuum(path)
+
+
+def compact(path: str, names: Optional[Sequence[str]] = None, min_dead: float = DEFAULT_MIN_DEAD,
+            online: bool = False, vacuum_store: bool = True, timing: bool = True) -> dict:
+    """Compact the named collections (or every one over `min_dead` tombstones),
+    then clean up the store. Returns before/after usage and one report per collection."""
+    recovered = recover_swaps(path)
+    before = storage_report(path)
+    if names:
+        missing = [n for n in names if before.collection(n) is None]
+        if missing:
+            raise CompactError(f"no such collection(s): {', '.join(missing)}")
+        targets = [before.collection(n) for n in names]
+    else:
+        targets = [c for c in before.collections if c.dead_fraction >= min_dead and c.index_slots]
+    reports = [compact_collection(path, c.name, online=online, timing=timing, usage=c) for c in targets]
+
+    t0 = time.perf_counter()
+    orphan_bytes = remove_orphans(path)
+    if vacuum_store:
+        maintain_sqlite(path)
+    after = storage_report(path)
+    return {
+        "path": path,
+        "bytes_before": before.total_bytes,
+        "bytes_after": after.total_bytes,
+        "sqlite_before": before.sqlite_bytes,
+        "sqlite_after": after.sqlite_bytes,
+        "orphan_bytes_removed": orphan_bytes,
+        "maintenance_seconds": round(time.perf_counter() - t0, 3),
+        "recovered": recovered,
+        "collections": [r.to_dict() for r in reports],
+        "before": before.to_dict(),
+        "after": after.to_dict(),
+    }
+
+
+def format_compaction(result: dict) -> str:
+    lines = [f"  {result['path']}: {_mb(result['bytes_before'])} -> {_mb(result['bytes_after'])} "
+             f"(chroma.sqlite3 {_mb(result['sqlite_before'])} -> {_mb(result['sqlite_after'])}, "
+             f"{_mb(result['orphan_bytes_removed'])} of orphaned index dirs removed)"]
+    for name in result["recovered"]:
+        lines.append(f"  {name}: restored from {name}{SHADOW_SUFFIX} (left by an interrupted compaction)")
+    if not result["collections"]:
+        lines.append("  no collection over the tombstone threshold")
+        return "\n".join(lines)
+    lines.append(f"  {'Collection':<24} {'Records':>8} {'Removed':>8} {'Caught up':>9} {'Seconds':>8} "
+                 f"{'p50 ms':>15} {'p95 ms':>15} {'Open s':>13}")
+
+    def pair(a, b):
+        return f"{a if a is not None else '-'} -> {b if b is not None else '-'}"
+
+    for r in result["collections"]:
+        lines.append(f"  {r['collection']:<24} {r['records']:>8} {r['tombstones_removed']:>8} "
+                     f"{r['caught_up'] + r['dropped']:>9} {r['seconds']:>8.2f} "
+                     f"{pair(r['latency_before'].get('p50_ms'), r['latency_after'].get('p50_ms')):>15} "
+                     f"{pair(r['latency_before'].get('p95_ms'), r['latency_after'].get('p95_ms')):>15} "
+                     f"{pair(r['reopen_before'], r['reopen_after']):>13}")
+    return "\n".join(lines)
+
+
+def _write_json(data: dict, target: Optional[str]):
+    if target == "-":
+        print(json.dumps(data, indent=2))
+    elif target:
+        with open(target, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, indent=2)
+            fh.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report and reclaim dead space in a ChromaDB PersistentClient store")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rep = sub.add_parser("report", help="Live versus dead space per collection")
+    rep.add_argument("path", help="PersistentClient directory (e.g. my_vectordb)")
+    rep.add_argument("--json-report", metavar="PATH", help="Write the report as JSON ('-' for stdout)")
+
+    comp = sub.add_parser("compact", help="Rebuild indexes without tombstones, then clean up chroma.sqlite3")
+    comp.add_argument("path", help="PersistentClient directory (e.g. my_vectordb)")
+    comp.add_argument("--collection", action="append", help="Compact this collection regardless of --min-dead "
+                                                            "(repeatable; default: every one over the threshold)")
+    comp.add_argument("--min-dead", type=float, default=DEFAULT_MIN_DEAD,
+                      help=f"Tombstone share of the index that triggers a rebuild (default: {DEFAULT_MIN_DEAD})")
+    comp.add_argument("--online", action="store_true",
+                      help="Allow writes during the copy and replay them before the swap")
+    comp.add_argument("--no-vacuum", action="store_true", help="Skip REINDEX/VACUUM/ANALYZE of chroma.sqlite3")
+    comp.add_argument("--no-timing", action="store_true", help="Skip the before/after latency and open-time runs")
+    comp.add_argument("--json-report", metavar="PATH", help="Write the result as JSON ('-' for stdout)")
+    args = parser.parse_args()
+
+    from chromadb.errors import ChromaError
+
+    try:
+        if args.command == "report":
+            usage = storage_report(args.path)
+            if args.json_report != "-":
+                print(format_report(usage))
+            _write_json(usage.to_dict(), args.json_report)
+        else:
+            result = compact(args.path, args.collection, args.min_dead, online=args.online,
+                             vacuum_store=not args.no_vacuum, timing=not args.no_timing)
+            if args.json_report != "-":
+                print(format_compaction(result))
+            _write_json(result, args.json_report)
+    except (OSError, ValueError, sqlite3.Error, CompactError, ChromaError) as e:
+        sys.exit(f"error: {e}")
+
+
+if __name__ == "__main__":
+    main()
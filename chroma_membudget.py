@@ -0,0 +1,238 @@
+"""
+chroma_membudget.py - Memory-bounded adaptive batch sizing for ingestion
+Samples the process RSS in the background and adjusts the embed/insert batch
+size between batches: it grows while throughput keeps improving and the
+projected peak stays under the budget, backs off when a larger size stops
+paying, and halves it whenever the observed peak nears the cap.
+
+RSS comes from psutil when installed, else /proc/self/statm; tracemalloc is
+the last resort and only sees Python allocations, not the model runtime's.
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from typing import List, Optional
+
+try:
+    import psutil
+except ImportError:  # optional
+    psutil = None
+
+_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+# fractions of the budget
+GROW_BELOW = 0.75  # projected peak must stay under this to grow
+SHRINK_ABOVE = 0.9  # observed peak above this halves the batch
+PAUSE_ABOVE = 0.95  # the reader waits before forming new batches
+
+
+def parse_size(text: str) -> int:
+    """'2G', '512M', '1.5g', '800MB' or a plain byte count -> bytes."""
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmgtKMGT]?)(?:i?[bB])?\s*", str(text))
+    if not m:
+        raise ValueError(f"invalid size: {text!r} (expected e.g. 2G, 512M)")
+    return int(float(m.group(1)) * _UNITS[m.group(2).upper()])
+
+
+def format_size(n: float) -> str:
+    for unit in ("B", "K", "M", "G"):
+        if abs(n) < 1024 or unit == "G":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}G"
+
+
+def _statm_rss() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", "rb") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    rss = _statm_rss()
+    if rss is not None:
+        return rss
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return tracemalloc.get_traced_memory()[0]
+
+
+class RssSampler:
+    """Background thread recording RSS every `interval` seconds.
+
+    `peak` is the overall maximum; `window_peak()` returns the maximum
+    since the previous call, which is what one batch cost.
+    """
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.current = current_rss()
+        self.peak = self.current
+        self._window = self.current
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> int:
+        rss = current_rss()
+        with self._lock:
+            self.current = rss
+            self.peak = max(self.peak, rss)
+            self._window = max(self._window, rss)
+        return rss
+
+    def window_peak(self) -> int:
+        with self._lock:
+            peak, self._window = self._window, self.current
+        return peak
+
+    def start(self) -> "RssSampler":
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.sample()
+
+    def __enter__(self) -> "RssSampler":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class AdaptiveBatchSize:
+    """Hill-climbing batch size under an RSS cap.
+
+    Call `observe(items, seconds)` after each embedded batch. Per-item memory
+    is estimated from how far the RSS peak rose above the recent low-water
+    mark; a size change is only judged once `settle` batches ran at that
+    size. Memory that stays (an in-memory index growing) is not attributed
+    to batches, but it does count against the cap.
+    """
+
+    def __init__(self, max_rss: int, initial: int = 32, minimum: int = 1, maximum: int = 4096,
+                 in_flight: int = 4, settle: int = 3, sampler: Optional[RssSampler] = None):
+        self.max_rss = max_rss
+        self.size = max(minimum, min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = in_flight  # batches alive at once across queues and workers
+        self.settle = settle
+        self.sampler = sampler or RssSampler()
+        self.baseline = self.sampler.current
+        self._lows = deque([self.baseline], maxlen=16)
+        self.bytes_per_item = 0.0
+        self.history: List[tuple] = []  # (batch size, items/s, window peak)
+        self.adjustments = 0
+        self._lock = threading.Lock()
+        self._rates: List[float] = []  # items/s at the current size
+        self._previous: Optional[tuple] = None  # (size, median rate) before the last growth
+        self._frozen_above: Optional[int] = None  # a size that did not pay off
+
+    @property
+    def batch_size(self) -> int:
+        return self.size
+
+    def projected_peak(self, size: int) -> float:
+        return self.baseline + self.bytes_per_item * size * self.in_flight
+
+    def over_budget(self) -> bool:
+        return self.sampler.current > self.max_rss * PAUSE_ABOVE
+
+    def wait_for_memory(self, stop: threading.Event, idle: Optional[threading.Event] = None, timeout: float = 5.0):
+        """Block the reader while RSS is near the cap (at most `timeout` s,
+        or until `idle` says nothing is in flight)."""
+        deadline = time.monotonic() + timeout
+        while self.over_budget() and not stop.is_set() and time.monotonic() < deadline:
+            if idle is not None and idle.is_set():
+                break
+            time.sleep(self.sampler.interval)
+            self.sampler.sample()
+
+    def observe(self, items: int, seconds: float):
+        if items <= 0:
+            return
+        peak = self.sampler.window_peak()
+        with self._lock:
+            rate = items / seconds if seconds > 0 else float("inf")
+            self.history.append((items, rate, peak))
+            # the floor rises as the index grows: take the recent low-water mark
+            self._lows.append(self.sampler.current)
+            self.baseline = min(self._lows)
+            rise = max(0, peak - self.baseline)
+            estimate = rise / (items * self.in_flight)
+            # slow decay keeps a conservative (high) per-item estimate
+            self.bytes_per_item = max(estimate, self.bytes_per_item * 0.9)
+
+            limit = self.max_rss * SHRINK_ABOVE
+            # batches formed before an earlier shrink do not count twice, and
+            # shrinking cannot help once the floor itself is over the limit
+            if peak > limit and items <= self.size and self.baseline < limit:
+                self._resize(max(self.minimum, self.size // 2))
+                self._frozen_above = self.size
+                return
+            if items != self.size:  # formed before the last resize, or the short final batch
+                return
+            self._rates.append(rate)
+            if len(self._rates) < self.settle:
+                return
+            median = sorted(self._rates)[len(self._rates) // 2]
+            if self._previous is not None:
+                prev_size, prev_rate = self._previous
+                if median < prev_rate * 1.02:  # the growth did not pay: step back and stop there
+                    self._frozen_above = prev_size
+                    self._previous = None
+                    self._resize(prev_size)
+                    return
+            grow = min(self.maximum, max(self.size + 1, int(self.size * 1.5)))
+            if ((self._frozen_above is None or grow <= self._frozen_above)
+                    and grow > self.size and self.projected_peak(grow) < self.max_rss * GROW_BELOW):
+                self._previous = (self.size, median)
+                self._resize(grow)
+            else:
+                self._rates = self._rates[-self.settle:]
+
+    def _resize(self, size: int):
+        if size != self.size:
+            self.size = size
+            self.adjustments += 1
+        self._rates = []
+
+    def summary(self) -> dict:
+        # the final size may already have grown (or shrunk) past every size used so far
+        sizes = [h[0] for h in self.history] + [self.size]
+        return {
+            "max_rss": self.max_rss,
+            "peak_rss": self.sampler.peak,
+            "final_batch_size": self.size,
+            "min_batch_size": min(sizes),
+            "max_batch_size": max(sizes),
+            "adjustments": self.adjustments,
+            "bytes_per_item": round(self.bytes_per_item),
+            "floor_rss": self.baseline,
+            "floor_over_budget": self.baseline >= self.max_rss * SHRINK_ABOVE,
+        }
+
+
+def warn_if_unmeasurable():
+    if psutil is None and _statm_rss() is None:
+        print("[membudget] psutil unavailable and no /proc: falling back to tracemalloc, "
+              "which does not see native allocations", file=sys.stderr)
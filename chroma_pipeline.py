@@ -0,0 +1,413 @@
+"""
+chroma_pipeline.py - Concurrent ingestion pipeline for ChromaDB
+Runs read -> prepare -> embed -> insert as stages joined by bounded queues,
+so reading and categorising the next batch overlap with embedding, and
+embedding overlaps with the index insert of the previous batch. Every stage
+records how long it was busy, starved (waiting for input) and blocked
+(waiting for room downstream); the report names the bottleneck.
+
+Embedding runs in a pool of threads: ONNX Runtime and PyTorch release the
+GIL during inference, and the model is loaded once per process. With a
+memory budget (`--max-rss 2G`), batch sizes are chosen by
+chroma_membudget.AdaptiveBatchSize instead of being fixed.
+
+Usage:
+    python chroma_pipeline.py polices.txt article_chromadb.tex --max-rss 2G
+    python chroma_pipeline.py big_feed.txt --persist ./my_vectordb --batch-size 64 --json-report report.json
+"""
+
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from chroma_dedup import Deduper, Record
+from chroma_membudget import AdaptiveBatchSize, RssSampler, format_size, parse_size, warn_if_unmeasurable
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_QUEUE_SIZE = 4  # batches buffered between two stages
+
+_DONE = object()
+_POLL = 0.1
+
+
+class StageStats:
+    """Busy/starved/blocked seconds summed over a stage's workers."""
+
+    __slots__ = ("name", "workers", "batches", "items", "busy", "starved", "blocked", "lock")
+
+    def __init__(self, name: str, workers: int = 1):
+        self.name = name
+        self.workers = workers
+        self.batches = 0
+        self.items = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self.lock = threading.Lock()  # shared by the stage's workers
+
+    def utilisation(self, wall: float) -> float:
+        return self.busy / (wall * self.workers) if wall > 0 else 0.0
+
+    def to_dict(self, wall: float) -> dict:
+        return {
+            "workers": self.workers,
+            "batches": self.batches,
+            "items": self.items,
+            "busy_s": round(self.busy, 4),
+            "starved_s": round(self.starved, 4),
+            "blocked_s": round(self.blocked, 4),
+            "utilisation": round(self.utilisation(wall), 4),
+        }
+
+
+class PipelineReport:
+    def __init__(self, stages: List[StageStats], wall: float, read: int, inserted: int, duplicates: int,
+                 peak_rss: int = 0, batching: Optional[dict] = None):
+        self.stages = stages
+        self.wall = wall
+        self.read = read
+        self.inserted = inserted
+        self.duplicates = duplicates
+        self.peak_rss = peak_rss
+        self.batching = batching  # AdaptiveBatchSize.summary() when a budget was set
+
+    @property
+    def bottleneck(self) -> StageStats:
+        return max(self.stages, key=lambda s: s.utilisation(self.wall))
+
+    def to_dict(self) -> dict:
+        return {
+            "wall_s": round(self.wall, 4),
+            "read": self.read,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "docs_per_s": round(self.inserted / self.wall, 1) if self.wall > 0 else 0.0,
+            "bottleneck": self.bottleneck.name,
+            "peak_rss": self.peak_rss,
+            "batching": self.batching,
+            "stages": {s.name: s.to_dict(self.wall) for s in self.stages},
+        }
+
+    def format_table(self) -> str:
+        lines = [f"  {'Stage':<10}{'Workers':>8}{'Batches':>9}{'Items':>8}{'Busy(s)':>9}{'Util':>7}"
+                 f"{'Starved(s)':>12}{'Blocked(s)':>12}"]
+        for s in self.stages:
+            lines.append(f"  {s.name:<10}{s.workers:>8}{s.batches:>9}{s.items:>8}{s.busy:>9.2f}"
+                         f"{s.utilisation(self.wall):>7.0%}{s.starved:>12.2f}{s.blocked:>12.2f}")
+        bottleneck = self.bottleneck
+        lines.append(f"  Wall time {self.wall:.2f}s, {self.inserted} inserted / {self.read} read; "
+                     f"bottleneck: {bottleneck.name} ({bottleneck.utilisation(self.wall):.0%} busy)")
+        rate = self.inserted / self.wall if self.wall > 0 else 0.0
+        memory = f"  Throughput {rate:.1f} docs/s, peak RSS {format_size(self.peak_rss)}"
+        if self.batching:
+            b = self.batching
+            memory += (f" (budget {format_size(b['max_rss'])}); batch size {b['min_batch_size']}-"
+                       f"{b['max_batch_size']}, final {b['final_batch_size']}, {b['adjustments']} adjustments")
+            if b["floor_over_budget"]:
+                memory += (f"\n  Warning: RSS between batches ({format_size(b['floor_rss'])}) is itself near the budget; "
+                           f"the collection or model needs more memory than --max-rss allows")
+        lines.append(memory)
+        return "\n".join(lines)
+
+
+class IngestPipeline:
+    """read -> prepare -> embed -> insert over bounded queues.
+
+    `prepare(item)` turns a source item into a Record (or None to skip it)
+    and runs on a single thread, so it may keep state such as a running
+    line counter. With a `deduper`, duplicates are dropped before
+    embedding and, once everything is inserted, the kept records' duplicate
+    metadata is written with `collection.update`. With a `batcher`, each
+    batch is as large as it currently allows and the reader pauses while
+    RSS is near its cap.
+    """
+
+    def __init__(self, collection, embed_fn: Callable[[List[str]], list],
+                 prepare: Optional[Callable[[object], Optional[Record]]] = None, deduper: Optional[Deduper] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE, embed_workers: int = 2, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 line_key: Optional[str] = "line", batcher: Optional[AdaptiveBatchSize] = None):
+        self.collection = collection
+        self.embed_fn = embed_fn
+        self.prepare = prepare or (lambda item: item)
+        self.deduper = deduper
+        self.batch_size = batch_size
+        self.embed_workers = embed_workers
+        self.queue_size = queue_size
+        self.line_key = line_key
+        self.batcher = batcher
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+        self._idle = threading.Event()  # no batch between the reader and the index
+        self._in_flight = 0
+        self._flight_lock = threading.Lock()
+
+    def _landed(self):
+        with self._flight_lock:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.set()
+
+    # ── queue helpers that give up once another stage failed ───────────────
+
+    def _put(self, q: queue.Queue, item, stats: StageStats):
+        started = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                try:
+                    q.put(item, timeout=_POLL)
+                    return
+                except queue.Full:
+                    pass
+        finally:
+            with stats.lock:
+                stats.blocked += time.perf_counter() - started
+
+    def _get(self, q: queue.Queue, stats: StageStats):
+        started = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                try:
+                    return q.get(timeout=_POLL)
+                except queue.Empty:
+                    pass
+            return _DONE
+        finally:
+            with stats.lock:
+                stats.starved += time.perf_counter() - started
+
+    def _fail(self, error: BaseException):
+        self._errors.append(error)
+        self._stop.set()
+
+    # ── stages ─────────────────────────────────────────────────────────────
+
+    def _read(self, source: Iterable, out: queue.Queue, stats: StageStats):
+        try:
+            it = iter(source)
+            while True:
+                size = self.batch_size
+                if self.batcher is not None:
+                    waited = time.perf_counter()
+                    self.batcher.wait_for_memory(self._stop, self._idle)
+                    stats.blocked += time.perf_counter() - waited
+                    size = self.batcher.batch_size
+                started = time.perf_counter()
+                batch = []
+                for item in it:
+                    batch.append(item)
+                    if len(batch) >= size:
+                        break
+                stats.busy += time.perf_counter() - started
+                if not batch:
+                    break
+                stats.batches += 1
+                stats.items += len(batch)
+                with self._flight_lock:
+                    self._in_flight += 1
+                    self._idle.clear()
+                self._put(out, batch, stats)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(out, _DONE, stats)
+
+    def _worker(self, fn: Callable, inq: queue.Queue, outq: Optional[queue.Queue], stats: StageStats,
+                remaining: list):
+        """Apply `fn` to batches until _DONE; the last worker out forwards _DONE."""
+        try:
+            while True:
+                batch = self._get(inq, stats)
+                if batch is _DONE:
+                    self._put(inq, _DONE, stats)  # let sibling workers see it too
+                    break
+                started = time.perf_counter()
+                result = fn(batch)
+                with stats.lock:
+                    stats.busy += time.perf_counter() - started
+                    stats.batches += 1
+                    stats.items += len(batch)
+                if outq is not None and result:
+                    self._put(outq, result, stats)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            with stats.lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last and outq is not None:
+                self._put(outq, _DONE, stats)
+
+    def _prepare_batch(self, items: list) -> List[Record]:
+        records = []
+        for item in items:
+            record = self.prepare(item)
+            if record is None:
+                continue
+            if self.deduper is not None and self.deduper.add(record) is not None:
+                continue
+            records.append(record)
+        if not records:
+            self._landed()
+        return records
+
+    def _embed_batch(self, records: List[Record]) -> list:
+        started = time.perf_counter()
+        embeddings = self.embed_fn([r.text for r in records])
+        if self.batcher is not None:
+            self.batcher.observe(len(records), time.perf_counter() - started)
+        return list(zip(records, embeddings))
+
+    def _insert_batch(self, batch: list):
+        records = [record for record, _ in batch]
+        embeddings = [embedding for _, embedding in batch]
+        self.collection.add(
+            ids=[r.id for r in records],
+            documents=[r.text for r in records],
+            metadatas=[dict(r.metadata) for r in records],
+            embeddings=embeddings,
+        )
+        self._landed()
+        return None
+
+    def run(self, source: Iterable) -> PipelineReport:
+        """Ingest every item of `source`; re-raises the first stage error."""
+        self._stop.clear()
+        self._errors = []
+        self._idle.set()
+        self._in_flight = 0
+        sampler = self.batcher.sampler if self.batcher is not None else RssSampler()
+        sampler.start()
+        read, prepare = StageStats("read"), StageStats("prepare")
+        embed, insert = StageStats("embed", self.embed_workers), StageStats("insert")
+        q_read, q_prepared, q_embedded = (queue.Queue(maxsize=self.queue_size) for _ in range(3))
+        inserted = [0]
+
+        def insert_batch(batch):
+            self._insert_batch(batch)
+            inserted[0] += len(batch)
+
+        threads = [threading.Thread(target=self._read, args=(source, q_read, read), name="ingest-read")]
+        for name, fn, inq, outq, stats, workers in (
+            ("prepare", self._prepare_batch, q_read, q_prepared, prepare, 1),
+            ("embed", self._embed_batch, q_prepared, q_embedded, embed, self.embed_workers),
+            ("insert", insert_batch, q_embedded, None, insert, 1),
+        ):
+            remaining = [workers]
+            threads += [threading.Thread(target=self._worker, args=(fn, inq, outq, stats, remaining),
+                                         name=f"ingest-{name}-{i}") for i in range(workers)]
+
+        started = time.perf_counter()
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            sampler.stop()
+        if self._errors:
+            raise self._errors[0]
+
+        duplicates = 0
+        if self.deduper is not None:
+            changed = self.deduper.annotate(self.line_key)
+            duplicates = self.deduper.exact + self.deduper.near_count
+            t0 = time.perf_counter()
+            for i in range(0, len(changed), self.batch_size):
+                part = changed[i:i + self.batch_size]
+                self.collection.update(ids=[r.id for r in part], metadatas=[r.metadata for r in part])
+            insert.busy += time.perf_counter() - t0
+        wall = time.perf_counter() - started
+        return PipelineReport([read, prepare, embed, insert], wall, read.items, inserted[0], duplicates,
+                              sampler.peak, self.batcher.summary() if self.batcher is not None else None)
+
+
+# ── CLI ────────────────────────────────────────────────────────────────────
+
+def _file_records(paths: List[str], max_tokens: Optional[int], count_tokens) -> Iterator[Record]:
+    """Chunks of .tex/.md files (chroma_chunker), one record per line otherwise."""
+    from chroma_chunker import DEFAULT_MAX_TOKENS, LATEX, MARKDOWN, chunk_file, detect_format, ingest_root, source_name
+
+    root = ingest_root(paths)
+    for path in paths:
+        name = source_name(path, root)
+        if detect_format(path) in (LATEX, MARKDOWN):
+            for chunk in chunk_file(path, count_tokens=count_tokens, max_tokens=max_tokens or DEFAULT_MAX_TOKENS,
+                                    source=name):
+                yield Record(chunk.id, chunk.text, chunk.metadata())
+            continue
+        with open(path, "r", encoding="utf-8") as fh:
+            for i, line in enumerate(fh):
+                if line.strip():
+                    yield Record(f"{name}:{i}", line.strip(), {"source": name, "line": i})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent ChromaDB ingestion with per-stage utilisation")
+    parser.add_argument("paths", nargs="+", help="Files to ingest (.tex/.md are chunked, others read per line)")
+    parser.add_argument("--collection", default="ingest", help="Collection name (default: ingest)")
+    parser.add_argument("--persist", metavar="DIR", help="Use a PersistentClient at DIR instead of an in-memory one")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Fixed batch size, or the starting size with --max-rss (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--max-rss", metavar="SIZE",
+                        help="Memory budget such as 2G or 512M; batch sizes then adapt to stay under it")
+    parser.add_argument("--embed-workers", type=int, default=2, help="Embedding threads (default: 2)")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"Batches buffered between stages (default: {DEFAULT_QUEUE_SIZE})")
+    parser.add_argument("--dedupe", action="store_true", help="Drop exact and near-duplicate records before embedding")
+    parser.add_argument("--json-report", metavar="PATH", help="Write the report as JSON ('-' for stdout)")
+    parser.add_argument("--embed-socket", metavar="PATH",
+                        help="Embed through a running chroma_embedserver.py daemon instead of loading a model")
+    args = parser.parse_args()
+
+    try:
+        max_rss = parse_size(args.max_rss) if args.max_rss else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    import chromadb
+    from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+    from chroma_chunker import token_counter
+
+    if args.embed_socket:
+        from chroma_embedserver import RemoteEmbeddingFunction
+        embedding_fn = RemoteEmbeddingFunction(args.embed_socket)
+    else:
+        embedding_fn = DefaultEmbeddingFunction()
+    count_tokens, max_tokens, _ = token_counter(embedding_fn)
+    client = chromadb.PersistentClient(path=args.persist) if args.persist else chromadb.Client()
+    collection = client.get_or_create_collection(args.collection, embedding_function=embedding_fn)
+
+    batcher = None
+    if max_rss is not None:
+        # batches alive at once: one per queue slot plus one per stage worker
+        in_flight = 3 * args.queue_size + args.embed_workers + 3
+        warn_if_unmeasurable()
+        batcher = AdaptiveBatchSize(max_rss, initial=args.batch_size, in_flight=in_flight)
+        if batcher.sampler.current >= max_rss:
+            sys.exit(f"error: RSS is already {format_size(batcher.sampler.current)}, over --max-rss {args.max_rss}")
+    pipeline = IngestPipeline(collection, embedding_fn, deduper=Deduper() if args.dedupe else None,
+                              batch_size=args.batch_size, embed_workers=args.embed_workers,
+                              queue_size=args.queue_size, batcher=batcher)
+    try:
+        report = pipeline.run(_file_records(args.paths, max_tokens, count_tokens))
+    except OSError as e:
+        sys.exit(f"error: {e}")
+
+    if args.json_report == "-":
+        print(json.dumps(report.to_dict(), indent=2))
+        return
+    print(report.format_table())
+    if args.json_report:
+        with open(args.json_report, "w", encoding="utf-8") as fh:
+            json.dump(report.to_dict(), fh, indent=2)
+            fh.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+chroma_results.py - Paged iteration over collection.query / collection.get
+`collection.query` and `collection.get` hand back one dict of parallel
+(nested) lists for the whole result. For analytics jobs that pull thousands
+of neighbours per query, or dump a collection, these helpers fetch the
+result in pages and yield one lightweight `Hit` per row instead. Only the
+fields in `include` are requested, so embeddings are never copied unless
+asked for, and `write_jsonl` streams hits to disk as they arrive.
+
+Usage:
+    python chroma_results.py my_vectordb --collection policies --get --jsonl dump.jsonl
+    python chroma_results.py my_vectordb --collection policies --query "Can I return swimwear?" -n 10000 --jsonl -
+"""
+
+import argparse
+import json
+import sys
+from typing import IO, Iterable, Iterator, List, Optional, Sequence
+
+DEFAULT_PAGE_SIZE = 1000
+QUERY_INCLUDE = ("documents", "metadatas", "distances")
+GET_INCLUDE = ("documents", "metadatas")
+_FIELDS = ("documents", "metadatas", "distances", "embeddings", "uris", "data")
+
+
+class Hit:
+    """One result row; fields left out of `include` are None."""
+
+    __slots__ = ("id", "document", "metadata", "distance", "embedding", "query", "rank")
+
+    def __init__(self, id: str, document: Optional[str] = None, metadata: Optional[dict] = None,
+                 distance: Optional[float] = None, embedding=None, query: Optional[int] = None,
+                 rank: Optional[int] = None):
+        self.id = id
+        self.document = document
+        self.metadata = metadata
+        self.distance = distance
+        self.embedding = embedding
+        self.query = query  # index into the query batch (query results only)
+        self.rank = rank  # 1-based position within its query, or offset + 1 for get
+
+    def to_dict(self) -> dict:
+        row = {"id": self.id}
+        for name in ("query", "rank", "distance", "document", "metadata"):
+            value = getattr(self, name)
+            if value is not None:
+                row[name] = value
+        if self.embedding is not None:
+            row["embedding"] = [float(x) for x in self.embedding]
+        return row
+
+    def __repr__(self) -> str:
+        return f"Hit(id={self.id!r}, rank={self.rank}, distance={self.distance})"
+
+
+def _check_include(include: Sequence[str]) -> List[str]:
+    unknown = [f for f in include if f not in _FIELDS]
+    if unknown:
+        raise ValueError(f"unknown include field(s): {', '.join(unknown)} (expected some of {', '.join(_FIELDS)})")
+    return list(include)
+
+
+def _rows(result: dict, column: Optional[int]) -> Iterator[tuple]:
+    """(id, document, metadata, distance, embedding) rows of one query's (or get's) columns."""
+    def col(name):
+        values = result.get(name)
+        if values is None:
+            return None
+        return values[column] if column is not None else values
+
+    ids = col("ids")
+    documents, metadatas, distances, embeddings = col("documents"), col("metadatas"), col("distances"), col("embeddings")
+    for i, id_ in enumerate(ids):
+        yield (
+            id_,
+            documents[i] if documents is not None else None,
+            metadatas[i] if metadatas is not None else None,
+            float(distances[i]) if distances is not None else None,
+            embeddings[i] if embeddings is not None else None,
+        )
+
+
+def iter_query_pages(collection, query_texts: Optional[Sequence[str]] = None, query_embeddings=None,
+                     n_results: int = 10, where: Optional[dict] = None, where_document: Optional[dict] = None,
+                     include: Sequence[str] = QUERY_INCLUDE, page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[List[Hit]]:
+    """Pages of at most `page_size` hits, query by query.
+
+    Queries are sent in groups small enough that one call returns about a
+    page (`page_size // n_results` queries, at least one), so only that
+    group's raw result is alive at a time. Chroma has no offset for
+    queries: a single query's `n_results` rows always arrive in one call
+    and are then handed out page by page.
+    """
+    include = _check_include(include)
+    queries = query_texts if query_texts is not None else query_embeddings
+    if queries is None:
+        raise ValueError("give query_texts or query_embeddings")
+    per_call = max(1, page_size // max(1, n_results))
+    page: List[Hit] = []
+    for start in range(0, len(queries), per_call):
+        group = queries[start:start + per_call]
+        kwargs = {"query_texts": group} if query_texts is not None else {"query_embeddings": group}
+        result = collection.query(n_results=n_results, where=where, where_document=where_document,
+                                  include=include, **kwargs)
+        for q in range(len(group)):
+            for rank, (id_, doc, meta, dist, emb) in enumerate(_rows(result, q), start=1):
+                page.append(Hit(id_, doc, meta, dist, emb, start + q, rank))
+                if len(page) >= page_size:
+                    yield page
+                    page = []
+        del result
+    if page:
+        yield page
+
+
+def iter_query(collection, query_texts: Optional[Sequence[str]] = None, query_embeddings=None, **kwargs) -> Iterator[Hit]:
+    """Hits of `iter_query_pages`, one at a time."""
+    for page in iter_query_pages(collection, query_texts, query_embeddings, **kwargs):
+        yield from page
+
+
+def iter_get_pages(collection, ids: Optional[Sequence[str]] = None, where: Optional[dict] = None,
+                   where_document: Optional[dict] = None, include: Sequence[str] = GET_INCLUDE,
+                   page_size: int = DEFAULT_PAGE_SIZE, limit: Optional[int] = None,
+                   offset: int = 0) -> Iterator[List[Hit]]:
+    """Pages of `collection.get`, fetched with limit/offset (starting at `offset`)."""
+    include = _check_include(include)
+    if limit is not None:
+        limit += offset
+    while limit is None or offset < limit:
+        size = page_size if limit is None else min(page_size, limit - offset)
+        result = collection.get(ids=ids, where=where, where_document=where_document, include=include,
+                                limit=size, offset=offset)
+        page = [Hit(id_, doc, meta, None, emb, None, offset + i + 1)
+                for i, (id_, doc, meta, _, emb) in enumerate(_rows(result, None))]
+        del result
+        if page:
+            yield page
+        if len(page) < size:
+            break
+        offset += len(page)
+
+
+def iter_get(collection, **kwargs) -> Iterator[Hit]:
+    for page in iter_get_pages(collection, **kwargs):
+        yield from page
+
+
+def write_jsonl(hits: Iterable[Hit], fh: IO[str]) -> int:
+    """Write one JSON object per hit; returns how many were written."""
+    count = 0
+    for hit in hits:
+        fh.write(json.dumps(hit.to_dict(), ensure_ascii=False))
+        fh.write("\n")
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream ChromaDB query/get results as JSON lines")
+    parser.add_argument("path", help="PersistentClient directory (e.g. my_vectordb)")
+    parser.add_argument("--collection", required=True, help="Collection name")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--get", action="store_true", help="Dump the collection (optionally filtered by --where)")
+    mode.add_argument("--query", action="append", help="Query text (repeatable)")
+    parser.add_argument("-n", "--n-results", type=int, default=10, help="Neighbours per query (default: 10)")
+    parser.add_argument("--where", type=json.loads, help="Metadata filter as JSON")
+    parser.add_argument("--include", nargs="+",
+                        help="Fields to fetch (default: documents metadatas [distances]; add embeddings explicitly)")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help=f"Rows per page (default: {DEFAULT_PAGE_SIZE})")
+    parser.add_argument("--jsonl", metavar="PATH", default="-", help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    import chromadb
+    from chromadb.errors import ChromaError
+
+    client = chromadb.PersistentClient(path=args.path)
+    try:
+        collection = client.get_collection(args.collection)
+        if args.get:
+            hits = iter_get(collection, where=args.where, include=args.include or GET_INCLUDE,
+                            page_size=args.page_size)
+        else:
+            hits = iter_query(collection, query_texts=args.query, n_results=args.n_results, where=args.where,
+                              include=args.include or QUERY_INCLUDE, page_size=args.page_size)
+        if args.jsonl == "-":
+            count = write_jsonl(hits, sys.stdout)
+        else:
+            with open(args.jsonl, "w", encoding="utf-8") as fh:
+                count = write_jsonl(hits, fh)
+    except (OSError, ValueError, ChromaError) as e:
+        sys.exit(f"error: {e}")
+    print(f"{count} rows written", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
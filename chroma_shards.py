@@ -0,0 +1,399 @@
+#!/usr/bin/env python
+"""
+chroma_shards.py - Hash-partitioned ChromaDB collections with scatter-gather queries
+`ShardedCollection` spreads documents over N collections by a stable hash of
+their id, each collection living in its own worker process (and, with a
+path, its own PersistentClient directory `<path>/shard-NN`). Adds are split
+per shard and sent to all workers before any reply is awaited, so the N
+HNSW indexes are built in parallel; queries go to every shard and the
+per-shard top-k lists are merged by distance. It answers `add`, `upsert`,
+`delete`, `count` and `query` like a `Collection`, including the nested
+`query` result layout, so the demo loops and chroma_results.iter_query work
+unchanged.
+
+Embeddings are computed once in the calling process (the workers never load
+a model) and shipped to the shards with the documents.
+
+Usage:
+    python chroma_shards.py --docs 100000 --shards 1 2 4 8
+    python chroma_shards.py --docs 50000 --dim 384 --persist ./sharded_db --json-report shards.json
+"""
+
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+class ShardError(Exception):
+    def __init__(self, shard: int, message: str):
+        super().__init__(f"shard {shard}: {message}")
+        self.shard = shard
+
+
+def shard_of(id_: str, n_shards: int) -> int:
+    """Stable shard index of a document id (crc32, the same on every run and host)."""
+    return zlib.crc32(id_.encode("utf-8")) % n_shards
+
+
+# ── shard workers ──────────────────────────────────────────────────────────
+
+def _open_collection(path: Optional[str], name: str, metadata: Optional[dict]):
+    import chromadb
+
+    client = chromadb.PersistentClient(path=path) if path else chromadb.EphemeralClient()
+    # embeddings always arrive precomputed: no embedding function in the workers
+    return client, client.get_or_create_collection(name, embedding_function=None, metadata=metadata)
+
+
+def _call(client, collection, op: str, kwargs: dict):
+    if op in ("add", "upsert"):
+        limit = client.get_max_batch_size()
+        ids = kwargs["ids"]
+        for start in range(0, len(ids), limit):
+            part = {k: (v[start:start + limit] if v is not None else None) for k, v in kwargs.items()}
+            getattr(collection, op)(**part)
+        return len(ids)
+    if op == "delete":
+        collection.delete(**kwargs)
+        return None
+    if op == "count":
+        return collection.count()
+    result = collection.query(**kwargs)
+    return {k: v for k, v in result.items() if k != "included"}
+
+
+def _shard_main(conn, path: Optional[str], name: str, metadata: Optional[dict]):
+    """Worker process loop: one collection, (op, kwargs) requests in, (ok, value) replies out."""
+    try:
+        client, collection = _open_collection(path, name, metadata)
+    except Exception as e:
+        conn.send((False, f"{type(e).__name__}: {e}"))
+        return
+    conn.send((True, os.getpid()))
+    while True:
+        try:
+            op, kwargs = conn.recv()
+        except EOFError:
+            return
+        if op == "close":
+            conn.send((True, None))
+            return
+        try:
+            conn.send((True, _call(client, collection, op, kwargs)))
+        except Exception as e:  # reported to the caller, the worker keeps serving
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class _LocalShard:
+    """In-process stand-in for a worker (processes=False): same send/recv protocol."""
+
+    def __init__(self, path: Optional[str], name: str, metadata: Optional[dict]):
+        self._client, self._collection = _open_collection(path, name, metadata)
+        self._reply = None
+
+    def send(self, request):
+        op, kwargs = request
+        try:
+            self._reply = (True, None if op == "close" else _call(self._client, self._collection, op, kwargs))
+        except Exception as e:
+            self._reply = (False, f"{type(e).__name__}: {e}")
+
+    def recv(self):
+        reply, self._reply = self._reply, None
+        return reply
+
+
+# ── sharded collection ─────────────────────────────────────────────────────
+
+class ShardedCollection:
+    """N collections behind the `Collection` add/query interface.
+
+    Workers are spawned, which re-imports the calling script: create the
+    collection under `if __name__ == "__main__":` as with any multiprocessing
+    code. `processes=False` keeps the shards in this process instead.
+    """
+
+    def __init__(self, n_shards: int, path: Optional[str] = None, name: str = "sharded",
+                 embedding_function=None, metadata: Optional[dict] = None, processes: bool = True):
+        if n_shards < 1:
+            raise ValueError("n_shards must be at least 1")
+        self.n_shards = n_shards
+        self.path = path
+        self.name = name
+        self.embedding_function = embedding_function
+        self.processes = processes
+        self._lock = threading.Lock()
+        self._conns: List[Any] = []
+        self._procs: List[multiprocessing.Process] = []
+        ctx = multiprocessing.get_context("spawn")  # chromadb's threads do not survive fork
+        for i in range(n_shards):
+            shard_path = os.path.join(path, f"shard-{i:02d}") if path else None
+            if processes:
+                parent, child = ctx.Pipe()
+                proc = ctx.Process(target=_shard_main, args=(child, shard_path, name, metadata),
+                                   name=f"chroma-shard-{i}", daemon=True)
+                proc.start()
+                child.close()
+                self._conns.append(parent)
+                self._procs.append(proc)
+            else:
+                # in-memory clients of one process share a backend: shards need their own names
+                self._conns.append(_LocalShard(shard_path, name if path else f"{name}-{i:02d}", metadata))
+        if processes:
+            self._gather(range(n_shards))  # wait until every worker has opened its collection
+
+    # -- transport --
+
+    def _gather(self, shards) -> Dict[int, Any]:
+        results = {}
+        errors = []
+        for i in shards:
+            try:
+                ok, value = self._conns[i].recv()
+            except EOFError:
+                ok, value = False, "worker exited"
+            if ok:
+                results[i] = value
+            else:
+                errors.append(ShardError(i, value))
+        if errors:
+            raise errors[0]
+        return results
+
+    def _scatter(self, requests: Dict[int, tuple]) -> Dict[int, Any]:
+        """Send every shard its request first, then collect: the shards work concurrently."""
+        with self._lock:
+            for i, request in requests.items():
+                self._conns[i].send(request)
+            return self._gather(requests.keys())
+
+    # -- writes --
+
+    def _embed(self, documents: Sequence[str]) -> np.ndarray:
+        if self.embedding_function is None:
+            raise ValueError("no embedding_function: pass embeddings")
+        return np.asarray(self.embedding_function(list(documents)), dtype=np.float32)
+
+    def _write(self, op: str, ids: Sequence[str], documents=None, embeddings=None, metadatas=None) -> int:
+        ids = list(ids)
+        embeddings = self._embed(documents) if embeddings is None else np.asarray(embeddings, dtype=np.float32)
+        parts: Dict[int, List[int]] = {}
+        for row, id_ in enumerate(ids):
+            parts.setdefault(shard_of(id_, self.n_shards), []).append(row)
+        requests = {}
+        for shard, rows in parts.items():
+            requests[shard] = (op, {
+                "ids": [ids[r] for r in rows],
+                "embeddings": embeddings[rows],
+                "documents": [documents[r] for r in rows] if documents is not None else None,
+                "metadatas": [metadatas[r] for r in rows] if metadatas is not None else None,
+            })
+        return sum(self._scatter(requests).values())
+
+    def add(self, ids: Sequence[str], documents: Optional[Sequence[str]] = None, embeddings=None,
+            metadatas: Optional[Sequence[dict]] = None) -> None:
+        self._write("add", ids, documents, embeddings, metadatas)
+
+    def upsert(self, ids: Sequence[str], documents: Optional[Sequence[str]] = None, embeddings=None,
+               metadatas: Optional[Sequence[dict]] = None) -> None:
+        self._write("upsert", ids, documents, embeddings, metadatas)
+
+    def delete(self, ids: Optional[Sequence[str]] = None, where: Optional[dict] = None) -> None:
+        if ids is None:
+            self._scatter({i: ("delete", {"where": where}) for i in range(self.n_shards)})
+            return
+        parts: Dict[int, List[str]] = {}
+        for id_ in ids:
+            parts.setdefault(shard_of(id_, self.n_shards), []).append(id_)
+        self._scatter({i: ("delete", {"ids": part, "where": where}) for i, part in parts.items()})
+
+    # -- reads --
+
+    def count(self) -> int:
+        return sum(self._scatter({i: ("count", {}) for i in range(self.n_shards)}).values())
+
+    def shard_counts(self) -> List[int]:
+        counts = self._scatter({i: ("count", {}) for i in range(self.n_shards)})
+        return [counts[i] for i in range(self.n_shards)]
+
+    def query(self, query_texts: Optional[Sequence[str]] = None, query_embeddings=None, n_results: int = 10,
+              where: Optional[dict] = None, where_document: Optional[dict] = None,
+              include: Sequence[str] = ("metadatas", "documents", "distances")) -> dict:
+        """Top `n_results` over all shards, in `collection.query`'s nested-list layout."""
+        if query_embeddings is None:
+            if query_texts is None:
+                raise ValueError("give query_texts or query_embeddings")
+            if self.embedding_function is None:
+                raise ValueError("no embedding_function: pass query_embeddings")
+            embed = getattr(self.embedding_function, "embed_query", self.embedding_function)
+            query_embeddings = embed(list(query_texts))
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        include = list(include)
+        fetch = include if "distances" in include else include + ["distances"]  # merging needs them
+        kwargs = {"query_embeddings": query_embeddings, "n_results": n_results, "where": where,
+                  "where_document": where_document, "include": fetch}
+        parts = self._scatter({i: ("query", kwargs) for i in range(self.n_shards)})
+
+        fields = [f for f in ("documents", "metadatas", "embeddings", "uris", "data") if f in include]
+        merged: Dict[str, Any] = {"ids": [], "distances": [] if "distances" in include else None}
+        merged.update({f: [] for f in fields})
+        for q in range(len(query_embeddings)):
+            candidates = []
+            for shard, result in parts.items():
+                for pos, distance in enumerate(result["distances"][q]):
+                    candidates.append((float(distance), shard, pos))
+            best = heapq.nsmallest(n_results, candidates)
+            merged["ids"].append([parts[s]["ids"][q][p] for _, s, p in best])
+            if merged["distances"] is not None:
+                merged["distances"].append([d for d, _, _ in best])
+            for f in fields:
+                merged[f].append([parts[s][f][q][p] for _, s, p in best])
+        for f in ("documents", "metadatas", "embeddings", "uris", "data"):
+            merged.setdefault(f, None)
+        merged["included"] = include
+        return merged
+
+    # -- lifecycle --
+
+    def close(self):
+        if not self._conns:
+            return
+        try:
+            self._scatter({i: ("close", {}) for i in range(self.n_shards)})
+        except (ShardError, OSError):
+            pass
+        for proc in self._procs:
+            proc.join(timeout=10)
+            if proc.is_alive():
+                proc.terminate()
+        for conn in self._conns:
+            if hasattr(conn, "close"):
+                conn.close()
+        self._conns, self._procs = [], []
+
+    def __enter__(self) -> "ShardedCollection":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ── scaling benchmark ──────────────────────────────────────────────────────
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """Unit vectors drawn around random centres, roughly like sentence embeddings."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, n)] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def _exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k nearest corpus rows per query by squared L2 (Chroma's default space)."""
+    distances = (queries ** 2).sum(1)[:, None] - 2 * queries @ corpus.T + (corpus ** 2).sum(1)[None, :]
+    top = np.argpartition(distances, k, axis=1)[:, :k]
+    order = np.take_along_axis(distances, top, axis=1).argsort(axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def benchmark(shard_counts: Sequence[int], docs: int, dim: int, queries: int, k: int,
+              batch_size: int = 5000, path: Optional[str] = None, processes: bool = True) -> List[dict]:
+    corpus = synthetic_vectors(docs, dim)
+    probes = synthetic_vectors(queries, dim, seed=1)
+    ids = [f"doc-{i}" for i in range(docs)]
+    truth = _exact_top_k(corpus, probes, k)
+    rows = []
+    for n in shard_counts:
+        shard_path = os.path.join(path, f"{n}-shards") if path else None
+        if shard_path and os.path.exists(shard_path):
+            shutil.rmtree(shard_path)
+        with ShardedCollection(n, shard_path, name=f"bench-{n}", processes=processes) as sharded:
+            t0 = time.perf_counter()
+            for start in range(0, docs, batch_size):
+                sharded.add(ids=ids[start:start + batch_size], embeddings=corpus[start:start + batch_size],
+                            metadatas=[{"n": i} for i in range(start, min(docs, start + batch_size))])
+            build = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            batched = sharded.query(query_embeddings=probes, n_results=k, include=["distances"])
+            batch_seconds = time.perf_counter() - t0
+            latencies = []
+            for q in probes[:min(queries, 100)]:
+                t1 = time.perf_counter()
+                sharded.query(query_embeddings=q[None, :], n_results=k, include=["distances"])
+                latencies.append(time.perf_counter() - t1)
+            counts = sharded.shard_counts()
+
+        found = [{int(i.split("-")[1]) for i in row} for row in batched["ids"]]
+        recall = sum(len(f & set(t.tolist())) for f, t in zip(found, truth)) / (queries * k)
+        rows.append({
+            "shards": n,
+            "build_seconds": round(build, 3),
+            "docs_per_second": round(docs / build, 1),
+            "batch_qps": round(queries / batch_seconds, 1),
+            "p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "p95_ms": round(sorted(latencies)[int(0.95 * (len(latencies) - 1))] * 1000, 2),
+            "recall_at_k": round(recall, 4),
+            "largest_shard": max(counts),
+            "smallest_shard": min(counts),
+        })
+    return rows
+
+
+def format_table(rows: List[dict]) -> str:
+    base = rows[0]
+    lines = [f"  {'Shards':>6} {'Build(s)':>9} {'Docs/s':>9} {'Speedup':>8} {'Batch q/s':>10} "
+             f"{'p50 ms':>8} {'p95 ms':>8} {'Recall@k':>9} {'Shard sizes':>14}"]
+    for r in rows:
+        lines.append(
+            f"  {r['shards']:>6} {r['build_seconds']:>9.2f} {r['docs_per_second']:>9.0f} "
+            f"{base['build_seconds'] / r['build_seconds']:>7.2f}x {r['batch_qps']:>10.1f} "
+            f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['recall_at_k']:>9.4f} "
+            f"{str(r['smallest_shard']) + '-' + str(r['largest_shard']):>14}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query sharded collections with 1..N shards")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4], help="Shard counts (default: 1 2 4)")
+    parser.add_argument("--docs", type=int, default=50000, help="Synthetic documents (default: 50000)")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension (default: 384)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries (default: 200)")
+    parser.add_argument("-k", type=int, default=10, help="Neighbours per query (default: 10)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Documents per add call (default: 5000)")
+    parser.add_argument("--persist", metavar="DIR", help="Build PersistentClient shards under DIR (default: in memory)")
+    parser.add_argument("--in-process", action="store_true", help="Keep shards in this process (no workers)")
+    parser.add_argument("--json-report", metavar="PATH", help="Also write the rows as JSON ('-' for stdout)")
+    args = parser.parse_args()
+
+    try:
+        rows = benchmark(args.shards, args.docs, args.dim, args.queries, args.k,
+                         batch_size=args.batch_size, path=args.persist, processes=not args.in_process)
+    except (OSError, ShardError, ValueError) as e:
+        sys.exit(f"error: {e}")
+
+    if args.json_report == "-":
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"  {args.docs} docs x {args.dim} dim, {args.queries} queries, k={args.k}, "
+          f"{'in-process' if args.in_process else 'worker processes'}, {os.cpu_count()} CPU(s)")
+    print(format_table(rows))
+    if args.json_report:
+        with open(args.json_report, "w", encoding="utf-8") as fh:
+            json.dump(rows, fh, indent=2)
+            fh.write("\n")
+
+
+if __name__ == "__main__":
+    main()
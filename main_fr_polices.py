@@ -30,6 +30,11 @@ REQUIREMENTS = [
     ("sentence_transformers", "sentence-transformers"),
 ]
 
+# Avec le démon d'embedding (CHROMA_EMBED_SOCKET), le modèle vit dans un
+# autre processus : sentence-transformers n'est pas nécessaire ici.
+if os.environ.get("CHROMA_EMBED_SOCKET"):
+    REQUIREMENTS = [r for r in REQUIREMENTS if r[0] != "sentence_transformers"]
+
 for module_name, pip_name in REQUIREMENTS:
     try:
         __import__(module_name)
@@ -43,6 +48,10 @@ for module_name, pip_name in REQUIREMENTS:
 
 import chromadb
 
+from chroma_dedup import Deduper, Record
+from chroma_pipeline import IngestPipeline
+from chroma_results import iter_query
+
 
 # ═══════════════════════════════════════════════════════════════════════════
 #  Fonction utilitaire : catégorisation simple par mots-clés
@@ -103,46 +112,83 @@ def main():
     print(f"  Modèle : {MODEL_NAME}")
     print(f"{'='*70}\n")
 
-    from chromadb.utils.embedding_functions import (
-        SentenceTransformerEmbeddingFunction,
-    )
+    # -- Démon d'embedding partagé (optionnel) ------------------------------
+    # Si CHROMA_EMBED_SOCKET est défini, le modèle est déjà chargé une seule
+    # fois par machine par `python chroma_embedserver.py serve --model ...` :
+    # ce processus ne fait que lui envoyer les textes.
+    socket_demon = os.environ.get("CHROMA_EMBED_SOCKET")
+    if socket_demon:
+        from chroma_embedserver import RemoteEmbeddingFunction
+
+        print(f"[1/4] Connexion au démon d'embedding '{socket_demon}'...")
+        t0 = time.time()
+        embedding_fn = RemoteEmbeddingFunction(socket_demon)
+        try:
+            info = embedding_fn.info()
+        except OSError as e:
+            print(f"ERREUR : {e}")
+            sys.exit(1)
+        t_model = time.time() - t0  # pas de chargement : juste la connexion
+        if info["model"] != MODEL_NAME:
+            print(f"      Attention : le démon sert '{info['model']}', pas '{MODEL_NAME}'")
+        print(f"      Modèle '{info['model']}' ({info['dimension']} dim) servi par le PID {info['pid']}\n")
+    else:
+        from chromadb.utils.embedding_functions import (
+            SentenceTransformerEmbeddingFunction,
+        )
 
-    # -- Instancier la fonction d'embedding -------------------------------
-    # Le modèle est téléchargé automatiquement au premier appel (~470 Mo).
-    # Les appels suivants utilisent le cache local.
-    print(f"[1/4] Chargement du modèle '{MODEL_NAME}'...")
-    print(f"      (premier lancement : téléchargement ~470 Mo, patience...)\n")
+        # -- Instancier la fonction d'embedding -------------------------------
+        # Le modèle est téléchargé automatiquement au premier appel (~470 Mo).
+        # Les appels suivants utilisent le cache local.
+        print(f"[1/4] Chargement du modèle '{MODEL_NAME}'...")
+        print(f"      (premier lancement : téléchargement ~470 Mo, patience...)\n")
 
-    t0 = time.time()
-    embedding_fn = SentenceTransformerEmbeddingFunction(
-        model_name=MODEL_NAME,
-        # device="cuda"  # Décommenter pour utiliser un GPU NVIDIA
-    )
-    t_model = time.time() - t0
-    print(f"      Modèle chargé en {t_model:.1f}s\n")
+        t0 = time.time()
+        embedding_fn = SentenceTransformerEmbeddingFunction(
+            model_name=MODEL_NAME,
+            # device="cuda"  # Décommenter pour utiliser un GPU NVIDIA
+        )
+        t_model = time.time() - t0
+        print(f"      Modèle chargé en {t_model:.1f}s\n")
 
     # ╔══════════════════════════════════════════════════════════════════════╗
     # ║  3. LECTURE DES POLICES FRANÇAISES                                 ║
     # ╚══════════════════════════════════════════════════════════════════════╝
 
-    print(f"[2/4] Lecture de '{POLICES_FILE}'...")
+    print(f"[2/4] Lecture de '{POLICES_FILE}' (en flux, pendant l'indexation)...\n")
 
     if not os.path.isfile(POLICES_FILE):
         print(f"ERREUR : fichier '{POLICES_FILE}' introuvable.")
         print(f"         Assurez-vous qu'il existe dans : {os.getcwd()}")
         sys.exit(1)
 
-    with open(POLICES_FILE, "r", encoding="utf-8") as f:
-        lines = f.read().splitlines()
-
-    # Filtrer les lignes vides et la ligne d'en-tête (si présente)
-    polices = [line.strip() for line in lines if line.strip()]
-    # Retirer la première ligne si c'est un en-tête de traduction
-    if polices and polices[0].lower().startswith("voici une traduction"):
-        header = polices.pop(0)
-        print(f"      (en-tête ignoré : '{header[:50]}...')")
-
-    print(f"      {len(polices)} polices chargées.\n")
+    def lire_polices():
+        """Lignes non vides du fichier, lues au fur et à mesure."""
+        with open(POLICES_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield line.strip()
+
+    # Numérotation des polices retenues ; la première ligne est ignorée
+    # si c'est un en-tête de traduction
+    compteur = {"ligne": 0, "premiere": True}
+
+    def preparer(doc):
+        premiere, compteur["premiere"] = compteur["premiere"], False
+        if premiere and doc.lower().startswith("voici une traduction"):
+            print(f"      (en-tête ignoré : '{doc[:50]}...')")
+            return None
+        ligne = compteur["ligne"]
+        compteur["ligne"] += 1
+        return Record(
+            str(uuid.uuid4()),
+            doc,
+            {
+                "ligne": ligne,
+                "categorie": _categorize(doc),
+                "langue": "fr",
+            },
+        )
 
     # ╔══════════════════════════════════════════════════════════════════════╗
     # ║  4. INDEXATION DANS CHROMADB                                       ║
@@ -161,26 +207,26 @@ def main():
         metadata={"hnsw:space": DISTANCE_METRIC},
     )
 
-    # Générer les IDs et métadonnées
-    ids = [str(uuid.uuid4()) for _ in polices]
-    metadatas = [
-        {
-            "ligne": i,
-            "categorie": _categorize(doc),
-            "langue": "fr",
-        }
-        for i, doc in enumerate(polices)
-    ]
-
-    t0 = time.time()
-    collection.add(
-        ids=ids,
-        documents=polices,
-        metadatas=metadatas,
+    # Pipeline lecture → préparation → embedding → insertion, reliées par des
+    # files bornées : chaque étape travaille pendant que les autres attendent.
+    # La préparation catégorise et dédoublonne (doublons exacts et
+    # quasi-doublons MinHash/LSH ne sont embeddés qu'une fois ; la police
+    # conservée reçoit les IDs et lignes des autres dans ses métadonnées).
+    pipeline = IngestPipeline(
+        collection,
+        embedding_fn,
+        prepare=preparer,
+        deduper=Deduper(),
+        line_key="ligne",
     )
-    t_index = time.time() - t0
-
-    print(f"      {len(polices)} documents indexés en {t_index:.1f}s")
+    rapport = pipeline.run(lire_polices())
+    t_index = rapport.wall
+
+    if rapport.duplicates:
+        print(f"      Dédoublonnage : {rapport.duplicates} doublons écartés "
+              f"→ {rapport.inserted} embeddings au lieu de {rapport.inserted + rapport.duplicates}")
+    print(f"      {rapport.inserted} documents indexés en {t_index:.1f}s")
+    print(rapport.format_table())
     peek = collection.peek(1)
     embed_dim = peek["embeddings"].shape[1] if hasattr(peek["embeddings"], "shape") else len(peek["embeddings"][0])
     print(f"      Dimension des embeddings : {embed_dim}")
@@ -203,27 +249,16 @@ def main():
     ]
 
     for query in requetes:
-        results = collection.query(
-            query_texts=[query],
-            n_results=TOP_K,
-        )
-
         print(f"  ┌─ Requête : « {query} »")
         print(f"  │")
 
-        for rank, (doc, dist, meta) in enumerate(
-            zip(
-                results["documents"][0],
-                results["distances"][0],
-                results["metadatas"][0],
-            ),
-            start=1,
-        ):
+        for hit in iter_query(collection, query_texts=[query], n_results=TOP_K):
             # Tronquer l'affichage à 90 caractères
+            doc = hit.document
             doc_short = doc[:90] + "..." if len(doc) > 90 else doc
-            bar = "█" * int((1 - dist) * 20)  # barre de pertinence visuelle
-            print(f"  │  {rank}. [{dist:.4f}] {bar}")
-            print(f"  │     (ligne {meta['ligne']:>2}, {meta['categorie']})")
+            bar = "█" * int((1 - hit.distance) * 20)  # barre de pertinence visuelle
+            print(f"  │  {hit.rank}. [{hit.distance:.4f}] {bar}")
+            print(f"  │     (ligne {hit.metadata['ligne']:>2}, {hit.metadata['categorie']})")
             print(f"  │     {doc_short}")
             print(f"  │")
 
@@ -246,20 +281,14 @@ def main():
     ]
 
     for query in requetes_en:
-        results = collection.query(
-            query_texts=[query],
-            n_results=3,
-        )
-
         print(f"  ┌─ Query (EN) : « {query} »")
         print(f"  │")
 
-        for rank, (doc, dist) in enumerate(
-            zip(results["documents"][0], results["distances"][0]),
-            start=1,
-        ):
-            doc_short = doc[:90] + "..." if len(doc) > 90 else doc
-            print(f"  │  {rank}. [{dist:.4f}] {doc_short}")
+        # seuls documents et distances sont affichés : inutile de rapatrier les métadonnées
+        for hit in iter_query(collection, query_texts=[query], n_results=3,
+                              include=["documents", "distances"]):
+            doc_short = hit.document[:90] + "..." if len(hit.document) > 90 else hit.document
+            print(f"  │  {hit.rank}. [{hit.distance:.4f}] {doc_short}")
 
         print(f"  └{'─'*68}\n")
 
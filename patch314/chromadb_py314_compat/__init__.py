@@ -2,7 +2,10 @@
 chromadb_py314_compat - Monkey-patch shim for ChromaDB on Python 3.14+
 
 Install this package alongside chromadb to fix the Pydantic import failure
-on Python 3.14. It patches chromadb.config at import time.
+on Python 3.14. Importing it only registers a `sys.meta_path` hook; the
+pydantic-settings shim (`chromadb._py314_pydantic_shim`) is built the first
+time `chromadb.config` is imported, so processes that never load chromadb's
+config do not pay for importing pydantic.
 
 Usage:
     pip install pydantic-settings>=2.0
@@ -12,38 +15,69 @@ Usage:
 
 import sys
 import importlib
+import importlib.machinery
+import importlib.util
 
+_SHIM_MODULE = "chromadb._py314_pydantic_shim"
+_TRIGGER_MODULE = "chromadb.config"
 
-def _patch_chromadb_config():
-    """Patch chromadb.config to use pydantic-settings instead of pydantic.v1."""
+
+class _PydanticShimLoader:
+    """Builds chromadb._py314_pydantic_shim from settings_compat on demand."""
+
+    def create_module(self, spec):
+        return None  # default module creation
+
+    def exec_module(self, module):
+        from chromadb_py314_compat.settings_compat import (
+            BaseSettings,
+            validator,
+        )
+
+        module.BaseSettings = BaseSettings
+        module.validator = validator
+        module.in_pydantic_v2 = True
+
+
+class _ChromaConfigFinder:
+    """Serves the shim module, and builds it just before chromadb.config loads.
+
+    For chromadb.config itself the finder returns None, so the regular
+    path finders still locate and load the real module. (Neither class
+    subclasses importlib.abc: importing it would cost more than the hook.)
+    """
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname == _SHIM_MODULE:
+            return importlib.machinery.ModuleSpec(fullname, _PydanticShimLoader())
+        if fullname == _TRIGGER_MODULE and _SHIM_MODULE not in sys.modules:
+            importlib.import_module(_SHIM_MODULE)
+        return None
+
+
+_finder = _ChromaConfigFinder()
+
+
+def _patch_chromadb_config(force: bool = False):
+    """Register the lazy chromadb.config hook (Python 3.14+, or when forced)."""
 
     # Only needed on Python 3.14+
-    if sys.version_info < (3, 14):
+    if sys.version_info < (3, 14) and not force:
         return
 
-    try:
-        import pydantic_settings  # noqa: F401
-    except ImportError:
+    # Fail at import time as before, without importing pydantic-settings yet
+    if importlib.util.find_spec("pydantic_settings") is None:
         raise ImportError(
             "chromadb_py314_compat requires 'pydantic-settings>=2.0'. "
             "Install it with: pip install pydantic-settings>=2.0"
         )
 
-    # Pre-populate the pydantic import path so chromadb.config finds
-    # BaseSettings in the right place before it tries pydantic.v1
-    from chromadb_py314_compat.settings_compat import (
-        BaseSettings,
-        validator,
-    )
-
-    # Intercept chromadb.config import via sys.modules manipulation
-    import types
-
-    config_shim = types.ModuleType("chromadb._py314_pydantic_shim")
-    config_shim.BaseSettings = BaseSettings
-    config_shim.validator = validator
-    config_shim.in_pydantic_v2 = True
-    sys.modules["chromadb._py314_pydantic_shim"] = config_shim
+    if _finder not in sys.meta_path:
+        sys.meta_path.insert(0, _finder)
+
+    # Too late for the hook: chromadb.config was imported before this package
+    if _TRIGGER_MODULE in sys.modules and _SHIM_MODULE not in sys.modules:
+        importlib.import_module(_SHIM_MODULE)
 
 
 # Auto-apply patch on import of this package
@@ -25,16 +25,20 @@ try:
     # Pydantic v2 with pydantic-settings installed (recommended path)
     from pydantic_settings import BaseSettings
     from pydantic import field_validator  # pydantic v2 API
+    from functools import lru_cache
 
     in_pydantic_v2 = True
 
+    # One field_validator decorator per (field, mode), reused across calls
+    _field_validator = lru_cache(maxsize=None)(field_validator)
+
     # Provide a 'validator' compatible wrapper for existing @validator usage
     # in the Settings class. This avoids rewriting all validators at once.
     def validator(field: str, *, pre: bool = False, always: bool = False,
                   allow_reuse: bool = False):
         """Shim: wraps pydantic v2 field_validator to match v1 @validator signature."""
         mode = "before" if pre else "after"
-        return field_validator(field, mode=mode)
+        return _field_validator(field, mode=mode)
 
 except ImportError:
     try:
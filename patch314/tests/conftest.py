@@ -1,8 +1,15 @@
 """Pytest fixtures for Python 3.14 compatibility tests."""
 
+import os
 import sys
 import pytest
 
+# the shim package lives next to tests/; make it importable wherever pytest
+# is started from (e.g. `pytest patch314/tests` at the repository root)
+PATCH_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PATCH_ROOT not in sys.path:
+    sys.path.insert(0, PATCH_ROOT)
+
 
 @pytest.fixture
 def python_version():
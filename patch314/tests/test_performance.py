@@ -0,0 +1,159 @@
+"""
+Startup and client-creation performance budgets.
+
+Each measurement runs in fresh interpreters (best of PERF_RUNS) and is
+compared with the baseline stored for this Python minor version in
+perf_baselines.json ("3.11-linux", falling back to "3.11"; the platform is
+sys.platform, so "win32" and "darwin" elsewhere): a metric passes while it
+stays within `baseline * tolerance + slack`. A metric without a baseline is
+measured and reported with a MissingBaselineWarning, or fails when
+PERF_REQUIRE_BASELINE=1.
+
+Every run writes a machine-readable results file (PERF_RESULTS, default
+tests/perf_results.json). Setting PERF_UPDATE_BASELINE=1 stores the
+measured values as this Python version's new baseline.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PATCH_ROOT = os.path.dirname(TESTS_DIR)
+BASELINE_FILE = os.path.join(TESTS_DIR, "perf_baselines.json")
+RESULTS_FILE = os.environ.get("PERF_RESULTS", os.path.join(TESTS_DIR, "perf_results.json"))
+UPDATE_BASELINE = os.environ.get("PERF_UPDATE_BASELINE") == "1"
+REQUIRE_BASELINE = os.environ.get("PERF_REQUIRE_BASELINE") == "1"
+PERF_RUNS = int(os.environ.get("PERF_RUNS", "3"))
+PY_VERSION = f"{sys.version_info.major}.{sys.version_info.minor}"
+BASELINE_KEY = f"{PY_VERSION}-{sys.platform}"
+
+# Prints {"seconds": ..., "rss_mb": ...} for the statement in {stmt}; the
+# setup in {setup} is excluded from the timing.
+_PROBE = """
+import json, os, sys, time
+{setup}
+start = time.perf_counter()
+{stmt}
+seconds = time.perf_counter() - start
+try:
+    import psutil
+    rss_mb = psutil.Process().memory_info().rss / 2**20
+except ImportError:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = peak / 2**20 if sys.platform == "darwin" else peak / 1024
+print(json.dumps({{"seconds": seconds, "rss_mb": rss_mb}}))
+"""
+
+_results = {}
+
+
+class MissingBaselineWarning(UserWarning):
+    """A metric was measured but perf_baselines.json has nothing to judge it against."""
+
+
+def _load_baselines():
+    with open(BASELINE_FILE, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _probe(stmt, setup=""):
+    """Best-of-PERF_RUNS measurement of `stmt` in fresh interpreters."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [PATCH_ROOT, os.environ.get("PYTHONPATH")])))
+    runs = []
+    for _ in range(PERF_RUNS):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(stmt=stmt, setup=setup)],
+            capture_output=True, text=True, env=env, timeout=300, check=True,
+        )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        "seconds": min(r["seconds"] for r in runs),
+        "rss_mb": min(r["rss_mb"] for r in runs),
+    }
+
+
+def _check(metric, value):
+    """Record `value` and compare it with this Python version's baseline."""
+    config = _load_baselines()
+    stored = config["baselines"]
+    baseline = stored.get(BASELINE_KEY, stored.get(PY_VERSION, {})).get(metric)
+    kind = "rss" if metric.endswith("_mb") else "time"
+    limit = None
+    if baseline is not None:
+        limit = baseline * config["tolerance"][kind] + config["slack"][kind]
+    status = "no-baseline" if limit is None else ("ok" if value <= limit else "regressed")
+    _results[metric] = {"value": round(value, 4), "baseline": baseline,
+                        "limit": None if limit is None else round(limit, 4), "status": status}
+    if UPDATE_BASELINE:
+        return
+    if limit is None:
+        message = (f"{metric} = {value:.3f} is not judged: perf_baselines.json has no "
+                   f"'{BASELINE_KEY}' or '{PY_VERSION}' baseline (record one with PERF_UPDATE_BASELINE=1)")
+        if REQUIRE_BASELINE:
+            pytest.fail(message)
+        warnings.warn(message, MissingBaselineWarning)
+        return
+    assert value <= limit, (
+        f"{metric} = {value:.3f} exceeds budget {limit:.3f} "
+        f"(baseline {baseline:.3f} for {BASELINE_KEY})"
+    )
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _write_results():
+    yield
+    report = {
+        "python": platform.python_version(),
+        "baseline_key": BASELINE_KEY,
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "runs_per_metric": PERF_RUNS,
+        "metrics": _results,
+    }
+    with open(RESULTS_FILE, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+        fh.write("\n")
+    if UPDATE_BASELINE and _results:
+        config = _load_baselines()
+        stored = config["baselines"].setdefault(BASELINE_KEY, {})
+        stored.update((name, r["value"]) for name, r in _results.items())
+        config["baselines"][BASELINE_KEY] = dict(sorted(stored.items()))
+        with open(BASELINE_FILE, "w", encoding="utf-8") as fh:
+            json.dump(config, fh, indent=2)
+            fh.write("\n")
+
+
+class TestColdImport:
+    """Cold import time and resident memory in a fresh interpreter."""
+
+    def test_import_chromadb(self):
+        m = _probe("import chromadb")
+        _check("import_chromadb_s", m["seconds"])
+        _check("rss_after_import_chromadb_mb", m["rss_mb"])
+
+    def test_import_chromadb_config(self):
+        m = _probe("import chromadb.config")
+        _check("import_chromadb_config_s", m["seconds"])
+
+    def test_import_compat_shim(self):
+        m = _probe("import chromadb_py314_compat")
+        _check("import_compat_shim_s", m["seconds"])
+        _check("rss_after_import_shim_mb", m["rss_mb"])
+
+
+class TestClientCreation:
+    """chromadb.Client() latency once chromadb is imported."""
+
+    def test_client_creation(self):
+        m = _probe("chromadb.Client()", setup="import chromadb")
+        _check("client_create_s", m["seconds"])
+        _check("rss_after_client_mb", m["rss_mb"])
@@ -100,3 +100,128 @@ class TestSettingsFieldTypes:
         hints = typing.get_type_hints(Settings)
         # If this doesn't raise, all annotations are valid
         assert len(hints) > 0, "Settings has no resolvable type hints"
+
+
+def _median_us(func, number=20, repeat=5):
+    """Median per-call cost of `func` in microseconds."""
+    import statistics
+    import timeit
+    samples = timeit.repeat(func, number=number, repeat=repeat)
+    return statistics.median(samples) / number * 1e6
+
+
+def _representative_settings(base, validator):
+    """A small Settings class shaped like chromadb's, for any backend."""
+    from typing import List, Optional
+
+    class BenchSettings(base):
+        chroma_server_host: Optional[str] = None
+        chroma_server_http_port: Optional[int] = None
+        chroma_server_nofile: Optional[int] = None
+        chroma_server_cors_allow_origins: List[str] = []
+        persist_directory: str = "./chroma"
+        is_persistent: bool = False
+        allow_reset: bool = False
+
+        @validator("chroma_server_nofile", pre=True, always=True, allow_reuse=True)
+        def empty_str_to_none(cls, v):
+            return None if v == "" else v
+
+    return BenchSettings
+
+
+class TestSettingsInstantiationCost:
+    """Micro-benchmark: Settings() cost per backend and with the cached factory.
+
+    Run with `pytest -s` to see the numbers. Timings are reported, never
+    asserted (a ratio would flake on loaded CI runners); the assertions
+    cover each backend's behaviour and the factory's cache hits and misses.
+    """
+
+    def _bench(self, cls):
+        instance = cls(chroma_server_nofile="")
+        assert instance.chroma_server_nofile is None
+        return _median_us(lambda: cls(chroma_server_host="localhost"))
+
+    def test_pydantic_settings_backend(self):
+        from chromadb_py314_compat.settings_compat import BaseSettings, validator
+        cost = self._bench(_representative_settings(BaseSettings, validator))
+        print(f"\npydantic-settings: {cost:.1f} us/instance")
+
+    @pytest.mark.skipif(
+        sys.version_info >= (3, 14),
+        reason="pydantic.v1 cannot build Settings on Python 3.14 (#5996)"
+    )
+    def test_pydantic_v1_shim_backend(self):
+        pydantic_v1 = pytest.importorskip("pydantic.v1")
+        cost = self._bench(_representative_settings(pydantic_v1.BaseSettings, pydantic_v1.validator))
+        print(f"\npydantic.v1 shim: {cost:.1f} us/instance")
+
+    def test_pydantic_v1_standalone_backend(self):
+        import pydantic
+        if not pydantic.VERSION.startswith("1."):
+            pytest.skip("pydantic v1 is not installed")
+        cost = self._bench(_representative_settings(pydantic.BaseSettings, pydantic.validator))
+        print(f"\npydantic v1: {cost:.1f} us/instance")
+
+    def test_cached_factory(self, monkeypatch):
+        from chromadb.config import Settings
+        from chromadb_py314_compat.settings_compat import SettingsFactory
+        factory = SettingsFactory(Settings)
+        first = factory()
+        second = factory()
+        assert (factory.hits, factory.misses) == (1, 1)
+        assert second is not first
+        assert second.chroma_server_cors_allow_origins is not first.chroma_server_cors_allow_origins
+        factory(chroma_server_host="elsewhere")
+        assert (factory.hits, factory.misses) == (1, 2)
+        monkeypatch.setenv("CHROMA_SERVER_HOST", "changed")
+        assert factory().chroma_server_host == "changed"
+        assert (factory.hits, factory.misses) == (1, 3)
+
+        direct = _median_us(lambda: Settings(), number=5)
+        cached = _median_us(lambda: factory(), number=50)
+        print(f"\nchromadb Settings(): {direct:.1f} us, cached factory: {cached:.1f} us "
+              f"({direct / cached:.0f}x)")
+
+
+class TestSettingsFactory:
+    """The cached factory must behave like Settings() for every caller."""
+
+    def test_overrides_are_part_of_the_key(self):
+        from chromadb.config import Settings
+        from chromadb_py314_compat.settings_compat import SettingsFactory
+        factory = SettingsFactory(Settings)
+        assert factory(chroma_server_host="a").chroma_server_host == "a"
+        assert factory(chroma_server_host="b").chroma_server_host == "b"
+        assert factory(chroma_server_host="a").chroma_server_host == "a"
+        assert (factory.hits, factory.misses) == (1, 2)
+
+    def test_validators_run_on_cached_path(self):
+        from chromadb.config import Settings
+        from chromadb_py314_compat.settings_compat import SettingsFactory
+        factory = SettingsFactory(Settings)
+        assert factory(chroma_server_nofile="").chroma_server_nofile is None
+        assert factory(chroma_server_nofile="").chroma_server_nofile is None
+
+    def test_environment_change_invalidates(self, monkeypatch):
+        from chromadb.config import Settings
+        from chromadb_py314_compat.settings_compat import SettingsFactory
+        factory = SettingsFactory(Settings)
+        monkeypatch.setenv("CHROMA_SERVER_HOST", "first")
+        assert factory().chroma_server_host == "first"
+        monkeypatch.setenv("CHROMA_SERVER_HOST", "second")
+        assert factory().chroma_server_host == "second"
+
+    def test_instances_are_independent(self):
+        from chromadb.config import Settings
+        from chromadb_py314_compat.settings_compat import SettingsFactory
+        factory = SettingsFactory(Settings)
+        first = factory()
+        first.chroma_server_cors_allow_origins.append("http://example.com")
+        assert factory().chroma_server_cors_allow_origins == []
+
+    def test_validator_wrappers_reused(self):
+        from chromadb_py314_compat.settings_compat import validator
+        assert validator("chroma_server_nofile", pre=True) is validator("chroma_server_nofile", pre=True)
+        assert validator("chroma_server_nofile") is not validator("chroma_server_nofile", pre=True)
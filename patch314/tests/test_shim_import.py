@@ -0,0 +1,103 @@
+"""
+Import-time tests for the chromadb_py314_compat shim.
+
+Importing the shim must stay cheap: it only registers a sys.meta_path hook,
+and pydantic / pydantic-settings are imported when chromadb.config is. Each
+test runs in a fresh interpreter so earlier imports cannot hide the cost.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+PATCH_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative -X importtime budget for the shim package, in microseconds.
+# The eager patch imported pydantic-settings here (~100 ms); the hook is ~1 ms.
+SHIM_IMPORT_BUDGET_US = 15_000
+
+
+def _run(code, *flags):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [PATCH_ROOT, os.environ.get("PYTHONPATH")])))
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        capture_output=True, text=True, env=env, timeout=120, check=True,
+    )
+
+
+FORCED_IMPORT = (
+    "import chromadb_py314_compat as c; "
+    "c._patch_chromadb_config(force=True); "
+)
+
+
+class TestLazyShim:
+    """The hook must defer all pydantic work until chromadb.config is imported."""
+
+    def test_shim_import_does_not_load_pydantic(self):
+        out = _run(
+            FORCED_IMPORT
+            + "import sys, json; "
+            "print(json.dumps(sorted(m for m in sys.modules if m.startswith('pydantic'))))"
+        )
+        assert json.loads(out.stdout) == []
+
+    def test_shim_module_built_on_config_import(self):
+        out = _run(
+            FORCED_IMPORT
+            + "import sys; "
+            "assert 'chromadb._py314_pydantic_shim' not in sys.modules; "
+            "import chromadb.config; "
+            "shim = sys.modules['chromadb._py314_pydantic_shim']; "
+            "import pydantic_settings; "
+            "print(shim.BaseSettings is pydantic_settings.BaseSettings, shim.in_pydantic_v2)"
+        )
+        assert out.stdout.split() == ["True", "True"]
+
+    def test_hook_after_config_already_imported(self):
+        """Importing the shim after chromadb.config still provides the module."""
+        out = _run(
+            "import chromadb.config, sys; "
+            + FORCED_IMPORT
+            + "print('chromadb._py314_pydantic_shim' in sys.modules)"
+        )
+        assert out.stdout.strip() == "True"
+
+    def test_hook_registered_once(self):
+        out = _run(
+            FORCED_IMPORT
+            + "c._patch_chromadb_config(force=True); "
+            "import sys; print(sum(f is c._finder for f in sys.meta_path))"
+        )
+        assert out.stdout.strip() == "1"
+
+
+class TestStartupOverhead:
+    """Regression guard for interpreter startup cost of the shim."""
+
+    def test_shim_import_time_budget(self):
+        samples = []
+        for _ in range(3):
+            out = _run(FORCED_IMPORT, "-X", "importtime")
+            for line in out.stderr.splitlines():
+                parts = [p.strip() for p in line.split("|")]
+                if len(parts) == 3 and parts[2] == "chromadb_py314_compat":
+                    samples.append(int(parts[1]))
+        assert samples, "chromadb_py314_compat missing from -X importtime output"
+        assert min(samples) < SHIM_IMPORT_BUDGET_US, (
+            f"shim import took {min(samples)} us (budget {SHIM_IMPORT_BUDGET_US} us)"
+        )
+
+    @pytest.mark.skipif(
+        sys.version_info < (3, 14),
+        reason="The hook is only auto-installed on Python 3.14+"
+    )
+    def test_auto_install_on_314(self):
+        out = _run(
+            "import sys, chromadb_py314_compat as c; "
+            "print(c._finder in sys.meta_path, any(m.startswith('pydantic') for m in sys.modules))"
+        )
+        assert out.stdout.split() == ["True", "False"]
@@ -0,0 +1,178 @@
+"""
+spip_artifacts.py - Artifact download and SHA256 verification for spip
+Picks the distribution file pip would install on this platform (best
+compatible wheel, else the sdist), downloads it in parallel with other
+packages' files while hashing the stream, and compares the result with the
+digest PyPI published. Verified files are kept in a content-addressed cache
+so later checks of the same release skip the download.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Sequence, Tuple
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen
+
+from spip_metrics import RunMetrics, metered_urlopen
+
+try:
+    from packaging.tags import sys_tags
+    from packaging.utils import InvalidWheelFilename, parse_wheel_filename
+except ImportError:  # pip always vendors packaging
+    from pip._vendor.packaging.tags import sys_tags
+    from pip._vendor.packaging.utils import InvalidWheelFilename, parse_wheel_filename
+
+DEFAULT_ARTIFACT_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "spip", "artifacts")
+
+CHUNK_SIZE = 1 << 20  # bytes held in memory per download
+SDIST_SUFFIXES = (".tar.gz", ".zip", ".tar.bz2", ".tgz")
+
+# Verification outcomes
+VERIFIED = "verified"
+CACHED = "cached"
+MISMATCH = "mismatch"
+NO_DIGEST = "no-digest"
+FAILED = "error"
+
+
+class ArtifactResult:
+    """Outcome of verifying one distribution file."""
+
+    __slots__ = ("package", "filename", "status", "expected", "actual", "size", "seconds", "error")
+
+    def __init__(self, package: str, filename: str, status: str, expected: Optional[str] = None,
+                 actual: Optional[str] = None, size: int = 0, seconds: float = 0.0, error: str = ""):
+        self.package = package
+        self.filename = filename
+        self.status = status
+        self.expected = expected
+        self.actual = actual
+        self.size = size
+        self.seconds = seconds
+        self.error = error
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def select_artifact(files: Sequence[Tuple[str, Optional[str], Optional[str]]], tags=None) -> Optional[tuple]:
+    """The (filename, sha256, url) pip would pick: the wheel matching the
+    highest-priority tag of `tags` (default: this interpreter), else an sdist."""
+    priority = {tag: i for i, tag in enumerate(sys_tags() if tags is None else tags)}
+    best, best_rank, sdist = None, None, None
+    for entry in files:
+        filename = entry[0] or ""
+        if filename.endswith(".whl"):
+            try:
+                _name, _ver, _build, wheel_tags = parse_wheel_filename(filename)
+            except InvalidWheelFilename:
+                continue
+            rank = min((priority[t] for t in wheel_tags if t in priority), default=None)
+            if rank is not None and (best_rank is None or rank < best_rank):
+                best, best_rank = entry, rank
+        elif sdist is None and filename.endswith(SDIST_SUFFIXES):
+            sdist = entry
+    return best or sdist
+
+
+class ArtifactCache:
+    """Files stored by SHA256 under <root>/sha256/<ab>/<digest>."""
+
+    def __init__(self, root: str = DEFAULT_ARTIFACT_CACHE):
+        self.root = root
+
+    def path(self, sha256: str) -> str:
+        sha256 = sha256.lower()
+        return os.path.join(self.root, "sha256", sha256[:2], sha256)
+
+    def __contains__(self, sha256: str) -> bool:
+        return os.path.isfile(self.path(sha256))
+
+    def staging_dir(self) -> str:
+        # temp files live in the cache so the final os.replace never crosses filesystems
+        tmp = os.path.join(self.root, "tmp")
+        os.makedirs(tmp, exist_ok=True)
+        return tmp
+
+    def commit(self, tmp_path: str, sha256: str) -> str:
+        final = self.path(sha256)
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        os.replace(tmp_path, final)
+        return final
+
+
+def verify_artifact(package: str, filename: str, expected: Optional[str], url: Optional[str],
+                    cache: ArtifactCache, metrics: Optional[RunMetrics] = None, timeout: float = 30,
+                    deadline: Optional[float] = None) -> ArtifactResult:
+    """Download `url` hashing it as it streams; only a matching file is cached."""
+    if not expected:
+        return ArtifactResult(package, filename, NO_DIGEST)
+    expected = expected.lower()
+    if expected in cache:
+        if metrics is not None:
+            metrics.record_cache("artifacts", True)
+        return ArtifactResult(package, filename, CACHED, expected, expected, os.path.getsize(cache.path(expected)))
+    if metrics is not None:
+        metrics.record_cache("artifacts", False)
+    if not url:
+        return ArtifactResult(package, filename, FAILED, expected, error="no download URL")
+
+    started = time.perf_counter()
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=cache.staging_dir(), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            resp = metered_urlopen(url, metrics, timeout) if metrics is not None else urlopen(url, timeout=timeout)
+            with resp:
+                while True:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise TimeoutError("deadline reached")
+                    chunk = resp.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+        actual = digest.hexdigest()
+        elapsed = time.perf_counter() - started
+        if actual != expected:
+            return ArtifactResult(package, filename, MISMATCH, expected, actual, size, elapsed)
+        cache.commit(tmp_path, actual)
+        tmp_path = None
+        return ArtifactResult(package, filename, VERIFIED, expected, actual, size, elapsed)
+    except (HTTPError, URLError, OSError) as e:
+        return ArtifactResult(package, filename, FAILED, expected, size=size,
+                              seconds=time.perf_counter() - started, error=str(e))
+    finally:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def verify_artifacts(items: Iterable[Tuple[str, tuple]], cache: Optional[ArtifactCache] = None, workers: int = 8,
+                     metrics: Optional[RunMetrics] = None, tags=None, url_base: Optional[str] = None,
+                     deadline: Optional[float] = None) -> List[ArtifactResult]:
+    """Verify the selected artifact of each (package, files) pair in parallel.
+
+    `url_base` replaces the file host (files are then fetched from
+    `<url_base>/files/<filename>`), e.g. to test against spip_fakepypi.
+    """
+    cache = cache or ArtifactCache()
+    jobs = []
+    for package, files in items:
+        chosen = select_artifact(files, tags)
+        if chosen is None:
+            continue
+        filename, sha256, url = chosen
+        if url_base:
+            url = f"{url_base.rstrip('/')}/files/{filename}"
+        jobs.append((package, filename, sha256, url))
+    if not jobs:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs))), thread_name_prefix="spip-artifact") as pool:
+        futures = [pool.submit(verify_artifact, pkg, fn, sha, url, cache, metrics, deadline=deadline)
+                   for pkg, fn, sha, url in jobs]
+        return [fut.result() for fut in futures]
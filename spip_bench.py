@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+spip_bench.py - Offline benchmark harness for spip_checker
+Starts a spip_fakepypi server over a recorded fixtures directory, points
+spip_checker at it and times analyze_package and build_dependency_tree at
+several simulated latencies. Results are printed (or written) as JSON so runs
+before and after a change can be compared.
+
+Usage:
+    python spip_fakepypi.py record chromadb --out bench/fixtures
+    python spip_bench.py bench/fixtures chromadb --latency 0 20 100 --repeat 3 -o results.json
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Optional
+
+import spip_checker
+from spip_fakepypi import FakePyPIServer
+from spip_vulndb import VulnerabilityDB
+
+
+def _summarize(samples: list) -> dict:
+    return {
+        "median_s": round(statistics.median(samples), 4),
+        "min_s": round(min(samples), 4),
+        "max_s": round(max(samples), 4),
+        "samples": [round(s, 4) for s in samples],
+    }
+
+
+def bench_analyze(package: str, repeat: int, vulndb: Optional[VulnerabilityDB] = None) -> dict:
+    """Time analyze_package without the dependency walk (benchmarked separately).
+
+    The vulnerability stage is only included with a local vulndb, since
+    pip-audit would go to the real network.
+    """
+    stages = [s for s in spip_checker.default_stages(vulndb=vulndb)
+              if s.name != "vulnerabilities" or vulndb is not None]
+    samples, report = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        report = spip_checker.analyze_package(package, stages=stages, vulndb=vulndb, quiet=True)
+        samples.append(time.perf_counter() - start)
+    result = _summarize(samples)
+    result["exists"] = report.exists
+    result["risk_score"] = report.risk_score
+    result["stage_timings"] = {k: (None if v is None else round(v, 4)) for k, v in report.stage_timings.items()}
+    return result
+
+
+def bench_tree(package: str, repeat: int, max_depth: int) -> dict:
+    samples, graph = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        graph = spip_checker.build_dependency_tree(package, max_depth=max_depth)
+        samples.append(time.perf_counter() - start)
+    result = _summarize(samples)
+    result["nodes"] = len(graph)
+    result["edges"] = graph.edge_count
+    result["max_depth_reached"] = max((node.depth for node in graph.nodes), default=0)
+    return result
+
+
+def run(fixtures: str, packages: list, latencies: list, jitter: float = 0.0, error_rate: float = 0.0,
+        repeat: int = 3, max_depth: int = 4, vulndb: Optional[VulnerabilityDB] = None,
+        seed: int = 0, skip_tree: bool = False) -> dict:
+    """Benchmark every package at every latency (milliseconds)."""
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "fixtures": fixtures,
+        "repeat": repeat,
+        "max_depth": max_depth,
+        "jitter_ms": jitter,
+        "error_rate": error_rate,
+        "runs": [],
+    }
+    saved = (spip_checker.PYPI_URL, spip_checker.PYPISTATS_URL)
+    try:
+        for latency in latencies:
+            with FakePyPIServer(fixtures, latency / 1000, jitter / 1000, error_rate, seed=seed) as server:
+                spip_checker.PYPI_URL = spip_checker.PYPISTATS_URL = server.url
+                for package in packages:
+                    run_result = {"package": package, "latency_ms": latency}
+                    before = server.stats["requests"]
+                    run_result["analyze"] = bench_analyze(package, repeat, vulndb)
+                    run_result["analyze"]["requests"] = (server.stats["requests"] - before) // repeat
+                    if not skip_tree:
+                        before = server.stats["requests"]
+                        run_result["tree"] = bench_tree(package, repeat, max_depth)
+                        run_result["tree"]["requests"] = (server.stats["requests"] - before) // repeat
+                    results["runs"].append(run_result)
+                    print(f"{package} @ {latency:g}ms: analyze {run_result['analyze']['median_s']:.3f}s"
+                          + ("" if skip_tree else
+                             f", tree {run_result['tree']['median_s']:.3f}s ({run_result['tree']['nodes']} nodes)"),
+                          file=sys.stderr)
+                results.setdefault("server", []).append(dict(server.stats, latency_ms=latency))
+    finally:
+        spip_checker.PYPI_URL, spip_checker.PYPISTATS_URL = saved
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark spip_checker against a fake PyPI server")
+    parser.add_argument("fixtures", help="Fixtures directory (see spip_fakepypi.py record)")
+    parser.add_argument("packages", nargs="+", help="Root packages to benchmark")
+    parser.add_argument("--latency", type=float, nargs="+", default=[0.0, 20.0, 100.0],
+                        help="Simulated per-request latencies in ms (default: 0 20 100)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Latency jitter (+/-) in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 503")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (default: 3)")
+    parser.add_argument("--max-depth", type=int, default=4, help="Dependency tree depth (default: 4)")
+    parser.add_argument("--vulndb", metavar="PATH", help="Include the vulnerability stage using a local OSV dump")
+    parser.add_argument("--no-tree", action="store_true", help="Skip the build_dependency_tree benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for jitter and error injection")
+    parser.add_argument("-o", "--output", help="Write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    vulndb = VulnerabilityDB(args.vulndb) if args.vulndb else None
+    results = run(args.fixtures, args.packages, args.latency, args.jitter, args.error_rate,
+                  args.repeat, args.max_depth, vulndb, args.seed, args.no_tree)
+    payload = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(payload + "\n")
+    else:
+        print(payload)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
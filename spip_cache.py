@@ -0,0 +1,96 @@
+"""
+spip_cache.py - Persistent SecurityReport cache for spip
+Stores serialized reports keyed by (package, resolved version, rules key) in
+SQLite, with an expiry that depends on the report's risk level so risky
+verdicts are re-checked sooner.
+"""
+
+import os
+import sqlite3
+import time
+from typing import Optional, Tuple
+
+from spip_mirror import normalize_name
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "spip", "reports.sqlite3")
+
+# Seconds a verdict stays valid, by risk band (same bands as print_report)
+TTL_LOW = 24 * 3600
+TTL_MEDIUM = 6 * 3600
+TTL_HIGH = 3600
+# How long "latest version of X is Y" is trusted for unpinned requests
+LATEST_TTL = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    rules TEXT NOT NULL,
+    created REAL NOT NULL,
+    expires REAL NOT NULL,
+    risk_score INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (name, version, rules)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS latest (
+    name TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    expires REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def ttl_for_risk(risk_score: int) -> int:
+    if risk_score <= 20:
+        return TTL_LOW
+    if risk_score <= 50:
+        return TTL_MEDIUM
+    return TTL_HIGH
+
+
+class ReportCache:
+    """(package, version, rules) -> serialized report, with risk-based expiry."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=5)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def resolve(self, package: str) -> Optional[str]:
+        """Recently resolved latest version of `package`, if still fresh."""
+        row = self.conn.execute(
+            "SELECT version FROM latest WHERE name = ? AND expires > ?",
+            (normalize_name(package), time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def get(self, package: str, version: str, rules: str) -> Optional[Tuple[str, float, float]]:
+        """Return (payload, created, expires) for a fresh entry, else None."""
+        row = self.conn.execute(
+            "SELECT payload, created, expires FROM reports "
+            "WHERE name = ? AND version = ? AND rules = ? AND expires > ?",
+            (normalize_name(package), version, rules, time.time()),
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def put(self, package: str, version: str, rules: str, risk_score: int, payload: str, pinned: bool = False):
+        """Store a report; unpinned lookups also refresh the latest-version pointer."""
+        now = time.time()
+        name = normalize_name(package)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO reports (name, version, rules, created, expires, risk_score, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, version, rules, now, now + ttl_for_risk(risk_score), risk_score, payload),
+            )
+            if not pinned:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO latest (name, version, expires) VALUES (?, ?, ?)",
+                    (name, version, now + LATEST_TTL),
+                )
+            self.conn.execute("DELETE FROM reports WHERE expires <= ?", (now,))
@@ -5,17 +5,52 @@ Performs comprehensive security analysis before pip install
 """
 
 import argparse
+import copy
+import hashlib
+import importlib.metadata
 import json
+import os
 import subprocess
 import sys
-from dataclasses import dataclass, field
+import threading
+from dataclasses import dataclass, field, fields
 from datetime import datetime, timezone
 from difflib import SequenceMatcher
 import re
-from typing import Optional, Dict, Set
+from typing import Any, Callable, Optional, Set
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from functools import lru_cache
 from urllib.error import HTTPError, URLError
-from urllib.request import urlopen
+
+from spip_artifacts import DEFAULT_ARTIFACT_CACHE, FAILED, MISMATCH, ArtifactCache, verify_artifacts
+from spip_cache import DEFAULT_CACHE_PATH, ReportCache
+from spip_graph import DependencyGraph
+from spip_metrics import RunMetrics, metered_urlopen
+from spip_mirror import DEFAULT_MIRROR_PATH, MirrorDB, normalize_name
+from spip_pypijson import ReleaseSummary, parse_release_summary
+from spip_vulndb import VulnerabilityDB
+
+try:
+    from packaging.markers import default_environment
+    from packaging.requirements import InvalidRequirement, Requirement
+except ImportError:  # pip always vendors packaging
+    from pip._vendor.packaging.markers import default_environment
+    from pip._vendor.packaging.requirements import InvalidRequirement, Requirement
+
+# API endpoints; overridable so checks can run against a mirror or a local fake server
+PYPI_URL = os.environ.get("SPIP_PYPI_URL", "https://pypi.org").rstrip("/")
+PYPISTATS_URL = os.environ.get("SPIP_PYPISTATS_URL", "https://pypistats.org").rstrip("/")
+# Unset: download artifacts from the URLs PyPI lists; set: from <FILES_URL>/files/<filename>
+FILES_URL = os.environ.get("SPIP_FILES_URL")
+
+# Requests, cache hits, graph shape and stage times for this run (--stats)
+METRICS = RunMetrics()
+
+# Bump whenever scoring or checks change so cached verdicts are not reused
+RULES_VERSION = 2
 
 # Popular packages for typosquatting detection
 POPULAR_PACKAGES = [
@@ -54,13 +89,39 @@ class SecurityReport:
     warnings: list = field(default_factory=list)
     errors: list = field(default_factory=list)
     risk_score: int = 0  # 0-100, higher = more risky
-    dependency_tree: dict = field(default_factory=dict)
+    dependency_tree: Optional[DependencyGraph] = None
+    stage_timings: dict = field(default_factory=dict)  # stage name -> seconds (None if abandoned)
+    skipped_stages: list = field(default_factory=list)  # stages that failed or timed out
+    artifact_results: list = field(default_factory=list)  # ArtifactResult.to_dict() per verified file
+    lookup_failed: bool = False  # the PyPI lookup errored or timed out (exists=False is then no verdict)
 
-def fetch_pypi_info(package: str) -> Optional[dict]:
-    """Fetch package info from PyPI JSON API."""
-    url = f"https://pypi.org/pypi/{package}/json"
+def report_to_json(report: SecurityReport) -> str:
+    """Serialize a report (dates as ISO strings, graph via DependencyGraph.to_dict)."""
+    data = {f.name: getattr(report, f.name) for f in fields(report)}
+    for key in ("first_release_date", "version_release_date"):
+        data[key] = data[key].isoformat() if data[key] else None
+    data["dependency_tree"] = report.dependency_tree.to_dict() if report.dependency_tree else None
+    return json.dumps(data)
+
+def report_from_json(payload: str) -> SecurityReport:
+    data = json.loads(payload)
+    known = {f.name for f in fields(SecurityReport)}
+    data = {k: v for k, v in data.items() if k in known}
+    for key in ("first_release_date", "version_release_date"):
+        if data.get(key):
+            data[key] = datetime.fromisoformat(data[key])
+    data["similar_packages"] = [tuple(item) for item in data.get("similar_packages", [])]
+    if data.get("dependency_tree"):
+        data["dependency_tree"] = DependencyGraph.from_dict(data["dependency_tree"])
+    return SecurityReport(**data)
+
+def fetch_pypi_info(package: str, mirror: Optional[MirrorDB] = None) -> Optional[dict]:
+    """Fetch package info from PyPI JSON API (or the offline mirror)."""
+    if mirror is not None:
+        return mirror.fetch_pypi_info(package)
+    url = f"{PYPI_URL}/pypi/{package}/json"
     try:
-        with urlopen(url, timeout=10) as resp:
+        with metered_urlopen(url, METRICS) as resp:
             return json.loads(resp.read().decode())
     except HTTPError as e:
         if e.code == 404:
@@ -69,11 +130,50 @@ def fetch_pypi_info(package: str) -> Optional[dict]:
     except URLError:
         return None
 
-def fetch_download_stats(package: str) -> int:
-    """Fetch download stats from PyPI Stats API."""
-    url = f"https://pypistats.org/api/packages/{package}/recent"
+def fetch_release_summary(package: str, mirror: Optional[MirrorDB] = None, version: Optional[str] = None) -> Optional[ReleaseSummary]:
+    """Fetch the compact release summary, parsing the PyPI JSON as it streams in.
+
+    None means PyPI has no such project; network errors propagate, so a
+    failed lookup is not mistaken for a missing package.
+    """
+    if mirror is not None:
+        return mirror.fetch_release_summary(package, version)
+    url = f"{PYPI_URL}/pypi/{package}/json"
+    try:
+        with metered_urlopen(url, METRICS) as resp:
+            return parse_release_summary(resp, version)
+    except HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+
+def fetch_release_requires(package: str, version: str, mirror: Optional[MirrorDB] = None) -> Optional[tuple]:
+    """requires_dist of one release, or None when it is not known.
+
+    The project document's "info" describes the current release only (and
+    it is all the mirror keeps); other releases need PyPI's per-release
+    document.
+    """
+    if mirror is not None:
+        current = mirror.fetch_release_summary(package)
+        return current.requires_dist if current is not None and current.version == version else None
+    url = f"{PYPI_URL}/pypi/{package}/{version}/json"
     try:
-        with urlopen(url, timeout=10) as resp:
+        with metered_urlopen(url, METRICS) as resp:
+            info = json.loads(resp.read().decode()).get("info") or {}
+    except HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+    return tuple(info.get("requires_dist") or ())
+
+def fetch_download_stats(package: str, mirror: Optional[MirrorDB] = None) -> int:
+    """Fetch download stats from PyPI Stats API (or the offline mirror)."""
+    if mirror is not None:
+        return mirror.fetch_download_stats(package)
+    url = f"{PYPISTATS_URL}/api/packages/{package}/recent"
+    try:
+        with metered_urlopen(url, METRICS) as resp:
             data = json.loads(resp.read().decode())
             return data.get("data", {}).get("last_month", 0)
     except (HTTPError, URLError, json.JSONDecodeError):
@@ -93,117 +193,344 @@ def check_typosquatting(package: str, threshold: float = 0.85) -> list:
     
     return sorted(similar, key=lambda x: x[1], reverse=True)
 
-def check_vulnerabilities(package: str) -> list:
-    """Check for known vulnerabilities using pip-audit if available."""
-    vulns = []
+class PipAuditError(RuntimeError):
+    pass
+
+def _describe_pip_audit_vuln(vuln: dict) -> str:
+    # same shape as Advisory.describe() for the --vulndb path
+    text = vuln.get("id") or "unknown"
+    cves = [a for a in vuln.get("aliases") or () if a.startswith("CVE-")]
+    if cves:
+        text += f" ({', '.join(cves)})"
+    if vuln.get("fix_versions"):
+        text += f" [fixed in {', '.join(vuln['fix_versions'])}]"
+    return text
+
+def run_pip_audit(pins: dict, timeout: float = 60) -> Optional[dict]:
+    """Audit `pins` (name -> version, or None for the latest release) in one pip-audit run.
+
+    Returns normalized name -> vulnerability descriptions, or None when
+    pip-audit is not installed; raises PipAuditError when it times out or
+    gives no usable report.
+    """
+    requirements = "".join(f"{name}=={version}\n" if version else f"{name}\n" for name, version in pins.items())
+    cmd = ["pip-audit", "--format", "json", "-r", "/dev/stdin"]
+    if all(pins.values()):
+        # exact pins of what is installed: no resolver, no throwaway venv
+        cmd += ["--no-deps", "--disable-pip"]
+    started = time.perf_counter()
     try:
-        result = subprocess.run(
-            ["pip-audit", "--require-hashes=false", "-r", "/dev/stdin"],
-            input=f"{package}\n",
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-        if result.returncode != 0 and "vulnerability" in result.stdout.lower():
-            for line in result.stdout.split("\n"):
-                if package.lower() in line.lower() and "vulnerability" in line.lower():
-                    vulns.append(line.strip())
-    except (FileNotFoundError, subprocess.TimeoutExpired):
-        pass  # pip-audit not installed or timed out
-    return vulns
-
-def analyze_package(package: str, min_downloads: int = 1000, min_age_days: int = 30, check_deps: bool = False, progress: bool = False, debug: bool = False) -> SecurityReport:
-    """Perform comprehensive security analysis on a package."""
+        result = subprocess.run(cmd, input=requirements, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        METRICS.record_request("pip-audit", 0, time.perf_counter() - started, ok=False)
+        raise PipAuditError(f"pip-audit timed out after {timeout:.0f}s")
+    except FileNotFoundError:
+        return None  # pip-audit not installed
+    METRICS.record_request("pip-audit", len(result.stdout), time.perf_counter() - started)
+    try:
+        data = json.loads(result.stdout)
+    except json.JSONDecodeError:
+        raise PipAuditError(f"pip-audit failed: {(result.stderr.strip().splitlines() or ['no output'])[-1]}")
+    # pip-audit >= 2 wraps the list in {"dependencies": [...], "fixes": [...]}
+    dependencies = data.get("dependencies", []) if isinstance(data, dict) else data
+    return {normalize_name(dep.get("name", "")): [_describe_pip_audit_vuln(v) for v in dep.get("vulns") or ()]
+            for dep in dependencies}
+
+def check_vulnerabilities(package: str, version: Optional[str] = None, vulndb: Optional[VulnerabilityDB] = None, timeout: float = 60) -> list:
+    """Check for known vulnerabilities in the local OSV database, or with pip-audit if available."""
+    if vulndb is not None and version:
+        return [adv.describe() for adv in vulndb.affected(package, version)]
+    try:
+        found = run_pip_audit({package: version}, timeout)
+    except PipAuditError:
+        return []
+    return (found or {}).get(normalize_name(package), [])
+
+# Per-stage timeouts (seconds) and the overall latency budget for analyze_package
+INFO_TIMEOUT = 15.0
+STAGE_TIMEOUTS = {
+    "downloads": 15.0,
+    "typosquatting": 5.0,
+    "vulnerabilities": 70.0,
+    "dependencies": 300.0,
+    "artifacts": 120.0,
+}
+DEFAULT_BUDGET = 360.0
+
+@dataclass
+class CheckStage:
+    """A pluggable analysis step run concurrently by analyze_package.
+
+    `run(package, summary)` does the slow work on a worker thread and returns
+    a value; `apply(report, value)` merges it on the calling thread, so a
+    stage that times out can never write into the report late. `apply` is
+    called with None when the stage failed or timed out.
+    """
+    name: str
+    label: str
+    run: Callable[[str, Optional[ReleaseSummary]], Any]
+    apply: Callable[[SecurityReport, Any], None]
+    timeout: float = 30.0
+    needs_info: bool = True  # wait for the PyPI info (version) before starting
+
+def _apply_downloads(report: SecurityReport, value):
+    report.downloads_last_month = -1 if value is None else value
+
+def _apply_similar(report: SecurityReport, value):
+    report.similar_packages = value or []
+
+def _apply_vulnerabilities(report: SecurityReport, value):
+    report.vulnerabilities = value or []
+
+def _apply_dependencies(report: SecurityReport, tree):
+    if tree is None:
+        return
+    report.dependency_tree = tree
+    missing_hashes = tree.missing_hashes()
+    if missing_hashes:
+        report.warnings.append(f"{missing_hashes} distribution files missing SHA256 digests")
+        report.risk_score += 10
+    for cycle in tree.find_cycles():
+        report.warnings.append(f"Dependency cycle: {' -> '.join(cycle + cycle[:1])}")
+
+def _apply_artifacts(report: SecurityReport, results):
+    if not results:
+        return
+    report.artifact_results = [r.to_dict() for r in results]
+    mismatched = [r for r in results if r.status == MISMATCH]
+    for r in mismatched:
+        report.warnings.append(f"SHA256 mismatch for {r.filename} ({r.package}): expected {r.expected[:12]}..., got {r.actual[:12]}...")
+    if mismatched:
+        # a file that differs from its published digest is reason enough to stop
+        report.risk_score += 60
+    failed = [r for r in results if r.status == FAILED]
+    if failed:
+        report.warnings.append(f"{len(failed)} artifacts could not be downloaded for verification")
+
+def _apply_dependencies_and_artifacts(report: SecurityReport, value):
+    tree, results = value if value is not None else (None, None)
+    _apply_dependencies(report, tree)
+    _apply_artifacts(report, results)
+
+def _pinned_root(package: str, summary: ReleaseSummary, mirror: Optional[MirrorDB]) -> ReleaseSummary:
+    """`summary` (already fetched for the pinned version) with that release's own requirements."""
+    requires = fetch_release_requires(package, summary.version, mirror)
+    if requires is None:
+        source = "the offline mirror" if mirror is not None else "PyPI"
+        raise LookupError(f"requirements of {package} {summary.version} not found in {source}")
+    root = copy.copy(summary)
+    root.requires_dist = requires
+    return root
+
+def _tree_with_artifacts(package: str, limit: float, progress: bool, debug: bool, mirror: Optional[MirrorDB], artifact_cache: ArtifactCache, extras: tuple, environment: Optional[dict], root: Optional[ReleaseSummary] = None) -> tuple:
+    deadline = time.monotonic() + limit
+    tree = build_dependency_tree(package, progress=progress, debug=debug, mirror=mirror, deadline=deadline,
+                                 extras=extras, environment=environment, root=root)
+    results = verify_artifacts(((node.name, node.files) for node in tree.nodes), artifact_cache,
+                               metrics=METRICS, url_base=FILES_URL, deadline=deadline)
+    return tree, results
+
+def default_stages(check_deps: bool = False, progress: bool = False, debug: bool = False, mirror: Optional[MirrorDB] = None, vulndb: Optional[VulnerabilityDB] = None, timeouts: Optional[dict] = None, verify: bool = False, artifact_cache: Optional[ArtifactCache] = None, extras: tuple = (), environment: Optional[dict] = None, version: Optional[str] = None) -> list:
+    """The standard checks; `timeouts` overrides entries of STAGE_TIMEOUTS.
+
+    `verify` downloads the artifact pip would install and checks its SHA256:
+    for every package in the tree with `check_deps`, else for the package
+    itself. `extras` and `environment` select which requirements the
+    dependency walk follows (see build_dependency_tree). With a pinned
+    `version` the walk starts from that release's requirements and files,
+    so it waits for the PyPI info instead of starting right away.
+    """
+    limits = dict(STAGE_TIMEOUTS, **(timeouts or {}))
+    pinned = version is not None
+
+    def _root(pkg, s):
+        return _pinned_root(pkg, s, mirror) if pinned else None
+
+    artifact_cache = artifact_cache or ArtifactCache()
+    stages = [
+        CheckStage("downloads", "Checking download statistics",
+                   lambda pkg, _s: fetch_download_stats(pkg, mirror=mirror),
+                   _apply_downloads, limits["downloads"], needs_info=False),
+        CheckStage("typosquatting", "Checking for similar package names",
+                   lambda pkg, _s: check_typosquatting(pkg),
+                   _apply_similar, limits["typosquatting"], needs_info=False),
+    ]
+    if vulndb is not None or mirror is None:
+        stages.append(CheckStage("vulnerabilities", "Scanning for known vulnerabilities",
+                                 lambda pkg, s: check_vulnerabilities(pkg, s.version, vulndb=vulndb,
+                                                                      timeout=limits["vulnerabilities"]),
+                                 _apply_vulnerabilities, limits["vulnerabilities"]))
+    if check_deps and verify:
+        stages.append(CheckStage("dependencies", "Building dependency tree and downloading artifacts",
+                                 lambda pkg, s: _tree_with_artifacts(pkg, limits["dependencies"] + limits["artifacts"],
+                                                                     progress, debug, mirror, artifact_cache,
+                                                                     extras, environment, _root(pkg, s)),
+                                 _apply_dependencies_and_artifacts, limits["dependencies"] + limits["artifacts"],
+                                 needs_info=pinned))
+    elif check_deps:
+        stages.append(CheckStage("dependencies", "Building dependency tree and verifying file hashes",
+                                 # the walk stops by itself at the deadline instead of running on in the background
+                                 lambda pkg, s: build_dependency_tree(pkg, progress=progress, debug=debug, mirror=mirror,
+                                                                      deadline=time.monotonic() + limits["dependencies"],
+                                                                      extras=extras, environment=environment,
+                                                                      root=_root(pkg, s)),
+                                 _apply_dependencies, limits["dependencies"], needs_info=pinned))
+    elif verify:
+        stages.append(CheckStage("artifacts", "Downloading and verifying artifacts",
+                                 lambda pkg, s: verify_artifacts([(pkg, s.files)], artifact_cache, metrics=METRICS,
+                                                                 url_base=FILES_URL,
+                                                                 deadline=time.monotonic() + limits["artifacts"]),
+                                 _apply_artifacts, limits["artifacts"]))
+    return stages
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    value = func(*args)
+    return value, time.perf_counter() - start
+
+def _start_timed(func, *args) -> Future:
+    """Run `_timed(func, *args)` on a daemon thread.
+
+    ThreadPoolExecutor workers are joined at interpreter exit, so a stage
+    abandoned at its deadline would still hold the process open until it
+    finished; a daemon thread is simply dropped when spip exits.
+    """
+    future = Future()
+
+    def _run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(_timed(func, *args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=_run, name="spip-stage", daemon=True).start()
+    return future
+
+def _collect_stages(report: SecurityReport, pending: dict, deadline: float, step: int, total_steps: int, log=print):
+    """Wait for stage futures, applying results as they land.
+
+    A stage is abandoned when its own timeout or the overall deadline passes;
+    either way the report records why in `warnings`.
+    """
+    while pending:
+        now = time.monotonic()
+        if now >= deadline:
+            for fut, (stage, _started) in pending.items():
+                fut.cancel()
+                stage.apply(report, None)
+                report.stage_timings[stage.name] = None
+                report.skipped_stages.append(stage.name)
+                report.warnings.append(f"{stage.label} skipped: latency budget exhausted")
+            pending.clear()
+            return
+        next_expiry = min(started + stage.timeout for stage, started in pending.values())
+        done, _ = wait(list(pending), timeout=max(0.0, min(next_expiry, deadline) - now), return_when=FIRST_COMPLETED)
+        for fut in done:
+            stage, started = pending.pop(fut)
+            step += 1
+            try:
+                value, elapsed = fut.result()
+            except Exception as e:
+                report.stage_timings[stage.name] = time.monotonic() - started
+                stage.apply(report, None)
+                report.skipped_stages.append(stage.name)
+                report.warnings.append(f"{stage.label} failed: {e}")
+                log(f"{Colors.YELLOW}[{step}/{total_steps}] {stage.label}... failed{Colors.NC}")
+                continue
+            report.stage_timings[stage.name] = elapsed
+            stage.apply(report, value)
+            log(f"{Colors.CYAN}[{step}/{total_steps}] {stage.label}... {elapsed:.2f}s{Colors.NC}")
+        now = time.monotonic()
+        for fut, (stage, started) in list(pending.items()):
+            if now >= started + stage.timeout:
+                del pending[fut]
+                fut.cancel()
+                step += 1
+                report.stage_timings[stage.name] = None
+                stage.apply(report, None)
+                report.skipped_stages.append(stage.name)
+                report.warnings.append(f"{stage.label} timed out after {stage.timeout:.0f}s")
+                log(f"{Colors.YELLOW}[{step}/{total_steps}] {stage.label}... timed out{Colors.NC}")
+
+def analyze_package(package: str, min_downloads: int = 1000, min_age_days: int = 30, check_deps: bool = False, progress: bool = False, debug: bool = False, mirror: Optional[MirrorDB] = None, vulndb: Optional[VulnerabilityDB] = None, budget: float = DEFAULT_BUDGET, stages: Optional[list] = None, version: Optional[str] = None, quiet: bool = False) -> SecurityReport:
+    """Perform comprehensive security analysis on a package.
+
+    The PyPI info lookup and every check stage run concurrently; stages that
+    need the resolved version start as soon as the info arrives. A typical
+    check therefore takes about as long as its slowest stage. `version`
+    analyzes a specific release instead of the current one; `quiet`
+    suppresses the step-by-step progress lines.
+    """
     report = SecurityReport(package=package)
+    log = (lambda _msg: None) if quiet else print
+    if stages is None:
+        stages = default_stages(check_deps, progress, debug, mirror, vulndb, version=version)
     
-    total_steps = 6 if check_deps else 5
-    
-    # Fetch PyPI info
-    print(f"{Colors.CYAN}[1/{total_steps}] Fetching package info from PyPI...{Colors.NC}")
-    pypi_data = fetch_pypi_info(package)
-    
-    if not pypi_data:
-        report.exists = False
-        report.errors.append(f"Package '{package}' not found on PyPI")
-        report.risk_score = 100
-        return report
-    
-    report.exists = True
-    info = pypi_data.get("info", {})
-    report.version = info.get("version", "unknown")
-    report.author = info.get("author", "unknown")
-    report.maintainer_email = info.get("maintainer_email") or info.get("author_email", "unknown")
-    report.home_page = info.get("home_page") or info.get("project_url", "")
-    
-    # Parse release dates
-    releases = pypi_data.get("releases", {})
-    if releases:
-        dates = []
-        for ver, files in releases.items():
-            for f in files:
-                if "upload_time" in f:
-                    try:
-                        dt = datetime.fromisoformat(f["upload_time"].replace("Z", "+00:00"))
-                        dates.append(dt)
-                    except ValueError:
-                        pass
-        if dates:
-            first_release = min(dates)
-            # ensure the datetime is timezone-aware so subtraction with
-            # `datetime.now(timezone.utc)` doesn't raise a TypeError
-            if first_release.tzinfo is None:
-                first_release = first_release.replace(tzinfo=timezone.utc)
+    total_steps = len(stages) + 2
+    started = time.monotonic()
+    deadline = started + budget
+    pending = {}
+    try:
+        # Fetch PyPI info
+        log(f"{Colors.CYAN}[1/{total_steps}] Fetching package info from PyPI...{Colors.NC}")
+        info_future = _start_timed(fetch_release_summary, package, mirror, version)
+        for stage in stages:
+            if not stage.needs_info:
+                pending[_start_timed(stage.run, package, None)] = (stage, time.monotonic())
+        
+        summary = None
+        try:
+            summary, report.stage_timings["info"] = info_future.result(timeout=max(0.0, min(INFO_TIMEOUT, deadline - time.monotonic())))
+        except FutureTimeout:
+            report.lookup_failed = True
+            report.errors.append(f"PyPI lookup for '{package}' timed out after {INFO_TIMEOUT:.0f}s")
+        except Exception as e:
+            report.lookup_failed = True
+            report.errors.append(f"PyPI lookup for '{package}' failed: {e}")
+        
+        if not summary:
+            for fut in pending:
+                fut.cancel()
+            report.exists = False
+            if not report.errors:
+                report.errors.append(f"Package '{package}' not found on PyPI")
+            report.risk_score = 100
+            return report
+        
+        report.exists = True
+        report.version = summary.version or "unknown"
+        report.author = summary.author if summary.author is not None else "unknown"
+        report.maintainer_email = summary.maintainer_email or "unknown"
+        report.home_page = summary.home_page or ""
+        
+        # Release dates were reduced to min/max upload_time strings while parsing;
+        # both come back as timezone-aware datetimes
+        first_release = summary.first_release_date
+        if first_release:
             report.first_release_date = first_release
             report.age_days = (datetime.now(timezone.utc) - first_release).days
-        # determine release date for the current package version (if available)
-        version_dates = []
-        for f in releases.get(report.version, []):
-            if "upload_time" in f:
-                try:
-                    dt = datetime.fromisoformat(f["upload_time"].replace("Z", "+00:00"))
-                    version_dates.append(dt)
-                except ValueError:
-                    pass
-        if version_dates:
-            ver_dt = max(version_dates)
-            if ver_dt.tzinfo is None:
-                ver_dt = ver_dt.replace(tzinfo=timezone.utc)
-            report.version_release_date = ver_dt
-    
-    # Fetch download stats
-    print(f"{Colors.CYAN}[2/{total_steps}] Checking download statistics...{Colors.NC}")
-    report.downloads_last_month = fetch_download_stats(package)
-    
-    # Check for typosquatting
-    print(f"{Colors.CYAN}[3/{total_steps}] Checking for similar package names...{Colors.NC}")
-    report.similar_packages = check_typosquatting(package)
-    
-    # Check vulnerabilities
-    print(f"{Colors.CYAN}[4/{total_steps}] Scanning for known vulnerabilities...{Colors.NC}")
-    report.vulnerabilities = check_vulnerabilities(package)
-
-    # Dependency tree analysis and hash verification
-    if check_deps:
-        print(f"{Colors.CYAN}[5/{total_steps}] Building dependency tree and verifying file hashes...{Colors.NC}")
-        tree = build_dependency_tree(package, progress=progress, debug=debug)
-        report.dependency_tree = tree
-        # walk tree to find missing hashes
-        missing_hashes = 0
-        def _walk(node):
-            nonlocal missing_hashes
-            for f in node.get("files", []):
-                if not f.get("sha256"):
-                    missing_hashes += 1
-            for child in node.get("dependencies", {}).values():
-                if child:
-                    _walk(child)
-        _walk(tree)
-        if missing_hashes:
-            report.warnings.append(f"{missing_hashes} distribution files missing SHA256 digests")
-            report.risk_score += 10
+        report.version_release_date = summary.version_release_date
+        if version and not summary.version_upload and not summary.files:
+            report.warnings.append(f"Version {version} not found on PyPI")
+        
+        for stage in stages:
+            if stage.needs_info:
+                pending[_start_timed(stage.run, package, summary)] = (stage, time.monotonic())
+        _collect_stages(report, pending, deadline, 1, total_steps, log)
+    finally:
+        # abandoned stages run on in the background (daemon threads, so they
+        # do not delay exit); ones that had not started are dropped
+        for fut in pending:
+            fut.cancel()
+    
+    if mirror is not None and not any(s.name == "vulnerabilities" for s in stages):
+        # pip-audit queries the network; there is nothing to run it against offline
+        report.warnings.append("Vulnerability scan skipped in offline mode")
 
     # Calculate risk score and warnings
-    print(f"{Colors.CYAN}[{total_steps}/{total_steps}] Calculating risk assessment...{Colors.NC}")
+    log(f"{Colors.CYAN}[{total_steps}/{total_steps}] Calculating risk assessment...{Colors.NC}")
     
     if report.downloads_last_month >= 0 and report.downloads_last_month < min_downloads:
         report.warnings.append(f"Low download count: {report.downloads_last_month:,} (threshold: {min_downloads:,})")
@@ -227,6 +554,8 @@ def analyze_package(package: str, min_downloads: int = 1000, min_age_days: int =
         report.risk_score += 10
     
     report.risk_score = min(report.risk_score, 100)
+    report.stage_timings["total"] = time.monotonic() - started
+    METRICS.record_stages(report.stage_timings)
     return report
 
 def _parse_requirement_name(req: str) -> Optional[str]:
@@ -240,32 +569,68 @@ def _parse_requirement_name(req: str) -> Optional[str]:
         return m.group(1)
     return None
 
-def _get_release_files_with_hashes(package: str, version: Optional[str] = None) -> list:
-    data = fetch_pypi_info(package)
-    if not data:
-        return []
-    info = data.get("info", {})
-    ver = version or info.get("version")
-    releases = data.get("releases", {})
-    files = []
-    for f in releases.get(ver, []):
-        filename = f.get("filename")
-        sha256 = f.get("digests", {}).get("sha256") if isinstance(f.get("digests"), dict) else None
-        url = f.get("url")
-        files.append({"filename": filename, "sha256": sha256, "url": url})
-    return files
-
-def build_dependency_tree(package: str, seen: Optional[Set[str]] = None, depth: int = 0, max_depth: int = 4, progress: bool = False, debug: bool = False) -> Dict:
+def target_environment(overrides: Optional[dict] = None) -> dict:
+    """PEP 508 marker environment of this interpreter with `overrides` applied."""
+    env = default_environment()
+    if overrides:
+        env.update(overrides)
+        if "python_version" in overrides and "python_full_version" not in overrides:
+            env["python_full_version"] = f"{overrides['python_version']}.0"
+    return env
+
+@lru_cache(maxsize=None)
+def _parse_requirement(req: str) -> Optional[Requirement]:
+    try:
+        return Requirement(req)
+    except InvalidRequirement:
+        return None
+
+def evaluate_requirement(req: str, environment: dict, extras: tuple = ()) -> tuple:
+    """Decide whether a requires_dist entry applies.
+
+    Returns (name, extras, reason): reason is None when the requirement is
+    followed, "extras" when only an extra that was not requested pulls it in
+    and "markers" when the target environment rules it out. Entries that do
+    not parse are followed by name, as before.
+    """
+    parsed = _parse_requirement(req)
+    if parsed is None:
+        return _parse_requirement_name(req), (), None
+    child_extras = tuple(sorted(parsed.extras))
+    if parsed.marker is None:
+        return parsed.name, child_extras, None
+    for extra in extras + ("",):
+        if parsed.marker.evaluate(dict(environment, extra=extra)):
+            return parsed.name, child_extras, None
+    return parsed.name, child_extras, "extras" if "extra" in str(parsed.marker) else "markers"
+
+def build_dependency_tree(package: str, seen: Optional[Set[str]] = None, depth: int = 0, max_depth: int = 4, progress: bool = False, debug: bool = False, mirror: Optional[MirrorDB] = None, deadline: Optional[float] = None, extras: tuple = (), environment: Optional[dict] = None, root: Optional[ReleaseSummary] = None) -> DependencyGraph:
+    """Build the dependency graph of `package` breadth-first.
+
+    Each package is fetched and stored once; later requirers get an edge to
+    the existing node, so shared dependencies keep their version and files.
+    Breadth-first order means every node is expanded at its shortest depth.
+    Packages in `seen` are left out. Past `deadline` (a time.monotonic()
+    value) no further packages are fetched.
+
+    Only requirements whose PEP 508 markers hold in `environment` (default:
+    this interpreter, see target_environment) are followed, and extras only
+    when requested: `extras` for the root, `name[extra]` requirements below
+    it. Requirements left out are counted in `graph.pruned`.
+
+    `root` is the already fetched release to start from (a pinned version);
+    by default the current release of `package` is fetched.
+    """
     start_time = time.time()
     counter = {"count": 0, "last_print": 0.0}
 
     spinner = ["|", "/", "-", "\\"]
-    def _log_progress(pkg, depth_level, seen_set):
+    def _log_progress(pkg, depth_level, graph):
         # live one-line progress with spinner, throttle to ~5fps
         now = time.time()
         if now - counter["last_print"] > 0.18:
             idx = counter["count"] % len(spinner)
-            msg = f"building deps {spinner[idx]} scanned={counter['count']} current={pkg} depth={depth_level} unique={len(seen_set)}"
+            msg = f"building deps {spinner[idx]} scanned={counter['count']} current={pkg} depth={depth_level} unique={len(graph)}"
             try:
                 sys.stdout.write("\r" + msg)
                 sys.stdout.flush()
@@ -273,34 +638,75 @@ def build_dependency_tree(package: str, seen: Optional[Set[str]] = None, depth:
                 print(msg)
             counter["last_print"] = now
 
-    def _build(pkg: str, seen_local: Set[str], d: int) -> Dict:
-        pkg_key = pkg.lower()
-        if pkg_key in seen_local or d > max_depth:
-            return {}
-        seen_local.add(pkg_key)
+    environment = target_environment() if environment is None else environment
+    graph = DependencyGraph()
+    skip = set() if seen is None else {normalize_name(s) for s in seen}
+    requires = {}   # node id -> requires_dist of the fetched release
+    expanded = {}   # node id -> extras already followed
+    pruned = {}     # node id -> {requirement: reason} not followed (yet)
+
+    def _expand(node_id, d, node_extras):
+        for req in requires[node_id]:
+            if node_id in expanded and req not in pruned[node_id]:
+                continue  # followed on an earlier expansion
+            name, child_extras, reason = evaluate_requirement(req, environment, node_extras)
+            if not name:
+                continue
+            if reason is None:
+                pruned[node_id].pop(req, None)
+                queue.append((name, d + 1, node_id, child_extras))
+            else:
+                pruned[node_id].setdefault(req, reason)
+        expanded[node_id] = set(node_extras)
+
+    queue = deque([(package, depth, None, tuple(extras))])
+    while queue:
+        if deadline is not None and time.monotonic() >= deadline:
+            if debug:
+                print(f"[debug] deadline reached, {len(queue)} packages not fetched")
+            break
+        pkg, d, parent, pkg_extras = queue.popleft()
+        if normalize_name(pkg) in skip:
+            continue
+        if pkg in graph:
+            # already fetched: share the existing node
+            METRICS.record_cache("dependency walk", True)
+            node_id = graph.add_node(pkg, depth=d)
+            if parent is not None:
+                graph.add_edge(parent, node_id)
+            if node_id in requires and not expanded[node_id].issuperset(pkg_extras):
+                # reached again with more extras: follow what they add
+                _expand(node_id, d, tuple(sorted(expanded[node_id].union(pkg_extras))))
+            continue
+        if d > max_depth:
+            continue  # only new packages stop at max_depth; edges to fetched ones are kept
         counter["count"] += 1
+        METRICS.record_cache("dependency walk", False)
         if progress:
-            _log_progress(pkg, d, seen_local)
+            _log_progress(pkg, d, graph)
         if debug:
             print(f"[debug] fetching metadata for {pkg} (depth={d})")
-        data = fetch_pypi_info(pkg)
-        if not data:
+        try:
+            summary = root if root is not None and parent is None else fetch_release_summary(pkg, mirror=mirror)
+        except (HTTPError, OSError, ValueError) as e:
+            # one flaky lookup (5xx, reset, truncated body) must not sink the whole walk
+            if debug:
+                print(f"[debug] fetching {pkg} failed: {e}")
+            summary = None
+        if not summary:
             if debug:
                 print(f"[debug] no metadata for {pkg}")
-            return {"version": None, "files": [], "dependencies": {}}
-        info = data.get("info", {})
-        version = info.get("version")
-        files = _get_release_files_with_hashes(pkg, version)
-        requires = info.get("requires_dist") or []
-        deps = {}
-        for req in requires:
-            name = _parse_requirement_name(req)
-            if not name:
-                continue
-            deps[name] = _build(name, seen_local, d + 1)
-        return {"version": version, "files": files, "dependencies": deps}
-
-    result = _build(package, set() if seen is None else set(seen), depth)
+            node_id = graph.add_node(pkg, None, (), d)
+        else:
+            node_id = graph.add_node(pkg, summary.version, summary.files, d)
+            requires[node_id] = tuple(summary.requires_dist)
+            pruned[node_id] = {}
+            _expand(node_id, d, pkg_extras)
+        if parent is not None:
+            graph.add_edge(parent, node_id)
+    for reasons in pruned.values():
+        for reason in reasons.values():
+            graph.pruned[reason] = graph.pruned.get(reason, 0) + 1
     if progress:
         elapsed = time.time() - start_time
         # clear progress line
@@ -310,27 +716,7 @@ def build_dependency_tree(package: str, seen: Optional[Set[str]] = None, depth:
         except Exception:
             pass
         print(f"[progress] done scanned={counter['count']} elapsed={elapsed:.1f}s")
-    return result
-    if seen is None:
-        seen = set()
-    pkg_key = package.lower()
-    if pkg_key in seen or depth > max_depth:
-        return {}
-    seen.add(pkg_key)
-    data = fetch_pypi_info(package)
-    if not data:
-        return {"version": None, "files": [], "dependencies": {}}
-    info = data.get("info", {})
-    version = info.get("version")
-    files = _get_release_files_with_hashes(package, version)
-    requires = info.get("requires_dist") or []
-    deps = {}
-    for req in requires:
-        name = _parse_requirement_name(req)
-        if not name:
-            continue
-        deps[name] = build_dependency_tree(name, seen=seen, depth=depth + 1, max_depth=max_depth)
-    return {"version": version, "files": files, "dependencies": deps}
+    return graph
 
 def print_report(report: SecurityReport):
     """Print formatted security report."""
@@ -392,25 +778,46 @@ def print_report(report: SecurityReport):
         for vuln in report.vulnerabilities:
             print(f"  • {vuln}")
 
+    # Stage timings
+    if report.stage_timings:
+        timings = ", ".join(
+            f"{name} {'--' if secs is None else f'{secs:.2f}s'}"
+            for name, secs in report.stage_timings.items()
+        )
+        print(f"\n{Colors.BLUE}Stage timings:{Colors.NC} {timings}")
+
+    # Artifact verification
+    if report.artifact_results:
+        counts = {}
+        for r in report.artifact_results:
+            counts[r["status"]] = counts.get(r["status"], 0) + 1
+        downloaded = sum(r["size"] for r in report.artifact_results if r["status"] != "cached")
+        summary = ", ".join(f"{n} {status}" for status, n in sorted(counts.items()))
+        color = Colors.RED if counts.get(MISMATCH) else Colors.BLUE
+        print(f"\n{color}Artifacts:{Colors.NC} {summary} ({downloaded / 1e6:.1f} MB downloaded)")
+
     # Dependency tree summary
     if report.dependency_tree:
-        print(f"\n{Colors.BLUE}Dependency tree summary:{Colors.NC}")
-        def _print_node(name, node, indent=2, max_display_depth=2, depth=0):
+        graph = report.dependency_tree
+        print(f"\n{Colors.BLUE}Dependency tree summary:{Colors.NC} {len(graph)} packages, {graph.edge_count} edges")
+        if graph.pruned:
+            print(f"  Not followed: {graph.pruned.get('extras', 0)} requirements for unrequested extras, "
+                  f"{graph.pruned.get('markers', 0)} excluded by environment markers")
+        printed = set()
+        def _print_node(node, indent=2, max_display_depth=2, depth=0):
             prefix = " " * indent * depth
-            ver = node.get("version") if isinstance(node, dict) else None
-            print(f"{prefix}- {name} {f'({ver})' if ver else ''}")
-            if depth >= max_display_depth:
+            shared = node.key in printed
+            print(f"{prefix}- {node.name} {f'({node.version})' if node.version else ''}{' (shared, shown above)' if shared else ''}")
+            if shared or depth >= max_display_depth:
                 return
-            for f in node.get("files", [])[:3]:
-                sha = f.get("sha256") or "<no-sha256>"
-                print(f"{prefix}  • {f.get('filename')} : {sha}")
-            for child_name, child in sorted(node.get("dependencies", {}).items()):
-                if child:
-                    _print_node(child_name, child, indent, max_display_depth, depth + 1)
+            printed.add(node.key)
+            for filename, sha, _url in node.files[:3]:
+                print(f"{prefix}  • {filename} : {sha or '<no-sha256>'}")
+            for child in sorted(graph.dependencies(node.name), key=lambda n: n.key):
+                _print_node(child, indent, max_display_depth, depth + 1)
 
         # top-level package
-        top = report.dependency_tree
-        _print_node(report.package, top)
+        _print_node(graph.root_node)
     
     # Final status
     print()
@@ -450,8 +857,156 @@ def install_package(package: str) -> bool:
     result = subprocess.run([sys.executable, "-m", "pip", "install", package])
     return result.returncode == 0
 
-def audit_installed():
-    """Audit all installed packages."""
+AUDIT_STATE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "spip", "audit")
+
+def installed_distributions() -> dict:
+    """Normalized name -> (display name, version) for the running environment."""
+    dists = {}
+    for dist in importlib.metadata.distributions():
+        name = dist.metadata["Name"]
+        if name:
+            dists[normalize_name(name)] = (name, dist.version)
+    return dists
+
+def environment_fingerprint(dists: dict) -> str:
+    digest = hashlib.sha256()
+    for key in sorted(dists):
+        digest.update(f"{key}=={dists[key][1]}\n".encode())
+    return digest.hexdigest()
+
+def _audit_state_path() -> str:
+    # one state file per environment (venv) the checker runs in
+    env_id = hashlib.sha256(os.path.realpath(sys.prefix).encode()).hexdigest()[:16]
+    return os.path.join(AUDIT_STATE_DIR, f"{env_id}.json")
+
+def _batched_audit_stages(pins: dict) -> list:
+    """Default stages, with one pip-audit run over all `pins` instead of one per package."""
+    print(f"{Colors.BLUE}Scanning {len(pins)} distributions with pip-audit...{Colors.NC}")
+    try:
+        # pip-audit queries each pinned release once; allow for that on top of the usual limit
+        found = run_pip_audit(pins, timeout=STAGE_TIMEOUTS["vulnerabilities"] + len(pins))
+        error = None
+    except PipAuditError as e:
+        found, error = None, e
+    stages = [stage for stage in default_stages() if stage.name != "vulnerabilities"]
+    if found is None and error is None:
+        return stages  # pip-audit not installed: nothing to scan with, as for single checks
+
+    def _lookup(pkg, _summary):
+        if error is not None:
+            raise error
+        return found.get(normalize_name(pkg), [])
+
+    stages.append(CheckStage("vulnerabilities", "Scanning for known vulnerabilities", _lookup,
+                             _apply_vulnerabilities, STAGE_TIMEOUTS["vulnerabilities"], needs_info=False))
+    return stages
+
+def audit_installed(min_downloads: int = 1000, min_age_days: int = 30, workers: int = 16, full: bool = False, mirror: Optional[MirrorDB] = None, vulndb: Optional[VulnerabilityDB] = None, state_path: Optional[str] = None) -> int:
+    """Audit installed distributions with spip's own risk checks.
+
+    Distributions are checked concurrently at their installed versions. The
+    results and an environment fingerprint are saved per environment so the
+    next audit only re-checks distributions added or upgraded since (and
+    any whose checks did not complete).
+    """
+    start = time.time()
+    state_path = state_path or _audit_state_path()
+    dists = installed_distributions()
+    fingerprint = environment_fingerprint(dists)
+    sources = data_sources_key(mirror is not None, mirror.path if mirror else None, vulndb.dump_path if vulndb else None)
+    rules = cache_rules_key(False, min_downloads, min_age_days, sources)
+
+    previous = {}
+    if not full and os.path.exists(state_path):
+        try:
+            with open(state_path, "r", encoding="utf-8") as fh:
+                state = json.load(fh)
+            if state.get("rules") == rules:
+                previous = state.get("packages", {})
+        except (OSError, json.JSONDecodeError):
+            previous = {}
+
+    todo = [
+        key for key, (_name, version) in dists.items()
+        if previous.get(key, {}).get("version") != version or not previous[key].get("complete")
+    ]
+    results = {key: previous[key] for key in dists if key not in todo}
+    for key in dists:
+        METRICS.record_cache("audit state", key not in todo)
+    if previous and not todo:
+        print(f"{Colors.BLUE}Environment unchanged since last audit ({len(dists)} distributions){Colors.NC}")
+    else:
+        print(f"{Colors.BLUE}Auditing {len(dists)} installed distributions: {len(todo)} new or upgraded, "
+              f"{len(results)} unchanged since last audit{Colors.NC}")
+
+    if todo:
+        interactive = sys.stdout.isatty()
+        stages = None
+        if vulndb is None and mirror is None:
+            stages = _batched_audit_stages({dists[key][0]: dists[key][1] for key in todo})
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="spip-audit") as pool:
+            futures = {
+                pool.submit(analyze_package, dists[key][0], min_downloads, min_age_days,
+                            mirror=mirror, vulndb=vulndb, version=dists[key][1], quiet=True, stages=stages): key
+                for key in todo
+            }
+            for done, fut in enumerate(as_completed(futures), 1):
+                key = futures[fut]
+                name, version = dists[key]
+                try:
+                    report = fut.result()
+                    results[key] = {
+                        "name": name,
+                        "version": version,
+                        "exists": report.exists,
+                        "failed": report.lookup_failed,
+                        "risk_score": report.risk_score,
+                        "warnings": report.warnings if report.exists else report.errors,
+                        "vulnerabilities": report.vulnerabilities,
+                        # a real 404 is an answer for this version; a failed lookup is retried next time
+                        "complete": not report.skipped_stages if report.exists else not report.lookup_failed,
+                    }
+                except Exception as e:
+                    results[key] = {"name": name, "version": version, "exists": True, "failed": True,
+                                    "risk_score": None, "warnings": [f"Check failed: {e}"], "vulnerabilities": [],
+                                    "complete": False}
+                if interactive:
+                    sys.stdout.write(f"\r  checked {done}/{len(todo)} ({name})".ljust(60))
+                    sys.stdout.flush()
+        if interactive:
+            sys.stdout.write("\r" + " " * 60 + "\r")
+
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    with open(state_path, "w", encoding="utf-8") as fh:
+        json.dump({"rules": rules, "fingerprint": fingerprint, "checked_at": time.time(), "packages": results}, fh)
+
+    failed = sorted(r["name"] for r in results.values() if r.get("failed"))
+    missing = sorted(r["name"] for r in results.values() if not r["exists"] and not r.get("failed"))
+    scored = [r for r in results.values() if r["exists"] and not r.get("failed")]
+    flagged = sorted((r for r in scored if (r["risk_score"] or 0) > 20 or r["risk_score"] is None),
+                     key=lambda r: -(r["risk_score"] or 0))
+    high = [r for r in scored if (r["risk_score"] or 0) > 50]
+
+    if flagged:
+        print(f"\n{Colors.BOLD}{'Package':<30} {'Version':<14} {'Risk':>5}  Top warning{Colors.NC}")
+        for r in flagged:
+            score = r["risk_score"]
+            color = Colors.RED if (score or 0) > 50 else Colors.YELLOW
+            risk = "?" if score is None else str(score)
+            top = r["vulnerabilities"][0] if r["vulnerabilities"] else (r["warnings"][0] if r["warnings"] else "")
+            print(f"{color}{r['name'][:30]:<30} {r['version'][:14]:<14} {risk:>5}{Colors.NC}  {top[:70]}")
+    if missing:
+        print(f"\n{Colors.YELLOW}Not found on PyPI (local or private):{Colors.NC} {', '.join(missing)}")
+    if failed:
+        print(f"\n{Colors.YELLOW}Could not be checked (lookup errors; retried next audit):{Colors.NC} {', '.join(failed)}")
+
+    print(f"\n{Colors.BLUE}Audited {len(dists)} distributions in {time.time() - start:.1f}s: "
+          f"{len(high)} high risk, {len(flagged) - len(high)} medium/unknown, {len(missing)} not on PyPI, "
+          f"{len(failed)} failed{Colors.NC}")
+    return 1 if high else 0
+
+def audit_with_pip_audit():
+    """Audit installed packages with pip-audit (falls back to pip list --outdated)."""
     try:
         subprocess.run(["pip-audit"], check=False)
     except FileNotFoundError:
@@ -459,6 +1014,167 @@ def audit_installed():
         print(f"\n{Colors.BLUE}Checking for outdated packages instead...{Colors.NC}\n")
         subprocess.run([sys.executable, "-m", "pip", "list", "--outdated"])
 
+def import_mirror(paths: list, mirror_path: str) -> int:
+    """Bulk-load metadata dumps into the offline mirror database."""
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing:
+        print(f"{Colors.RED}Dump not found: {', '.join(missing)}{Colors.NC}")
+        return 1
+    print(f"{Colors.BLUE}Importing {len(paths)} dump(s) into {mirror_path}...{Colors.NC}")
+    start = time.time()
+    mirror = MirrorDB(mirror_path)
+    try:
+        stats = mirror.import_paths(paths)
+    finally:
+        mirror.close()
+    print(f"{Colors.GREEN}✓ Imported {stats['projects']:,} projects, {stats['files']:,} files, "
+          f"{stats['downloads']:,} download records in {time.time() - start:.1f}s{Colors.NC}")
+    if stats["skipped"]:
+        print(f"{Colors.YELLOW}⚠ Skipped {stats['skipped']:,} unrecognised documents{Colors.NC}")
+    return 0
+
+def _data_identity(path: str) -> str:
+    """Path plus size/mtime of a file (or of every file under a directory), so
+    re-imported data does not keep serving verdicts computed from the old."""
+    path = os.path.realpath(path)
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        files = [os.path.join(root, name) for root, _dirs, names in os.walk(path) for name in names]
+    else:
+        files = [path]
+    for name in sorted(files):
+        try:
+            st = os.stat(name)
+        except OSError:
+            continue
+        digest.update(f"{name}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return f"{path}@{digest.hexdigest()[:12]}"
+
+def data_sources_key(offline: bool, mirror_path: Optional[str] = None, vulndb_path: Optional[str] = None) -> str:
+    """Where metadata and advisories come from: an offline run (which skips the
+    vulnerability scan without --vulndb) must not answer for an online one."""
+    metadata = f"offline:{_data_identity(mirror_path)}" if offline else f"online:{PYPI_URL}"
+    if vulndb_path:
+        advisories = f"osv:{_data_identity(vulndb_path)}"
+    else:
+        advisories = "none" if offline else "pip-audit"
+    return f"{metadata}|{advisories}"
+
+def cache_rules_key(check_deps: bool, min_downloads: int, min_age_days: int, sources: str, verify: bool = False, extras: tuple = (), overrides: Optional[dict] = None) -> str:
+    """Everything besides package and version that changes a verdict; `sources` is data_sources_key()."""
+    mode = "deps" if check_deps else "fast"
+    key = f"{RULES_VERSION}|{mode}|{min_downloads}|{min_age_days}|{sources}"
+    if verify:
+        key += "|verify"
+    if check_deps and (extras or overrides):
+        # the walk, and so the verdict, depends on extras and the target environment
+        key += f"|[{','.join(extras)}]|" + ",".join(f"{k}={v}" for k, v in sorted((overrides or {}).items()))
+    return key
+
+def load_cached_report(cache: ReportCache, package: str, version: Optional[str], rules: str) -> Optional[SecurityReport]:
+    """Return a fresh cached report for package (at `version`, or its latest), else None."""
+    version = version or cache.resolve(package)
+    if not version:
+        return None
+    hit = cache.get(package, version, rules)
+    if hit is None:
+        return None
+    payload, created, expires = hit
+    report = report_from_json(payload)
+    age_min = (time.time() - created) / 60
+    print(f"{Colors.CYAN}Using cached verdict for {package}=={version} "
+          f"(checked {age_min:.0f} min ago, valid {(expires - time.time()) / 60:.0f} more min; --refresh to re-check){Colors.NC}")
+    return report
+
+def open_sources(args: argparse.Namespace) -> tuple:
+    """Open the offline mirror and OSV database requested on the command line.
+
+    Returns (mirror, vulndb, ok); either source is None when not requested.
+    """
+    mirror = None
+    if args.offline:
+        try:
+            mirror = MirrorDB(args.mirror_db, readonly=True)
+        except FileNotFoundError as e:
+            print(f"{Colors.RED}{e}{Colors.NC}")
+            print(f"Populate it first with: spip_checker.py --import-mirror <dump> --mirror-db {args.mirror_db}")
+            return None, None, False
+    
+    vulndb = None
+    if args.vulndb:
+        try:
+            vulndb = VulnerabilityDB(args.vulndb)
+        except FileNotFoundError as e:
+            print(f"{Colors.RED}{e}{Colors.NC}")
+            return None, None, False
+    return mirror, vulndb, True
+
+def emit_metrics(args: argparse.Namespace):
+    """Print and/or write the run metrics requested with --stats / --json-metrics."""
+    if args.stats:
+        print(f"\n{Colors.BLUE}{METRICS.format_table()}{Colors.NC}")
+    if args.json_metrics == "-":
+        print(METRICS.to_json())
+    elif args.json_metrics:
+        with open(args.json_metrics, "w", encoding="utf-8") as fh:
+            fh.write(METRICS.to_json() + "\n")
+
+def split_package_spec(spec: str) -> tuple:
+    """Split "name[extra,...]==version" into (name, extras, version or "")."""
+    name, _, pinned = spec.partition("==")
+    m = re.match(r"^\s*([^\[\s]+)\s*(?:\[([^\]]*)\])?\s*$", name)
+    if not m:
+        return name.strip(), (), pinned.strip()
+    extras = tuple(sorted({e.strip().lower() for e in (m.group(2) or "").split(",") if e.strip()}))
+    return m.group(1), extras, pinned.strip()
+
+def target_overrides(parser: argparse.ArgumentParser, args: argparse.Namespace) -> dict:
+    """Marker environment overrides from --python-version / --target-env."""
+    known = default_environment()
+    overrides = {}
+    if args.python_version:
+        overrides["python_version"] = args.python_version
+    for item in args.target_env:
+        key, sep, value = item.partition("=")
+        if not sep or key not in known:
+            parser.error(f"invalid --target-env {item!r} (KEY=VALUE with KEY one of {', '.join(sorted(known))})")
+        overrides[key] = value
+    return overrides
+
+def run_analysis(parser: argparse.ArgumentParser, args: argparse.Namespace, check_deps: bool) -> Optional[SecurityReport]:
+    """Open the configured data sources and run analyze_package."""
+    timeouts = {}
+    for item in args.stage_timeout:
+        name, _, secs = item.partition("=")
+        if name not in STAGE_TIMEOUTS:
+            parser.error(f"unknown stage '{name}' in --stage-timeout (choose from {', '.join(STAGE_TIMEOUTS)})")
+        try:
+            timeouts[name] = float(secs)
+        except ValueError:
+            parser.error(f"invalid timeout in --stage-timeout {item!r}")
+    
+    mirror, vulndb, ok = open_sources(args)
+    if not ok:
+        return None
+    
+    name, extras, pinned = split_package_spec(args.package)
+    environment = target_environment(target_overrides(parser, args))
+    return analyze_package(
+        name,
+        min_downloads=args.min_downloads,
+        min_age_days=args.min_age_days,
+        check_deps=check_deps,
+        progress=args.progress,
+        debug=args.debug,
+        mirror=mirror,
+        vulndb=vulndb,
+        budget=args.budget,
+        stages=default_stages(check_deps, args.progress, args.debug, mirror, vulndb, timeouts,
+                              args.verify_artifacts, ArtifactCache(args.artifact_cache), extras, environment,
+                              pinned or None),
+        version=pinned or None,
+    )
+
 def main():
     parser = argparse.ArgumentParser(description="Security checker for pip packages")
     parser.add_argument("package", nargs="?", help="Package name to check")
@@ -468,15 +1184,47 @@ def main():
     parser.add_argument("--yes", "-y", action="store_true", help="Auto-confirm installation")
     parser.add_argument("--min-downloads", type=int, default=1000, help="Minimum download threshold")
     parser.add_argument("--min-age-days", type=int, default=30, help="Minimum package age")
-    parser.add_argument("--audit", action="store_true", help="Audit installed packages")
+    parser.add_argument("--audit", action="store_true", help="Audit installed packages with spip's risk checks")
+    parser.add_argument("--pip-audit", action="store_true", help="With --audit, run pip-audit instead of the native checks")
+    parser.add_argument("--full", action="store_true", help="With --audit, re-check every distribution, not only new or upgraded ones")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent package checks for --audit (default: 16)")
     parser.add_argument("--progress", action="store_true", help="Show progress while building dependency tree")
     parser.add_argument("--debug", action="store_true", help="Show minimal debug logs")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help=f"Overall latency budget in seconds (default: {DEFAULT_BUDGET:.0f})")
+    parser.add_argument("--stage-timeout", action="append", default=[], metavar="STAGE=SECONDS",
+                        help=f"Override a stage timeout ({', '.join(STAGE_TIMEOUTS)}); repeatable")
+    parser.add_argument("--graph-json", metavar="PATH", help="With --check, write the dependency graph as JSON")
+    parser.add_argument("--graph-dot", metavar="PATH", help="With --check, write the dependency graph as Graphviz DOT")
+    parser.add_argument("--verify-artifacts", action="store_true",
+                        help="Download the wheel/sdist pip would install (for every dependency with --check) and verify its SHA256")
+    parser.add_argument("--artifact-cache", default=DEFAULT_ARTIFACT_CACHE, help=f"Verified artifact cache (default: {DEFAULT_ARTIFACT_CACHE})")
+    parser.add_argument("--python-version", metavar="X.Y", help="With --check, follow dependencies as for this Python version")
+    parser.add_argument("--target-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="With --check, override a PEP 508 marker variable (e.g. sys_platform=win32); repeatable")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached verdicts and re-run the analysis")
+    parser.add_argument("--cache-db", default=DEFAULT_CACHE_PATH, help=f"Report cache database (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--offline", action="store_true", help="Read metadata from the local mirror instead of pypi.org/pypistats.org")
+    parser.add_argument("--mirror-db", default=DEFAULT_MIRROR_PATH, help=f"Offline mirror database (default: {DEFAULT_MIRROR_PATH})")
+    parser.add_argument("--vulndb", metavar="PATH", help="OSV advisory dump (directory, all.zip or .json) to use instead of pip-audit")
+    parser.add_argument("--stats", action="store_true", help="Print run metrics (requests per host, latency, cache hits, stage times)")
+    parser.add_argument("--json-metrics", metavar="PATH", help="Write run metrics as JSON ('-' for stdout)")
+    parser.add_argument("--import-mirror", nargs="+", metavar="DUMP", help="Bulk-load PyPI JSON / pypistats dumps (files or directories) into the mirror")
     
     args = parser.parse_args()
     
+    if args.import_mirror:
+        return import_mirror(args.import_mirror, args.mirror_db)
+    
     if args.audit:
-        audit_installed()
-        return 0
+        if args.pip_audit:
+            audit_with_pip_audit()
+            return 0
+        mirror, vulndb, ok = open_sources(args)
+        if not ok:
+            return 1
+        status = audit_installed(args.min_downloads, args.min_age_days, args.workers, args.full, mirror, vulndb)
+        emit_metrics(args)
+        return status
     
     if not args.package:
         parser.print_help()
@@ -485,16 +1233,35 @@ def main():
     # Determine check mode: --checkfast takes precedence, otherwise use --check
     check_deps = args.check and not args.checkfast
     
-    report = analyze_package(
-        args.package,
-        min_downloads=args.min_downloads,
-        min_age_days=args.min_age_days,
-        check_deps=check_deps,
-        progress=args.progress,
-        debug=args.debug,
-    )
+    # Cached verdict fast path: pinned "name==version" specs are looked up
+    # directly, bare names through the recently resolved latest version
+    name, extras, pinned = split_package_spec(args.package)
+    sources = data_sources_key(args.offline, args.mirror_db, args.vulndb)
+    rules = cache_rules_key(check_deps, args.min_downloads, args.min_age_days, sources,
+                            args.verify_artifacts, extras, target_overrides(parser, args))
+    cache = ReportCache(args.cache_db)
+    report = None if args.refresh else load_cached_report(cache, name, pinned or None, rules)
+    if not args.refresh:
+        METRICS.record_cache("verdicts", report is not None)
+    if report is None:
+        report = run_analysis(parser, args, check_deps)
+        if report is None:
+            return 1
+        if report.exists and not report.skipped_stages:
+            cache.put(name, report.version, rules, report.risk_score, report_to_json(report), pinned=bool(pinned))
+    cache.close()
     print_report(report)
     
+    if report.dependency_tree:
+        METRICS.record_graph(report.dependency_tree)
+        if args.graph_json:
+            with open(args.graph_json, "w", encoding="utf-8") as fh:
+                fh.write(report.dependency_tree.to_json())
+        if args.graph_dot:
+            with open(args.graph_dot, "w", encoding="utf-8") as fh:
+                fh.write(report.dependency_tree.to_dot())
+    emit_metrics(args)
+    
     if args.install:
         if prompt_install(report, args.yes):
             success = install_package(args.package)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+"""
+spip_fakepypi.py - Recorded-response fake PyPI / pypistats server for spip
+Replays JSON fixtures over HTTP with configurable latency, jitter and error
+injection, so spip_checker can be tested and benchmarked without the network.
+
+Fixture layout (files may also be gzip-compressed, e.g. `requests.json.gz`):
+    <fixtures>/pypi/<normalized-name>.json            /pypi/<name>/json
+    <fixtures>/pypi/<normalized-name>/<version>.json  /pypi/<name>/<version>/json
+    <fixtures>/pypistats/<normalized-name>.json       /api/packages/<name>/recent
+    <fixtures>/files/<filename>                       /files/<filename>
+
+Usage:
+    python spip_fakepypi.py record chromadb --out bench/fixtures --depth 4
+    python spip_fakepypi.py serve bench/fixtures --port 8765 --latency 50 --jitter 10
+    SPIP_PYPI_URL=http://127.0.0.1:8765 SPIP_PYPISTATS_URL=http://127.0.0.1:8765 \\
+        python spip_checker.py chromadb --check
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen
+
+from spip_mirror import normalize_name
+
+_PYPI_RE = re.compile(r"^/pypi/([^/]+)/json/?$")
+_RELEASE_RE = re.compile(r"^/pypi/([^/]+)/([^/]+)/json/?$")
+_STATS_RE = re.compile(r"^/api/packages/([^/]+)/recent/?$")
+_FILES_PREFIX = "/files/"
+
+# How long an injected "timeout" keeps the connection open without answering
+HANG_SECONDS = 30.0
+
+
+class FakePyPIServer:
+    """Threaded HTTP server replaying fixtures.
+
+    latency/jitter are in seconds (each response waits latency +/- jitter);
+    error_rate answers that fraction of requests with HTTP 503 and
+    timeout_rate leaves that fraction hanging for HANG_SECONDS.
+    """
+
+    def __init__(self, fixtures: str, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, timeout_rate: float = 0.0, seed: Optional[int] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.stats = {"requests": 0, "bytes": 0, "not_found": 0, "errors_injected": 0, "timeouts_injected": 0}
+        self._stats_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakePyPIServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-pypi", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakePyPIServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _draw(self) -> tuple:
+        with self._rng_lock:
+            delay = self.latency + (self._rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+            return max(0.0, delay), self._rng.random(), self._rng.random()
+
+    def _resolve(self, path: str) -> Optional[Tuple[str, bool]]:
+        """Map a request path to (fixture file, stored gzipped), or None."""
+        m = _PYPI_RE.match(path)
+        if m:
+            return self._fixture("pypi", normalize_name(m.group(1)) + ".json")
+        m = _RELEASE_RE.match(path)
+        if m:
+            return self._fixture("pypi", os.path.join(normalize_name(m.group(1)), os.path.basename(m.group(2)) + ".json"))
+        m = _STATS_RE.match(path)
+        if m:
+            return self._fixture("pypistats", normalize_name(m.group(1)) + ".json")
+        if path.startswith(_FILES_PREFIX):
+            name = os.path.basename(path[len(_FILES_PREFIX):])
+            return self._fixture("files", name) if name else None
+        return None
+
+    def _fixture(self, kind: str, name: str) -> Optional[Tuple[str, bool]]:
+        base = os.path.join(self.fixtures, kind, name)
+        if os.path.isfile(base):
+            return base, False
+        if os.path.isfile(base + ".gz"):
+            return base + ".gz", True
+        return None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):  # noqa: A002 - keep the console quiet
+                pass
+
+            def do_GET(self):
+                server._count("requests")
+                delay, err_roll, hang_roll = server._draw()
+                if server.timeout_rate and hang_roll < server.timeout_rate:
+                    server._count("timeouts_injected")
+                    time.sleep(HANG_SECONDS)
+                    self.close_connection = True
+                    return
+                if delay:
+                    time.sleep(delay)
+                if server.error_rate and err_roll < server.error_rate:
+                    server._count("errors_injected")
+                    self._reply(503, b'{"message": "injected error"}', "application/json")
+                    return
+                path = self.path.split("?", 1)[0]
+                resolved = server._resolve(path)
+                if resolved is None:
+                    server._count("not_found")
+                    self._reply(404, b'{"message": "Not Found"}', "application/json")
+                    return
+                fixture, compressed = resolved
+                opener = gzip.open if compressed else open
+                with opener(fixture, "rb") as fh:
+                    body = fh.read()
+                ctype = "application/octet-stream" if path.startswith(_FILES_PREFIX) else "application/json"
+                server._count("bytes", len(body))
+                self._reply(200, body, ctype)
+
+            def _reply(self, status: int, body: bytes, ctype: str):
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+# ── recording ─────────────────────────────────────────────────────────────
+
+def _trim_document(doc: dict) -> dict:
+    """Keep what spip reads: info subset, every release's first upload_time,
+    and full file entries for the current version."""
+    info = doc.get("info") or {}
+    version = info.get("version")
+    keep_info = ("name", "version", "author", "author_email", "maintainer_email",
+                 "home_page", "project_url", "requires_dist", "requires_python")
+    releases = {}
+    for ver, files in (doc.get("releases") or {}).items():
+        if ver == version:
+            releases[ver] = [
+                {k: f.get(k) for k in ("filename", "upload_time", "upload_time_iso_8601", "digests",
+                                       "url", "size", "packagetype", "python_version", "requires_python")}
+                for f in files
+            ]
+        else:
+            times = [f.get("upload_time") for f in files if f.get("upload_time")]
+            releases[ver] = [{"upload_time": min(times)}] if times else []
+    return {"info": {k: info.get(k) for k in keep_info}, "releases": releases}
+
+
+def _write_fixture(path: str, data: dict, compress: bool):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = json.dumps(data, separators=(",", ":")).encode()
+    if compress:
+        with gzip.open(path + ".gz", "wb") as fh:
+            fh.write(payload)
+    else:
+        with open(path, "wb") as fh:
+            fh.write(payload)
+
+
+def record(packages: list, out: str, depth: int = 4, trim: bool = True, compress: bool = True,
+           base_url: str = "https://pypi.org", stats_url: str = "https://pypistats.org") -> dict:
+    """Fetch the dependency closure of `packages` (every requires_dist entry,
+    extras included) from the real services and save it as fixtures."""
+    from spip_checker import _parse_requirement_name
+
+    seen = set()
+    queue = deque((p, 0) for p in packages)
+    counts = {"pypi": 0, "pypistats": 0, "missing": 0}
+    while queue:
+        pkg, d = queue.popleft()
+        key = normalize_name(pkg)
+        if key in seen or d > depth:
+            continue
+        seen.add(key)
+        try:
+            with urlopen(f"{base_url}/pypi/{pkg}/json", timeout=30) as resp:
+                doc = json.loads(resp.read().decode())
+        except (HTTPError, URLError):
+            counts["missing"] += 1
+            continue
+        _write_fixture(os.path.join(out, "pypi", key + ".json"), _trim_document(doc) if trim else doc, compress)
+        counts["pypi"] += 1
+        try:
+            with urlopen(f"{stats_url}/api/packages/{key}/recent", timeout=30) as resp:
+                _write_fixture(os.path.join(out, "pypistats", key + ".json"), json.loads(resp.read().decode()), compress)
+                counts["pypistats"] += 1
+        except (HTTPError, URLError, json.JSONDecodeError):
+            pass
+        for req in (doc.get("info") or {}).get("requires_dist") or []:
+            name = _parse_requirement_name(req)
+            if name:
+                queue.append((name, d + 1))
+        print(f"\rrecorded {counts['pypi']} packages (queue {len(queue)})", end="", flush=True)
+    print()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake PyPI/pypistats server replaying recorded fixtures")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="Serve a fixtures directory")
+    serve.add_argument("fixtures", help="Fixtures directory")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--latency", type=float, default=0.0, help="Per-response latency in ms")
+    serve.add_argument("--jitter", type=float, default=0.0, help="Latency jitter (+/-) in ms")
+    serve.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 503")
+    serve.add_argument("--timeout-rate", type=float, default=0.0, help="Fraction of requests left hanging")
+    serve.add_argument("--seed", type=int, default=None, help="Random seed for jitter and injection")
+
+    rec = sub.add_parser("record", help="Record fixtures for packages and their dependency closure")
+    rec.add_argument("packages", nargs="+")
+    rec.add_argument("--out", required=True, help="Fixtures directory to write")
+    rec.add_argument("--depth", type=int, default=4, help="Dependency depth to follow (default: 4)")
+    rec.add_argument("--no-trim", action="store_true", help="Keep the full PyPI documents")
+    rec.add_argument("--no-compress", action="store_true", help="Write plain .json instead of .json.gz")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        counts = record(args.packages, args.out, args.depth, not args.no_trim, not args.no_compress)
+        print(f"{counts['pypi']} PyPI documents, {counts['pypistats']} pypistats documents, "
+              f"{counts['missing']} not found")
+        return 0
+
+    server = FakePyPIServer(args.fixtures, args.latency / 1000, args.jitter / 1000,
+                            args.error_rate, args.timeout_rate, args.seed, args.host, args.port)
+    print(f"Serving {args.fixtures} on {server.url} (Ctrl+C to stop)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+        print(f"\n{json.dumps(server.stats)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""
+spip_graph.py - Dependency graph for spip
+A DAG (cycles tolerated and reported) with interned package names and
+integer adjacency lists. Every package is stored once, however many
+packages depend on it, with its version, distribution files and hashes.
+"""
+
+import json
+import sys
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from spip_mirror import normalize_name
+
+
+class PackageNode:
+    """One package in the graph, shared by all of its dependents."""
+
+    __slots__ = ("key", "name", "version", "files", "depth")
+
+    def __init__(self, key: str, name: str, version: Optional[str], files: tuple, depth: int):
+        self.key = key          # PEP 503 normalized, interned
+        self.name = name        # display name as first encountered
+        self.version = version
+        self.files = files      # ((filename, sha256, url), ...)
+        self.depth = depth      # shortest distance from the root
+
+    @property
+    def missing_hashes(self) -> int:
+        return sum(1 for _fn, sha, _url in self.files if not sha)
+
+
+class DependencyGraph:
+    """Packages as integer ids with forward adjacency lists.
+
+    The reverse adjacency used by `dependents()` is derived on demand and
+    cached until the next edge is added.
+    """
+
+    def __init__(self):
+        self.nodes: List[PackageNode] = []
+        self._ids: Dict[str, int] = {}
+        self._edges: List[List[int]] = []
+        self._reverse: Optional[List[List[int]]] = None
+        self.root: Optional[int] = None
+        self.pruned: Dict[str, int] = {}  # requirements not followed, by reason
+
+    # ── construction ──────────────────────────────────────────────────────
+
+    def add_node(self, name: str, version: Optional[str] = None, files=(), depth: int = 0) -> int:
+        """Add `name` (or return its existing id); the first root added is the graph root."""
+        key = sys.intern(normalize_name(name))
+        node_id = self._ids.get(key)
+        if node_id is not None:
+            node = self.nodes[node_id]
+            node.depth = min(node.depth, depth)
+            return node_id
+        node_id = len(self.nodes)
+        self.nodes.append(PackageNode(key, sys.intern(name), version, tuple(files), depth))
+        self._ids[key] = node_id
+        self._edges.append([])
+        if self.root is None:
+            self.root = node_id
+        return node_id
+
+    def add_edge(self, parent: int, child: int):
+        edges = self._edges[parent]
+        if child not in edges:
+            edges.append(child)
+            self._reverse = None
+
+    # ── lookups ───────────────────────────────────────────────────────────
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __contains__(self, name: str) -> bool:
+        return normalize_name(name) in self._ids
+
+    @property
+    def edge_count(self) -> int:
+        return sum(len(e) for e in self._edges)
+
+    @property
+    def root_node(self) -> Optional[PackageNode]:
+        return None if self.root is None else self.nodes[self.root]
+
+    def node(self, name: str) -> Optional[PackageNode]:
+        node_id = self._ids.get(normalize_name(name))
+        return None if node_id is None else self.nodes[node_id]
+
+    def dependencies(self, name: str) -> List[PackageNode]:
+        node_id = self._ids.get(normalize_name(name))
+        if node_id is None:
+            return []
+        return [self.nodes[c] for c in self._edges[node_id]]
+
+    def dependents(self, name: str) -> List[PackageNode]:
+        """Packages that directly require `name` (reverse dependencies)."""
+        node_id = self._ids.get(normalize_name(name))
+        if node_id is None:
+            return []
+        if self._reverse is None:
+            reverse: List[List[int]] = [[] for _ in self.nodes]
+            for parent, children in enumerate(self._edges):
+                for child in children:
+                    reverse[child].append(parent)
+            self._reverse = reverse
+        return [self.nodes[p] for p in self._reverse[node_id]]
+
+    # ── traversal ─────────────────────────────────────────────────────────
+
+    def walk(self, start: Optional[str] = None) -> Iterator[Tuple[PackageNode, int]]:
+        """Breadth-first walk yielding (node, depth); each node is visited once."""
+        if start is None:
+            if self.root is None:
+                return
+            first = self.root
+        else:
+            first = self._ids.get(normalize_name(start))
+            if first is None:
+                return
+        visited = bytearray(len(self.nodes))
+        visited[first] = 1
+        queue = deque([(first, 0)])
+        while queue:
+            node_id, depth = queue.popleft()
+            yield self.nodes[node_id], depth
+            for child in self._edges[node_id]:
+                if not visited[child]:
+                    visited[child] = 1
+                    queue.append((child, depth + 1))
+
+    def find_cycles(self) -> List[List[str]]:
+        """Dependency cycles as lists of names (iterative Tarjan SCC)."""
+        n = len(self.nodes)
+        index = [-1] * n
+        low = [0] * n
+        on_stack = bytearray(n)
+        stack: List[int] = []
+        cycles = []
+        counter = 0
+        for start in range(n):
+            if index[start] != -1:
+                continue
+            work = [(start, 0)]
+            while work:
+                v, i = work[-1]
+                if i == 0:
+                    index[v] = low[v] = counter
+                    counter += 1
+                    stack.append(v)
+                    on_stack[v] = 1
+                edges = self._edges[v]
+                if i < len(edges):
+                    work[-1] = (v, i + 1)
+                    w = edges[i]
+                    if index[w] == -1:
+                        work.append((w, 0))
+                    elif on_stack[w]:
+                        low[v] = min(low[v], index[w])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[v])
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = 0
+                        component.append(w)
+                        if w == v:
+                            break
+                    if len(component) > 1 or v in self._edges[v]:
+                        cycles.append([self.nodes[c].name for c in reversed(component)])
+        return cycles
+
+    def missing_hashes(self) -> int:
+        """Distribution files without a SHA256 digest across the whole graph."""
+        return sum(node.missing_hashes for node in self.nodes)
+
+    # ── export ────────────────────────────────────────────────────────────
+
+    def to_dict(self) -> dict:
+        return {
+            "root": None if self.root is None else self.nodes[self.root].name,
+            "pruned": dict(self.pruned),
+            "nodes": [
+                {
+                    "name": node.name,
+                    "version": node.version,
+                    "depth": node.depth,
+                    "files": [{"filename": fn, "sha256": sha, "url": url} for fn, sha, url in node.files],
+                    "dependencies": [self.nodes[c].name for c in self._edges[i]],
+                }
+                for i, node in enumerate(self.nodes)
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DependencyGraph":
+        graph = cls()
+        for entry in data.get("nodes", []):
+            files = tuple((f.get("filename"), f.get("sha256"), f.get("url")) for f in entry.get("files", []))
+            graph.add_node(entry["name"], entry.get("version"), files, entry.get("depth", 0))
+        for entry in data.get("nodes", []):
+            parent = graph._ids[normalize_name(entry["name"])]
+            for dep in entry.get("dependencies", []):
+                graph.add_edge(parent, graph.add_node(dep, depth=entry.get("depth", 0) + 1))
+        if data.get("root"):
+            graph.root = graph._ids.get(normalize_name(data["root"]))
+        graph.pruned = dict(data.get("pruned") or {})
+        return graph
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def to_dot(self) -> str:
+        """Graphviz DOT; nodes missing hashes are drawn red, cycle members dashed."""
+        in_cycle = {name for cycle in self.find_cycles() for name in cycle}
+        lines = ["digraph dependencies {", "  rankdir=LR;", "  node [shape=box, fontname=\"Helvetica\"];"]
+        for i, node in enumerate(self.nodes):
+            label = f"{node.name}\\n{node.version}" if node.version else node.name
+            attrs = [f"label=\"{label}\""]
+            if node.missing_hashes:
+                attrs.append("color=red")
+            if node.name in in_cycle:
+                attrs.append("style=dashed")
+            if i == self.root:
+                attrs.append("penwidth=2")
+            lines.append(f"  n{i} [{', '.join(attrs)}];")
+        for parent, children in enumerate(self._edges):
+            for child in children:
+                lines.append(f"  n{parent} -> n{child};")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,188 @@
+"""
+spip_metrics.py - Run metrics for spip
+Counts HTTP requests, bytes and latency per host, cache hits and misses,
+dependency graph shape and time per analysis stage, so a slow run can be
+attributed to PyPI, pypistats, pip-audit or spip's own processing.
+"""
+
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _bucket_label(i: int) -> str:
+    if i == len(LATENCY_BUCKETS):
+        return f">{LATENCY_BUCKETS[-1] * 1000:g}ms"
+    return f"<={LATENCY_BUCKETS[i] * 1000:g}ms"
+
+
+class RunMetrics:
+    """Thread-safe counters for one spip run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.monotonic()
+            self.hosts: Dict[str, dict] = {}
+            self.histogram: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+            self.caches: Dict[str, List[int]] = {}   # name -> [hits, misses]
+            self.nodes_per_depth: Dict[int, int] = {}
+            self.pruned: Dict[str, int] = {}          # requirements not followed, by reason
+            self.stages: Dict[str, List[float]] = {}  # name -> [runs, total seconds, max seconds, skipped]
+
+    # ── recording ─────────────────────────────────────────────────────────
+
+    def record_request(self, host: str, nbytes: int, seconds: float, ok: bool = True):
+        """One request (or subprocess call) to `host` taking `seconds`."""
+        bucket = len(LATENCY_BUCKETS)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                bucket = i
+                break
+        with self._lock:
+            entry = self.hosts.setdefault(host, {"requests": 0, "errors": 0, "bytes": 0, "seconds": 0.0, "max_seconds": 0.0})
+            entry["requests"] += 1
+            entry["errors"] += 0 if ok else 1
+            entry["bytes"] += nbytes
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            self.histogram[bucket] += 1
+
+    def record_cache(self, name: str, hit: bool):
+        with self._lock:
+            counts = self.caches.setdefault(name, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def record_graph(self, graph):
+        """Nodes per depth and pruned requirements of a DependencyGraph."""
+        with self._lock:
+            for node in graph.nodes:
+                self.nodes_per_depth[node.depth] = self.nodes_per_depth.get(node.depth, 0) + 1
+            for reason, count in graph.pruned.items():
+                self.pruned[reason] = self.pruned.get(reason, 0) + count
+
+    def record_stages(self, timings: Dict[str, Optional[float]]):
+        """Merge a report's stage_timings (None marks a skipped stage)."""
+        with self._lock:
+            for name, secs in timings.items():
+                entry = self.stages.setdefault(name, [0, 0.0, 0.0, 0])
+                if secs is None:
+                    entry[3] += 1
+                    continue
+                entry[0] += 1
+                entry[1] += secs
+                entry[2] = max(entry[2], secs)
+
+    # ── output ────────────────────────────────────────────────────────────
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "elapsed_s": round(time.monotonic() - self.started, 4),
+                "hosts": {
+                    host: dict(e, seconds=round(e["seconds"], 4), max_seconds=round(e["max_seconds"], 4))
+                    for host, e in sorted(self.hosts.items())
+                },
+                "latency_histogram": {_bucket_label(i): n for i, n in enumerate(self.histogram)},
+                "caches": {
+                    name: {"hits": h, "misses": m, "hit_ratio": round(h / (h + m), 4) if h + m else None}
+                    for name, (h, m) in sorted(self.caches.items())
+                },
+                "nodes_per_depth": {str(d): n for d, n in sorted(self.nodes_per_depth.items())},
+                "pruned_requirements": dict(self.pruned),
+                "stages": {
+                    name: {"runs": int(runs), "total_s": round(total, 4), "max_s": round(peak, 4), "skipped": int(skipped)}
+                    for name, (runs, total, peak, skipped) in self.stages.items()
+                },
+            }
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def format_table(self) -> str:
+        data = self.to_dict()
+        lines = [f"Run metrics ({data['elapsed_s']:.2f}s wall clock)"]
+        if data["hosts"]:
+            lines.append(f"  {'Host':<28} {'Reqs':>6} {'Errors':>6} {'Bytes':>12} {'Total s':>9} {'Avg ms':>8} {'Max ms':>8}")
+            for host, e in data["hosts"].items():
+                avg = e["seconds"] / e["requests"] * 1000 if e["requests"] else 0.0
+                lines.append(f"  {host[:28]:<28} {e['requests']:>6} {e['errors']:>6} {e['bytes']:>12,} "
+                             f"{e['seconds']:>9.2f} {avg:>8.1f} {e['max_seconds'] * 1000:>8.1f}")
+            hist = ", ".join(f"{label} {n}" for label, n in data["latency_histogram"].items() if n)
+            lines.append(f"  Latency: {hist}")
+        else:
+            lines.append("  No network requests")
+        for name, c in data["caches"].items():
+            ratio = "--" if c["hit_ratio"] is None else f"{c['hit_ratio'] * 100:.0f}%"
+            lines.append(f"  Cache {name}: {c['hits']} hits, {c['misses']} misses ({ratio})")
+        if data["nodes_per_depth"]:
+            depths = ", ".join(f"d{d}={n}" for d, n in data["nodes_per_depth"].items())
+            lines.append(f"  Nodes per depth: {depths}")
+        if data["pruned_requirements"]:
+            pruned = ", ".join(f"{n} by {reason}" for reason, n in data["pruned_requirements"].items())
+            lines.append(f"  Requirements pruned: {pruned}")
+        if data["stages"]:
+            parts = []
+            for name, s in data["stages"].items():
+                if not s["runs"]:
+                    parts.append(f"{name} skipped")
+                    continue
+                text = f"{name} {s['total_s']:.2f}s" + (f"/{s['runs']} runs" if s["runs"] > 1 else "")
+                if s["skipped"]:
+                    text += f" ({s['skipped']} skipped)"
+                parts.append(text)
+            lines.append(f"  Stages: {', '.join(parts)}")
+        return "\n".join(lines)
+
+
+class MeteredResponse:
+    """Wraps an HTTP response, counting bytes read; the request is recorded on close."""
+
+    def __init__(self, response, metrics: RunMetrics, host: str, started: float):
+        self._response = response
+        self._metrics = metrics
+        self._host = host
+        self._started = started
+        self._bytes = 0
+        self._closed = False
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        data = self._response.read() if amt is None else self._response.read(amt)
+        self._bytes += len(data)
+        return data
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._response.close()
+            self._metrics.record_request(self._host, self._bytes, time.perf_counter() - self._started)
+
+    def __enter__(self) -> "MeteredResponse":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+def metered_urlopen(url: str, metrics: RunMetrics, timeout: float = 10):
+    """urlopen() that records the request in `metrics`; failures are recorded as errors."""
+    host = urlsplit(url).netloc
+    started = time.perf_counter()
+    try:
+        response = urlopen(url, timeout=timeout)
+    except Exception:
+        metrics.record_request(host, 0, time.perf_counter() - started, ok=False)
+        raise
+    return MeteredResponse(response, metrics, host, started)
@@ -0,0 +1,243 @@
+"""
+spip_mirror.py - Offline PyPI metadata mirror for spip
+Bulk-loads PyPI JSON / pypistats dumps into an indexed SQLite database so
+spip_checker can run without network access (--offline).
+"""
+
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Iterable, Iterator, Optional
+
+from spip_pypijson import ReleaseSummary
+
+DEFAULT_MIRROR_PATH = os.path.join(os.path.expanduser("~"), ".cache", "spip", "mirror.sqlite3")
+
+# Only the "info" fields spip_checker actually reads are kept
+INFO_FIELDS = (
+    "name", "version", "author", "author_email", "maintainer_email",
+    "home_page", "project_url", "requires_dist",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    name TEXT PRIMARY KEY,
+    version TEXT,
+    info TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    upload_time TEXT,
+    sha256 TEXT,
+    url TEXT,
+    size INTEGER,
+    PRIMARY KEY (name, filename)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_by_version ON files (name, version);
+CREATE INDEX IF NOT EXISTS files_by_upload ON files (name, upload_time);
+CREATE TABLE IF NOT EXISTS downloads (
+    name TEXT PRIMARY KEY,
+    last_month INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+_DUMP_SUFFIXES = (".json", ".jsonl", ".ndjson", ".json.gz", ".jsonl.gz", ".ndjson.gz")
+
+
+def normalize_name(name: str) -> str:
+    """PEP 503 normalized project name."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_dump_documents(path: str) -> Iterator[dict]:
+    """Yield JSON documents from a dump file or a directory of dump files.
+
+    `.json` files hold one document, `.jsonl`/`.ndjson` files one per line.
+    """
+    if os.path.isdir(path):
+        for root, _dirs, names in os.walk(path):
+            for name in sorted(names):
+                if name.endswith(_DUMP_SUFFIXES):
+                    yield from iter_dump_documents(os.path.join(root, name))
+        return
+    line_based = path.endswith((".jsonl", ".ndjson", ".jsonl.gz", ".ndjson.gz"))
+    with _open_text(path) as fh:
+        if line_based:
+            for line in fh:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            doc = json.load(fh)
+            # allow a top-level list of documents as well
+            if isinstance(doc, list):
+                yield from doc
+            else:
+                yield doc
+
+
+class MirrorDB:
+    """SQLite-backed store of PyPI project metadata and download counts."""
+
+    def __init__(self, path: str = DEFAULT_MIRROR_PATH, readonly: bool = False):
+        self.path = path
+        # analyze_package queries from several stage threads at once
+        self._lock = threading.Lock()
+        if readonly:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Mirror database not found: {path}")
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # ── import ────────────────────────────────────────────────────────────
+
+    def import_documents(self, docs: Iterable[dict], batch_size: int = 500) -> dict:
+        """Bulk-load PyPI JSON and pypistats "recent" documents.
+
+        Rows are written with executemany in large transactions; returns
+        counts of imported projects, files and download records.
+        """
+        stats = {"projects": 0, "files": 0, "downloads": 0, "skipped": 0}
+        projects, files, downloads = [], [], []
+
+        def _flush():
+            with self.conn:
+                if projects:
+                    names = [(p[0],) for p in projects]
+                    # a re-imported project replaces its previous file list
+                    self.conn.executemany("DELETE FROM files WHERE name = ?", names)
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO projects (name, version, info) VALUES (?, ?, ?)",
+                        projects,
+                    )
+                if files:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO files "
+                        "(name, version, filename, upload_time, sha256, url, size) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        files,
+                    )
+                if downloads:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO downloads (name, last_month) VALUES (?, ?)",
+                        downloads,
+                    )
+            projects.clear()
+            files.clear()
+            downloads.clear()
+
+        self.conn.execute("PRAGMA synchronous=OFF")
+        try:
+            for doc in docs:
+                if not isinstance(doc, dict):
+                    stats["skipped"] += 1
+                elif isinstance(doc.get("info"), dict):
+                    info = doc["info"]
+                    name = normalize_name(info.get("name") or "")
+                    if not name:
+                        stats["skipped"] += 1
+                        continue
+                    subset = {k: info.get(k) for k in INFO_FIELDS}
+                    projects.append((name, info.get("version"), json.dumps(subset)))
+                    for ver, ver_files in (doc.get("releases") or {}).items():
+                        for f in ver_files or []:
+                            digests = f.get("digests") if isinstance(f.get("digests"), dict) else {}
+                            files.append((
+                                name, ver, f.get("filename") or "",
+                                f.get("upload_time_iso_8601") or f.get("upload_time"),
+                                digests.get("sha256"), f.get("url"), f.get("size"),
+                            ))
+                    stats["projects"] += 1
+                elif "package" in doc and isinstance(doc.get("data"), dict):
+                    # pypistats /api/packages/<name>/recent response
+                    downloads.append((normalize_name(doc["package"]), int(doc["data"].get("last_month") or 0)))
+                    stats["downloads"] += 1
+                else:
+                    stats["skipped"] += 1
+                if len(projects) + len(downloads) >= batch_size:
+                    stats["files"] += len(files)
+                    _flush()
+            stats["files"] += len(files)
+            _flush()
+        finally:
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("ANALYZE")
+        return stats
+
+    def import_paths(self, paths: Iterable[str]) -> dict:
+        """Import every dump file (or directory of dump files) in `paths`."""
+        def _docs():
+            for path in paths:
+                yield from iter_dump_documents(path)
+        return self.import_documents(_docs())
+
+    # ── lookup ────────────────────────────────────────────────────────────
+
+    def fetch_pypi_info(self, package: str) -> Optional[dict]:
+        """Return a PyPI-JSON-shaped document for `package`, or None."""
+        name = normalize_name(package)
+        with self._lock:
+            row = self.conn.execute("SELECT info FROM projects WHERE name = ?", (name,)).fetchone()
+            rows = self.conn.execute(
+                "SELECT version, filename, upload_time, sha256, url, size FROM files WHERE name = ?",
+                (name,),
+            ).fetchall()
+        if row is None:
+            return None
+        releases: dict = {}
+        for ver, filename, upload_time, sha256, url, size in rows:
+            releases.setdefault(ver, []).append({
+                "filename": filename,
+                "upload_time": upload_time,
+                "digests": {"sha256": sha256} if sha256 else {},
+                "url": url,
+                "size": size,
+            })
+        return {"info": json.loads(row[0]), "releases": releases}
+
+    def fetch_release_summary(self, package: str, version: Optional[str] = None) -> Optional[ReleaseSummary]:
+        """Return the compact summary (for `version`, default current) from the indexes, or None."""
+        name = normalize_name(package)
+        with self._lock:
+            row = self.conn.execute("SELECT info FROM projects WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return None
+            summary = ReleaseSummary()
+            summary._set_info(json.loads(row[0]), version)
+            summary.first_upload, summary.file_count, summary.release_count = self.conn.execute(
+                "SELECT MIN(upload_time), COUNT(*), COUNT(DISTINCT version) FROM files WHERE name = ?",
+                (name,),
+            ).fetchone()
+            files = self.conn.execute(
+                "SELECT filename, sha256, url, upload_time FROM files WHERE name = ? AND version = ?",
+                (name, summary.version or ""),
+            ).fetchall()
+        summary.files = tuple((fn, sha or None, url) for fn, sha, url, _ts in files)
+        summary.version_upload = max((ts for *_rest, ts in files if ts), default=None)
+        return summary
+
+    def fetch_download_stats(self, package: str) -> int:
+        """Return last-month downloads, or -1 when the mirror has no record."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT last_month FROM downloads WHERE name = ?", (normalize_name(package),)
+            ).fetchone()
+        return row[0] if row else -1
@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+"""
+spip_pypijson.py - Streaming parser for PyPI JSON API documents
+Extracts only the fields spip_checker needs into a compact ReleaseSummary,
+without materialising the full document (boto3/botocore are many MB).
+
+Run directly to compare against the json.loads approach:
+    python spip_pypijson.py botocore.json [--repeat 3]
+"""
+
+import argparse
+import codecs
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+
+class ReleaseSummary:
+    """The subset of a PyPI project document used by SecurityReport."""
+
+    __slots__ = (
+        "name", "version", "author", "maintainer_email", "home_page",
+        "requires_dist", "first_upload", "version_upload",
+        "release_count", "file_count", "files",
+    )
+
+    def __init__(self):
+        self.name = ""
+        self.version = None
+        self.author = None
+        self.maintainer_email = None
+        self.home_page = None
+        self.requires_dist = ()
+        self.first_upload = None    # raw upload_time string of the oldest file
+        self.version_upload = None  # raw upload_time string of the newest file of `version`
+        self.release_count = 0
+        self.file_count = 0
+        self.files = ()             # (filename, sha256, url) for `version`
+
+    def _set_info(self, info: dict, version: Optional[str] = None):
+        self.name = info.get("name") or ""
+        self.version = version or info.get("version")
+        self.author = info.get("author")
+        self.maintainer_email = info.get("maintainer_email") or info.get("author_email")
+        self.home_page = info.get("home_page") or info.get("project_url")
+        self.requires_dist = tuple(info.get("requires_dist") or ())
+
+    @property
+    def first_release_date(self) -> Optional[datetime]:
+        return parse_upload_time(self.first_upload)
+
+    @property
+    def version_release_date(self) -> Optional[datetime]:
+        return parse_upload_time(self.version_upload)
+
+    def file_dicts(self) -> list:
+        return [{"filename": fn, "sha256": sha, "url": url} for fn, sha, url in self.files]
+
+    @classmethod
+    def from_json(cls, data: dict, version: Optional[str] = None) -> "ReleaseSummary":
+        """Build a summary from an already-decoded PyPI JSON document."""
+        summary = cls()
+        summary._set_info(data.get("info") or {}, version)
+        acc = _ReleaseAccumulator(summary.version)
+        for ver, files in (data.get("releases") or {}).items():
+            acc.add_release(ver, files or [])
+        acc.finish(summary, None if version else data.get("urls"))
+        return summary
+
+
+def parse_upload_time(value: Optional[str]) -> Optional[datetime]:
+    """Parse a PyPI upload_time string into an aware UTC datetime."""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def _compact_file(f: dict) -> tuple:
+    digests = f.get("digests")
+    sha256 = digests.get("sha256") if isinstance(digests, dict) else None
+    return (f.get("filename"), sha256, f.get("url"))
+
+
+class _ReleaseAccumulator:
+    """Single pass over release files tracking min/max upload times.
+
+    upload_time values share one ISO layout, so they are compared as strings
+    and only the two winners are ever parsed into datetimes.
+    """
+
+    __slots__ = ("version", "first", "version_upload", "releases", "file_count", "files", "by_version")
+
+    def __init__(self, version: Optional[str]):
+        self.version = version
+        self.first = None
+        self.version_upload = None
+        self.releases = 0
+        self.file_count = 0
+        self.files = []
+        # only used when releases are seen before "info" (version unknown)
+        self.by_version = {}
+
+    def add_file(self, ver: str, f: dict):
+        self.file_count += 1
+        ts = f.get("upload_time") or f.get("upload_time_iso_8601")
+        if ts and (self.first is None or ts < self.first):
+            self.first = ts
+        if self.version is None:
+            entry = self.by_version.setdefault(ver, [None, []])
+            if ts and (entry[0] is None or ts > entry[0]):
+                entry[0] = ts
+            entry[1].append(_compact_file(f))
+        elif ver == self.version:
+            if ts and (self.version_upload is None or ts > self.version_upload):
+                self.version_upload = ts
+            self.files.append(_compact_file(f))
+
+    def add_release(self, ver: str, files: list):
+        self.releases += 1
+        for f in files:
+            self.add_file(ver, f)
+
+    def finish(self, summary: ReleaseSummary, urls: Optional[list] = None):
+        if self.version is None and summary.version in self.by_version:
+            self.version_upload, self.files = self.by_version[summary.version]
+        if not self.files and urls:
+            # "urls" lists the files of the current version
+            self.files = [_compact_file(f) for f in urls]
+        summary.first_upload = self.first
+        summary.version_upload = self.version_upload
+        summary.release_count = self.releases
+        summary.file_count = self.file_count
+        summary.files = tuple(self.files)
+
+
+class _StreamReader:
+    """Pull-based JSON tokenizer over a byte or text stream."""
+
+    def __init__(self, stream, chunk_size: int = CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            self.buf = self.buf[self.pos:] + self.decoder.decode(b"", final=True)
+            self.pos = 0
+            return False
+        self.bytes_read += len(chunk)
+        if isinstance(chunk, bytes):
+            chunk = self.decoder.decode(chunk)
+        # drop the consumed prefix so memory stays bounded by one value
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _skip_ws(self):
+        while True:
+            buf, pos = self.buf, self.pos
+            n = len(buf)
+            while pos < n and buf[pos] in _WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < n or not self._fill():
+                return
+
+    def peek(self) -> str:
+        self._skip_ws()
+        if self.pos >= len(self.buf):
+            raise ValueError("unexpected end of JSON stream")
+        return self.buf[self.pos]
+
+    def expect(self, ch: str):
+        if self.peek() != ch:
+            raise ValueError(f"expected {ch!r} at stream offset {self.bytes_read}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self._skip_ws()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # a number touching the end of the buffer may continue in the next chunk
+            if end == len(self.buf) and not self.eof:
+                if self._fill():
+                    continue
+            self.pos = end
+            return obj
+
+    def iter_object(self) -> Iterator[str]:
+        """Yield the keys of an object; the caller must consume each value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            ch = self.peek()
+            self.pos += 1
+            if ch == "}":
+                return
+            if ch != ",":
+                raise ValueError(f"malformed object near stream offset {self.bytes_read}")
+
+
+def parse_release_summary(stream, version: Optional[str] = None, chunk_size: int = CHUNK_SIZE) -> ReleaseSummary:
+    """Parse a PyPI JSON document from `stream` in one incremental pass.
+
+    `version` selects which release's date and files are kept; by default
+    it is the project's current version from "info".
+
+    Only "info", "releases" and "urls" are decoded; each release's files are
+    reduced to upload times and (for the current version) compact
+    (filename, sha256, url) tuples before the next release is read.
+    """
+    reader = _StreamReader(stream, chunk_size)
+    summary = ReleaseSummary()
+    acc = None
+    urls = None
+    for key in reader.iter_object():
+        if key == "info":
+            summary._set_info(reader.value() or {}, version)
+            if acc is None:
+                acc = _ReleaseAccumulator(summary.version)
+        elif key == "releases":
+            if acc is None:
+                acc = _ReleaseAccumulator(None)
+            for ver in reader.iter_object():
+                # one release's file list is small; decode it in a single call
+                acc.add_release(ver, reader.value() or [])
+        elif key == "urls" and not version:
+            urls = reader.value()
+        else:
+            reader.value()
+    if acc is None:
+        acc = _ReleaseAccumulator(summary.version)
+    acc.finish(summary, urls)
+    return summary
+
+
+# ── benchmark ─────────────────────────────────────────────────────────────
+
+def _legacy_dates(data: dict):
+    """The json.loads + per-file fromisoformat approach analyze_package used."""
+    info = data.get("info", {})
+    version = info.get("version", "unknown")
+    releases = data.get("releases", {})
+    dates = []
+    for _ver, files in releases.items():
+        for f in files:
+            if "upload_time" in f:
+                try:
+                    dates.append(datetime.fromisoformat(f["upload_time"].replace("Z", "+00:00")))
+                except ValueError:
+                    pass
+    version_dates = []
+    for f in releases.get(version, []):
+        if "upload_time" in f:
+            try:
+                version_dates.append(datetime.fromisoformat(f["upload_time"].replace("Z", "+00:00")))
+            except ValueError:
+                pass
+    return (min(dates) if dates else None, max(version_dates) if version_dates else None)
+
+
+def _measure(func, repeat: int) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": best, "peak_bytes": peak}
+
+
+def benchmark(path: str, repeat: int = 3) -> dict:
+    """Time and peak memory of legacy json.loads parsing vs streaming."""
+    def _legacy():
+        with open(path, "rb") as fh:
+            data = json.loads(fh.read().decode())
+        return _legacy_dates(data)
+
+    def _streaming():
+        with open(path, "rb") as fh:
+            return parse_release_summary(fh)
+
+    legacy_first, legacy_version = _legacy()
+    summary = _streaming()
+    # both paths must agree before their numbers mean anything
+    if legacy_first is not None:
+        assert summary.first_release_date.replace(tzinfo=None) == legacy_first.replace(tzinfo=None)
+    if legacy_version is not None:
+        assert summary.version_release_date.replace(tzinfo=None) == legacy_version.replace(tzinfo=None)
+    return {
+        "file": path,
+        "releases": summary.release_count,
+        "files": summary.file_count,
+        "legacy": _measure(_legacy, repeat),
+        "streaming": _measure(_streaming, repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming PyPI JSON parsing")
+    parser.add_argument("files", nargs="+", help="Saved https://pypi.org/pypi/<name>/json documents")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repetitions (best is kept)")
+    parser.add_argument("--json", action="store_true", help="Emit results as JSON")
+    args = parser.parse_args()
+
+    results = [benchmark(path, args.repeat) for path in args.files]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    for res in results:
+        legacy, streaming = res["legacy"], res["streaming"]
+        print(f"{res['file']}: {res['releases']:,} releases, {res['files']:,} files")
+        print(f"  legacy    {legacy['seconds'] * 1000:9.1f} ms  peak {legacy['peak_bytes'] / 1e6:8.1f} MB")
+        print(f"  streaming {streaming['seconds'] * 1000:9.1f} ms  peak {streaming['peak_bytes'] / 1e6:8.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""
+spip_vulndb.py - In-process vulnerability database for spip
+Loads OSV-format advisories (https://ossf.github.io/osv-schema/) from a local
+dump, indexes them by normalized PyPI name with parsed version ranges, and
+answers "is name==version affected" without pip-audit or network access.
+
+Supported dumps: a directory of OSV .json files, OSV's PyPI/all.zip, a single
+.json advisory (or list of advisories) and .jsonl files.
+"""
+
+import json
+import os
+import zipfile
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from spip_mirror import normalize_name
+
+try:
+    from packaging.version import InvalidVersion, Version
+except ImportError:  # pip always vendors packaging
+    from pip._vendor.packaging.version import InvalidVersion, Version
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".cache", "spip", "vulndb-index.json")
+
+INDEX_FORMAT = 1
+
+
+def _parse_version(value: str) -> Optional[Version]:
+    try:
+        return Version(value)
+    except InvalidVersion:
+        return None
+
+
+class Advisory:
+    """One OSV advisory as it applies to one PyPI package."""
+
+    __slots__ = ("id", "aliases", "summary", "package", "intervals", "versions", "fixed")
+
+    def __init__(self, id: str, aliases: tuple, summary: str, package: str,
+                 intervals: tuple, versions: frozenset, fixed: tuple):
+        self.id = id
+        self.aliases = aliases
+        self.summary = summary
+        self.package = package
+        self.intervals = intervals  # ((introduced, fixed_or_last, last_is_inclusive), ...)
+        self.versions = versions    # explicitly listed affected version strings
+        self.fixed = fixed          # fix versions, for display
+
+    def affects(self, version: str, parsed: Optional[Version]) -> bool:
+        if version in self.versions:
+            return True
+        if parsed is None:
+            return False
+        for lo, hi, inclusive in self.intervals:
+            if lo is not None and parsed < lo:
+                continue
+            if hi is None or parsed < hi or (inclusive and parsed == hi):
+                return True
+        return False
+
+    def describe(self) -> str:
+        text = self.id
+        cves = [a for a in self.aliases if a.startswith("CVE-")]
+        if cves:
+            text += f" ({', '.join(cves)})"
+        if self.summary:
+            text += f": {self.summary}"
+        if self.fixed:
+            text += f" [fixed in {', '.join(self.fixed)}]"
+        return text
+
+
+def _build_intervals(ranges: list) -> Tuple[tuple, tuple]:
+    """Turn OSV ECOSYSTEM range events into (lo, hi, inclusive) intervals."""
+    intervals, fixed = [], []
+    for rng in ranges or []:
+        if rng.get("type") not in ("ECOSYSTEM", "SEMVER"):
+            continue
+        events = []
+        for ev in rng.get("events") or []:
+            for kind, value in ev.items():
+                parsed = Version("0") if (kind == "introduced" and value == "0") else _parse_version(value)
+                if parsed is not None:
+                    events.append((parsed, kind, value))
+        # OSV events are evaluated in version order; "introduced" first on ties
+        events.sort(key=lambda e: (e[0], e[1] != "introduced"))
+        lo = None
+        open_range = False
+        for parsed, kind, value in events:
+            if kind == "introduced":
+                lo, open_range = parsed, True
+            elif open_range and kind in ("fixed", "limit"):
+                intervals.append((lo, parsed, False))
+                if kind == "fixed":
+                    fixed.append(value)
+                open_range = False
+            elif open_range and kind == "last_affected":
+                intervals.append((lo, parsed, True))
+                open_range = False
+        if open_range:
+            intervals.append((lo, None, False))
+    return tuple(intervals), tuple(fixed)
+
+
+def _minimal_advisory(doc: dict) -> Optional[dict]:
+    """Keep only what the index needs from an OSV document (PyPI entries only)."""
+    if not isinstance(doc, dict) or not doc.get("id") or doc.get("withdrawn"):
+        return None
+    affected = []
+    for aff in doc.get("affected") or []:
+        pkg = aff.get("package") or {}
+        if pkg.get("ecosystem") != "PyPI" or not pkg.get("name"):
+            continue
+        affected.append({
+            "name": pkg["name"],
+            "ranges": [r for r in aff.get("ranges") or [] if r.get("type") in ("ECOSYSTEM", "SEMVER")],
+            "versions": aff.get("versions") or [],
+        })
+    if not affected:
+        return None
+    return {
+        "id": doc["id"],
+        "modified": doc.get("modified", ""),
+        "aliases": doc.get("aliases") or [],
+        "summary": (doc.get("summary") or "").strip(),
+        "affected": affected,
+    }
+
+
+def _iter_source(path: str) -> Iterator[dict]:
+    """Yield raw OSV documents from a single dump file."""
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as zf:
+            for member in zf.namelist():
+                if member.endswith(".json"):
+                    with zf.open(member) as fh:
+                        yield json.loads(fh.read().decode("utf-8"))
+    elif path.endswith((".jsonl", ".ndjson")):
+        with open(path, "r", encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    else:
+        with open(path, "r", encoding="utf-8") as fh:
+            doc = json.load(fh)
+        if isinstance(doc, list):
+            yield from doc
+        else:
+            yield doc
+
+
+def _list_sources(path: str) -> List[str]:
+    if os.path.isdir(path):
+        found = []
+        for root, _dirs, names in os.walk(path):
+            for name in names:
+                if name.endswith((".json", ".jsonl", ".ndjson", ".zip")):
+                    found.append(os.path.join(root, name))
+        return sorted(found)
+    return [path]
+
+
+class VulnerabilityDB:
+    """Advisories indexed by normalized package name.
+
+    Each dump file is tracked by (mtime, size); `refresh()` re-reads only the
+    files that changed, appeared or disappeared since the last load.
+    """
+
+    def __init__(self, dump_path: str, index_path: Optional[str] = DEFAULT_INDEX_PATH):
+        self.dump_path = dump_path
+        self.index_path = index_path
+        self._sources: Dict[str, dict] = {}     # path -> {"stat": [mtime, size], "advisories": [...]}
+        self._by_name: Dict[str, List[Advisory]] = {}
+        self._load_index()
+        self.refresh()
+
+    # ── loading ───────────────────────────────────────────────────────────
+
+    def _load_index(self):
+        if not self.index_path or not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, json.JSONDecodeError):
+            return
+        if data.get("format") == INDEX_FORMAT and data.get("dump_path") == os.path.abspath(self.dump_path):
+            self._sources = data.get("sources", {})
+
+    def _save_index(self):
+        if not self.index_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({
+                "format": INDEX_FORMAT,
+                "dump_path": os.path.abspath(self.dump_path),
+                "sources": self._sources,
+            }, fh)
+        os.replace(tmp, self.index_path)
+
+    def refresh(self) -> dict:
+        """Re-read changed dump files; returns counts of what changed."""
+        if not os.path.exists(self.dump_path):
+            raise FileNotFoundError(f"Vulnerability dump not found: {self.dump_path}")
+        changes = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        current = _list_sources(self.dump_path)
+        for path in set(self._sources) - set(current):
+            del self._sources[path]
+            changes["removed"] += 1
+        for path in current:
+            st = os.stat(path)
+            stat = [st.st_mtime, st.st_size]
+            known = self._sources.get(path)
+            if known is not None and known["stat"] == stat:
+                changes["unchanged"] += 1
+                continue
+            advisories = [a for a in map(_minimal_advisory, _iter_source(path)) if a]
+            self._sources[path] = {"stat": stat, "advisories": advisories}
+            changes["updated" if known is not None else "added"] += 1
+        self._rebuild()
+        if changes["added"] or changes["updated"] or changes["removed"]:
+            self._save_index()
+        return changes
+
+    def _rebuild(self):
+        # the same advisory id may appear in several files; the newest wins
+        latest: Dict[str, dict] = {}
+        for source in self._sources.values():
+            for adv in source["advisories"]:
+                prev = latest.get(adv["id"])
+                if prev is None or adv["modified"] >= prev["modified"]:
+                    latest[adv["id"]] = adv
+        by_name: Dict[str, List[Advisory]] = {}
+        for adv in latest.values():
+            for aff in adv["affected"]:
+                name = normalize_name(aff["name"])
+                intervals, fixed = _build_intervals(aff["ranges"])
+                by_name.setdefault(name, []).append(Advisory(
+                    adv["id"], tuple(adv["aliases"]), adv["summary"], name,
+                    intervals, frozenset(aff["versions"]), fixed,
+                ))
+        self._by_name = by_name
+
+    # ── queries ───────────────────────────────────────────────────────────
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._by_name.values())
+
+    def affected(self, package: str, version: str) -> List[Advisory]:
+        """Advisories affecting package==version."""
+        candidates = self._by_name.get(normalize_name(package))
+        if not candidates:
+            return []
+        parsed = _parse_version(version)
+        return [adv for adv in candidates if adv.affects(version, parsed)]
+
+    def bulk_affected(self, pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], List[Advisory]]:
+        """Answer many (name, version) queries; unaffected pairs are omitted."""
+        results = {}
+        for package, version in pairs:
+            hits = self.affected(package, version)
+            if hits:
+                results[(package, version)] = hits
+        return results